@@ -4,9 +4,11 @@ from flask_openapi3.models.info import Info
 from flask_openapi3.models.license import License
 from flask_openapi3.openapi import OpenAPI
 
-from server import plugins
+from server import capture, formats, plugins
 from server.config import jwt_expiry, jwt_secret
+from server.posts import recent
 from server.root.view import bp
+from server.users.controller import resume_profile_propagation
 
 
 def create_app() -> OpenAPI:
@@ -33,6 +35,7 @@ def create_app() -> OpenAPI:
         },
     )
 
+    formats.init_app(app)
     app.config["JWT_SECRET_KEY"] = jwt_secret
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = jwt_expiry
 
@@ -41,5 +44,8 @@ def create_app() -> OpenAPI:
     plugins.jwt.init_app(app)
 
     app.register_api(bp)
+    capture.init_app(app)
+    recent.init_app(app)
+    resume_profile_propagation()
 
     return app
@@ -16,7 +16,7 @@ from server.auth.view_model import (
 from server.config import admin_email, maintenance
 from server.model_utils import model_convert
 from server.plugins import current_user
-from server.users.controller import get_user_by_id
+from server.users.controller import get_user_profile
 from server.users.controller_model import DbUserExistsError, DbUserNotFoundError
 from server.users.view_model import User, UserExists, UserId, UserInit, UserNotFound
 
@@ -102,7 +102,7 @@ def handle_get_current_user():  # noqa: ANN201
         return UserNotFound().model_dump(), 404
 
     try:
-        user = get_user_by_id(current_user.user_id)
+        user = get_user_profile(current_user.user_id)
     except DbUserNotFoundError:
         return UserNotFound().model_dump(), 404
 
@@ -0,0 +1,99 @@
+"""Bounded in-memory caches, kept by each worker."""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from threading import Lock
+from time import monotonic
+
+
+class Cache[K: Hashable, V]:
+    """Cache which evicts the least recently used entries, and expired ones.
+
+    Values are loaded outside of the lock, so a slow load does not block other
+    keys. A load which overlaps an invalidation is returned but not stored,
+    since it may have read the document before it changed.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        """Create an empty cache.
+
+        Args:
+            size (int): Maximum number of entries. 0 disables the cache.
+            ttl (float): Seconds for which an entry is kept.
+
+        """
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._generation = 0
+        self._lock = Lock()
+
+    def get(self, key: K, load: Callable[[K], V]) -> V:
+        """Get the value of a key, loading it if it is missing or expired.
+
+        Args:
+            key (K): The key.
+            load (Callable[[K], V]): Loads the value of a key. Exceptions are
+                raised to the caller, and are not cached.
+
+        Returns:
+            V: The value.
+
+        """
+        if self.size <= 0:
+            return load(key)
+
+        now = monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            generation = self._generation
+
+        value = load(key)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+
+        return value
+
+    def invalidate(self, keys: Iterable[K]) -> None:
+        """Drop the entries of keys.
+
+        Args:
+            keys (Iterable[K]): The keys.
+
+        """
+        with self._lock:
+            self._generation += 1
+
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Report the usage of the cache.
+
+        Returns:
+            dict[str, int]: Number of hits, misses and entries.
+
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
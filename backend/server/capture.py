@@ -0,0 +1,141 @@
+"""Traffic capture, for replaying production requests with `tasks/replay.py`.
+
+Every request is written as a line of JSON to a rotating log:
+
+    {"t": 1700000000.123, "o": "getPostFeed", "m": "GET",
+     "p": "/posts/feed/...", "q": "limit=20", "u": "...", "a": false,
+     "b": null, "s": 200, "d": 12.3}
+
+These are the start time, operation ID, method, path, query string,
+authenticated user, admin flag, body shape, status, and duration in
+milliseconds. Body values are not recorded, except for ObjectIds. Other
+strings are replaced by their length, as `"*<length>"`.
+"""
+
+import re
+from json import dumps
+from logging import INFO, Formatter, getLogger
+from logging.handlers import RotatingFileHandler
+from time import perf_counter, time
+from typing import TYPE_CHECKING, Any
+
+from bson.objectid import ObjectId
+from flask import Response, g, request
+
+from server.config import capture_backups, capture_max_bytes, capture_path
+from server.plugins import current_user
+
+if TYPE_CHECKING:
+    from flask_openapi3.openapi import OpenAPI
+
+_RULE_ARGUMENT = re.compile(r"<(?:[^:<>]+:)?([^<>]+)>")
+"""Argument of a Flask URL rule."""
+
+_logger = getLogger(__name__)
+
+
+def shape(value: object) -> object:
+    """Strip a JSON value down to its shape.
+
+    Args:
+        value (object): JSON value.
+
+    Returns:
+        object: The value, with strings other than ObjectIds replaced by their
+            length.
+
+    """
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+
+    if isinstance(value, list):
+        return [shape(i) for i in value]
+
+    if isinstance(value, str) and not ObjectId.is_valid(value):
+        return f"*{len(value)}"
+
+    return value
+
+
+def _operation_ids(app: "OpenAPI") -> dict[tuple[str, str], str]:
+    """Map the URL rules of an app to their operation IDs.
+
+    Args:
+        app (OpenAPI): The flask app.
+
+    Returns:
+        dict[tuple[str, str], str]: Operation ID by method and OpenAPI path.
+
+    """
+    return {
+        (method.upper(), path): operation["operationId"]
+        for path, methods in app.api_doc["paths"].items()
+        for method, operation in methods.items()
+        if "operationId" in operation
+    }
+
+
+def init_app(app: "OpenAPI") -> None:
+    """Record every request of an app, if capture is enabled.
+
+    Args:
+        app (OpenAPI): The flask app.
+
+    """
+    if not capture_path:
+        return
+
+    # Every app of the process shares the log file.
+    if not _logger.handlers:
+        handler = RotatingFileHandler(
+            capture_path,
+            maxBytes=capture_max_bytes,
+            backupCount=capture_backups,
+        )
+        handler.setFormatter(Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(INFO)
+        _logger.propagate = False
+
+    operations: dict[tuple[str, str], str] = {}
+
+    @app.before_request
+    def start() -> None:
+        g.capture_time = time()
+        g.capture_start = perf_counter()
+
+    @app.after_request
+    def record(response: Response) -> Response:
+        duration = (perf_counter() - g.capture_start) * 1000
+
+        if not operations:
+            operations.update(_operation_ids(app))
+
+        rule = request.url_rule.rule if request.url_rule else ""
+        path = _RULE_ARGUMENT.sub(r"{\1}", rule)
+
+        try:
+            user: Any = current_user or None
+        except RuntimeError:
+            # No token was verified for this request.
+            user = None
+
+        _logger.info(
+            dumps(
+                {
+                    "t": round(g.capture_time, 3),
+                    "o": operations.get((request.method, path)),
+                    "m": request.method,
+                    "p": request.path,
+                    "q": request.query_string.decode(),
+                    "u": user and str(user.user_id),
+                    "a": bool(user and user.admin),
+                    "b": shape(request.get_json(silent=True)),
+                    "s": response.status_code,
+                    "d": round(duration, 3),
+                },
+                separators=(",", ":"),
+            ),
+        )
+
+        return response
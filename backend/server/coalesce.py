@@ -0,0 +1,144 @@
+"""Single-flight coalescing of identical reads within a worker.
+
+When many requests read the same item at once, like a viral post, only the
+first one queries the database. The others wait for its query and share the
+result, or its exception. This only helps workers which serve requests
+concurrently, such as Gunicorn workers with `--threads`.
+
+With `SOCIAL_BE_COALESCE_STALE_MS` set, results are also kept for that long
+after their query. Reads in that window get the kept result right away. Once
+it is older than half of the window, they also start reading it again in the
+background, unless that already happened, so a key which is read all the time
+is read again at most twice per window. Keys should contain the ETag of the
+response when there is one, so that results are only shared by reads which
+saw the same version.
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+
+from server import metrics
+from server.config import coalesce_reads, coalesce_stale_ms
+
+REVALIDATION_WORKERS = 4
+"""Number of threads which read stale results again, in the background."""
+
+REVALIDATE_AFTER = 0.5
+"""Fraction of the stale window after which kept results are read again."""
+
+_revalidation = ThreadPoolExecutor(
+    REVALIDATION_WORKERS,
+    thread_name_prefix="revalidation",
+)
+"""Workers which read stale results again."""
+
+
+class SingleFlight[K: Hashable, V]:
+    """Coalesces concurrent reads of the same key into a single load."""
+
+    def __init__(self, name: str) -> None:
+        """Create a coalescer, and report its metrics.
+
+        Args:
+            name (str): Operation ID of the coalesced reads, for metrics.
+
+        """
+        self.stale = coalesce_stale_ms / 1000
+        self.loads = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self._flights: dict[K, Future[V]] = {}
+        # Results with the time they were loaded at.
+        self._results: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = Lock()
+        metrics.register(f"coalesce_{name}", self.stats)
+
+    def call(self, key: K, load: Callable[[], V]) -> V:
+        """Read a key, sharing the load of concurrent reads of the same key.
+
+        Args:
+            key (K): Identifies the read. Loads of equal keys must return
+                equal results.
+            load (Callable[[], V]): Loads the result.
+
+        Returns:
+            V: The result.
+
+        """
+        if not coalesce_reads:
+            return load()
+
+        with self._lock:
+            now = monotonic()
+            flight = self._flights.get(key)
+            result = self._results.get(key)
+
+            if result is not None and now - result[0] < self.stale:
+                self.stale_hits += 1
+
+                if flight is None and now - result[0] >= self.stale * REVALIDATE_AFTER:
+                    self._flights[key] = flight = Future()
+                    _revalidation.submit(self._load, key, load, flight)
+
+                return result[1]
+
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self._flights[key] = flight = Future()
+                leader = True
+
+        if leader:
+            self._load(key, load, flight)
+
+        return flight.result()
+
+    def _load(self, key: K, load: Callable[[], V], flight: Future[V]) -> None:
+        """Load a result, and share it with every read waiting for it."""
+        try:
+            value = load()
+        except Exception as e:  # noqa: BLE001
+            with self._lock:
+                self.loads += 1
+                del self._flights[key]
+
+            flight.set_exception(e)
+            return
+
+        with self._lock:
+            self.loads += 1
+            del self._flights[key]
+
+            if self.stale > 0:
+                now = monotonic()
+                self._results[key] = (now, value)
+                self._results.move_to_end(key)
+
+                # Every result is kept equally long, so the oldest come first.
+                while self._results:
+                    oldest = next(iter(self._results.values()))
+
+                    if now - oldest[0] < self.stale:
+                        break
+
+                    self._results.popitem(last=False)
+
+        flight.set_result(value)
+
+    def stats(self) -> dict[str, int]:
+        """Report the coalesced reads.
+
+        Returns:
+            dict[str, int]: Number of loads, reads which waited for another
+                read's load, and reads served a kept result.
+
+        """
+        return {
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "stale": self.stale_hits,
+        }
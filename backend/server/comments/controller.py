@@ -1,16 +1,37 @@
 """Controller of Comments."""
 
+from collections.abc import Iterable
 from datetime import UTC, datetime
+from itertools import batched
 from typing import Any
 
 from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import UpdateOne
 
 from server.comments.controller_model import (
     DbComment,
+    DbCommentDelta,
     DbCommentList,
     DbCommentNotFoundError,
 )
-from server.db import db, get_one
+from server.config import page_size_default
+from server.db import RAW, db, get_one
+from server.pagination import keyset, page_limit, page_versions, stream_page
+from server.sync import (
+    add_tombstones,
+    changes_pipeline,
+    check_changes,
+    get_tombstones,
+    sync_watermark,
+)
+from server.users.controller import AUTHOR_SNAPSHOT
+
+COUNTER_BATCH_SIZE = 1000
+"""Number of posts to update in a single comment count write."""
+
+VERSION_PROJECTION = {"modification_time": 1, "author_snapshot": 1}
+"""Projection of the comment fields which change, for ETags."""
 
 
 def get_comment_by_id(comment_id: ObjectId) -> DbComment:
@@ -30,15 +51,7 @@ def get_comment_by_id(comment_id: ObjectId) -> DbComment:
         db.comments.aggregate(
             [
                 {"$match": {"_id": comment_id}},
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "author",
-                        "foreignField": "_id",
-                        "as": "author",
-                    },
-                },
-                {"$unwind": {"path": "$author"}},
+                *AUTHOR_SNAPSHOT,
             ],
         ),
     )
@@ -49,6 +62,22 @@ def get_comment_by_id(comment_id: ObjectId) -> DbComment:
     return DbComment.model_validate(result)
 
 
+def get_comment_version(comment_id: ObjectId) -> RawBSONDocument | None:
+    """Get the changing fields of a comment, without building it.
+
+    Args:
+        comment_id (ObjectId): Id of comment.
+
+    Returns:
+        RawBSONDocument | None: Projected comment, or None if it does not exist.
+
+    """
+    return db.comments.with_options(codec_options=RAW).find_one(
+        {"_id": comment_id},
+        VERSION_PROJECTION,
+    )
+
+
 def validate_comment_id(comment_id: ObjectId) -> None:
     """Check if a comment id exists without retrieving its data.
 
@@ -65,39 +94,163 @@ def validate_comment_id(comment_id: ObjectId) -> None:
         raise DbCommentNotFoundError
 
 
-def get_comments_of_post(post_id: ObjectId) -> DbCommentList:
-    """Get comments of post.
+def _comments_of_post_pipeline(
+    post_id: ObjectId,
+    after: ObjectId | None,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """Create the aggregation of a page of comments of post, oldest first.
+
+    Args:
+        post_id (ObjectId): Id of post.
+        after (ObjectId, optional): Id of the last comment on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        list[dict[str, Any]]: Aggregation pipeline.
+
+    """
+    return [
+        {"$match": {"post": post_id, **keyset(after)}},
+        {"$sort": {"_id": 1}},
+        {"$limit": page_limit(limit)},
+        *AUTHOR_SNAPSHOT,
+    ]
+
+
+def get_comments_of_post(
+    post_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbCommentList:
+    """Get a page of comments of post, oldest first.
 
     Args:
         post_id (ObjectId): Id of post.
+        after (ObjectId, optional): Id of the last comment on the previous page.
+            Defaults to None, which starts from the oldest comment.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Returns:
         DbCommentList: Comments of post.
 
     """
     result = db.comments.aggregate(
-        [
-            {"$match": {"post": post_id}},
-            {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "author",
-                    "foreignField": "_id",
-                    "as": "author",
-                },
-            },
-            {"$unwind": {"path": "$author"}},
-        ],
+        _comments_of_post_pipeline(post_id, after, limit),
     ).to_list()
 
     return DbCommentList.model_validate(result)
 
 
-def get_comments_by_author(author_id: ObjectId) -> DbCommentList:
-    """Get comments by an author.
+def get_comments_of_post_raw(
+    post_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> list[RawBSONDocument]:
+    """Get a page of comments of post as raw BSON, oldest first.
+
+    See `get_comments_of_post`.
+
+    Returns:
+        list[RawBSONDocument]: Comments of post.
+
+    """
+    return (
+        db.comments.with_options(codec_options=RAW)
+        .aggregate(_comments_of_post_pipeline(post_id, after, limit))
+        .to_list()
+    )
+
+
+def stream_comments_of_post(
+    post_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> tuple[Iterable[RawBSONDocument], ObjectId | None]:
+    """Stream a page of comments of post as raw BSON, oldest first.
+
+    See `get_comments_of_post`.
+
+    Returns:
+        tuple[Iterable[RawBSONDocument], ObjectId | None]: Comments,
+            and ID of the last one if the page is full.
+
+    """
+    pipeline = _comments_of_post_pipeline(post_id, after, limit)
+    comments = db.comments.with_options(codec_options=RAW)
+
+    return stream_page(comments, pipeline, limit)
+
+
+def get_comments_of_post_versions(
+    post_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> list[RawBSONDocument]:
+    """Get the changing fields of a page of comments of post.
+
+    See `get_comments_of_post`.
+
+    Returns:
+        list[RawBSONDocument]: Projected comments.
+
+    """
+    return page_versions(
+        db.comments,
+        _comments_of_post_pipeline(post_id, after, limit),
+        limit,
+        VERSION_PROJECTION,
+    )
+
+
+def get_comments_of_post_changes(
+    post_id: ObjectId,
+    since: datetime,
+) -> DbCommentDelta:
+    """Get the changes of the comments of post since a watermark.
+
+    See `get_comments_of_post`.
+
+    Args:
+        post_id (ObjectId): Id of post.
+        since (datetime): Watermark of the sync.
+
+    Raises:
+        DbSyncExpiredError: Changes since the watermark are not available.
+
+    Returns:
+        DbCommentDelta: Changed and deleted comments.
+
+    """
+    match = {"post": post_id}
+    watermark = sync_watermark(since)
+    changed = db.comments.aggregate(
+        [*changes_pipeline(match, since), *AUTHOR_SNAPSHOT],
+    ).to_list()
+
+    check_changes(changed)
+
+    return DbCommentDelta.model_validate(
+        {
+            "changed": changed,
+            "deleted": get_tombstones(db.comment_tombstones, match, since),
+            "watermark": watermark,
+        },
+    )
+
+
+def get_comments_by_author(
+    author_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbCommentList:
+    """Get a page of comments by an author, newest first.
 
     Args:
         author_id (ObjectId): Id of authoring user.
+        after (ObjectId, optional): Id of the last comment on the previous page.
+            Defaults to None, which starts from the newest comment.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Raises:
         DbUserNotFoundError: User with the given ID was not in the database.
@@ -106,11 +259,16 @@ def get_comments_by_author(author_id: ObjectId) -> DbCommentList:
         DbCommentList: Comments of post.
 
     """
-    from server.users.controller import get_user_by_id
+    from server.users.controller import get_user_profile
 
-    author = get_user_by_id(author_id)
+    author = get_user_profile(author_id)
 
-    result = db.comments.find({"author": author_id}).to_list()
+    result = (
+        db.comments.find({"author": author_id, **keyset(after, descending=True)})
+        .sort("_id", -1)
+        .limit(page_limit(limit))
+        .to_list()
+    )
 
     for i in result:
         i["author"] = author
@@ -134,19 +292,24 @@ def create_comment(content: str, author_id: ObjectId, post_id: ObjectId) -> DbCo
         DbComment: Created Comment.
 
     """
-    from server.posts.controller import validate_post_id
-    from server.users.controller import get_user_by_id
+    from server.posts.controller import increment_comment_count
+    from server.posts.controller_model import DbPostNotFoundError
+    from server.users.controller import author_snapshot, get_user_profile
 
     now = datetime.now(UTC)
-    author = get_user_by_id(author_id)
-    validate_post_id(post_id)
+    author = get_user_profile(author_id)
+
+    if not increment_comment_count(post_id):
+        raise DbPostNotFoundError
 
     comment: dict[str, Any] = {
         "content": content,
         "author": author_id,
+        "author_snapshot": author_snapshot(author),
         "post": post_id,
         "creation_time": now,
         "modification_time": now,
+        "change_time": now,
     }
 
     result = db.comments.insert_one(comment)
@@ -187,6 +350,7 @@ def update_comment(
             "$set": {
                 "content": content,
                 "modification_time": now,
+                "change_time": now,
             },
         },
     )
@@ -209,16 +373,22 @@ def delete_comment(comment_id: ObjectId, author_id: ObjectId | None = None) -> N
         DbPostNotFoundError: No comment with the given ID and author was found.
 
     """
+    from server.posts.controller import increment_comment_count
+
     comment_filter = {"_id": comment_id}
 
     if author_id is not None:
         comment_filter["author"] = author_id
 
-    result = db.comments.delete_one(comment_filter)
+    result = db.comments.find_one_and_delete(comment_filter, {"post": 1})
 
-    if result.deleted_count < 1:
+    if result is None:
         raise DbCommentNotFoundError
 
+    add_tombstones(db.comment_tombstones, [result])
+
+    increment_comment_count(result["post"], -1)
+
 
 def delete_comments_by_author(author_id: ObjectId) -> bool:
     """Delete all comments by author.
@@ -230,8 +400,42 @@ def delete_comments_by_author(author_id: ObjectId) -> bool:
         bool: was anything deleted?
 
     """
+    from server.posts.controller import publish_posts
+
+    counts = db.comments.aggregate(
+        [
+            {"$match": {"author": author_id}},
+            {"$group": {"_id": "$post", "comments": {"$push": "$_id"}}},
+        ],
+    ).to_list()
+    now = datetime.now(UTC)
+    updates = [
+        UpdateOne(
+            {"_id": i["_id"]},
+            {
+                "$inc": {"comment_count": -len(i["comments"])},
+                "$set": {"change_time": now},
+            },
+        )
+        for i in counts
+    ]
+
     result = db.comments.delete_many({"author": author_id})
 
+    add_tombstones(
+        db.comment_tombstones,
+        (
+            {"_id": comment, "post": i["_id"]}
+            for i in counts
+            for comment in i["comments"]
+        ),
+    )
+
+    for batch in batched(updates, COUNTER_BATCH_SIZE):
+        db.posts.bulk_write(list(batch), ordered=False)
+
+    publish_posts([i["_id"] for i in counts])
+
     return result.deleted_count > 0
 
 
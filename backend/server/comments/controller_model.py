@@ -5,7 +5,7 @@ from datetime import datetime
 from pydantic import BaseModel, RootModel
 
 from server.model_utils import ObjectIdRaw, SelfIdRaw
-from server.users.controller_model import DbUser
+from server.users.controller_model import DbUserProfile
 
 
 class DbComment(BaseModel):
@@ -13,7 +13,7 @@ class DbComment(BaseModel):
 
     id: SelfIdRaw
     content: str
-    author: DbUser
+    author: DbUserProfile
     post: ObjectIdRaw
     creation_time: datetime
     modification_time: datetime
@@ -25,3 +25,11 @@ class DbCommentNotFoundError(Exception):
 
 DbCommentList = RootModel[list[DbComment]]
 """List of database comments."""
+
+
+class DbCommentDelta(BaseModel):
+    """Changes of a list of comments since a watermark."""
+
+    changed: list[DbComment]
+    deleted: list[ObjectIdRaw]
+    watermark: datetime
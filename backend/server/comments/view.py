@@ -1,32 +1,48 @@
 """Comments API."""
 
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
 from flask_jwt_extended import jwt_required
 from flask_openapi3.blueprint import APIBlueprint
 from flask_openapi3.models.tag import Tag
 from pydantic import RootModel
 
 from server.auth.view_model import AuthnFailed, AuthzFailed
+from server.coalesce import SingleFlight
 from server.comments.controller import (
     create_comment,
     delete_comment,
     get_comment_by_id,
+    get_comment_version,
     get_comments_by_author,
     get_comments_of_post,
+    get_comments_of_post_changes,
+    get_comments_of_post_raw,
+    get_comments_of_post_versions,
+    stream_comments_of_post,
     update_comment,
 )
-from server.comments.controller_model import DbCommentNotFoundError
+from server.comments.controller_model import DbCommentList, DbCommentNotFoundError
 from server.comments.view_model import (
     Comment,
     CommentId,
     CommentInit,
     CommentNotFound,
     CommentPatch,
+    CommentsDelta,
     CommentsList,
 )
+from server.config import stream_lists
+from server.etags import validate
+from server.formats import JSON, response_mimetype
+from server.json_provider import stream_json_array
 from server.model_utils import model_convert
+from server.pagination import PageQuery, next_cursor_headers, next_page_headers
 from server.plugins import current_user
 from server.posts.controller_model import DbPostNotFoundError
 from server.posts.view_model import PostId, PostNotFound
+from server.raw_json import raw_json_enabled, raw_json_encoder, raw_json_list
+from server.sync import DbSyncExpiredError, SyncExpired, SyncQuery
 from server.users.controller_model import DbUserNotFoundError
 from server.users.view_model import UserId, UserNotFound
 
@@ -34,6 +50,16 @@ _comments_tag = Tag(name="comments")
 bp = APIBlueprint("comment", __name__, url_prefix="/comments")
 """Comments route blueprint."""
 
+type _PageKey = tuple[ObjectId, ObjectId | None, int, str | None]
+"""Page of comments of a post, by post ID, cursor, limit and ETag."""
+
+_comments_of_post = SingleFlight[_PageKey, DbCommentList]("getCommentsOfPost")
+"""Reads of pages of comments of posts."""
+_comments_of_post_raw = SingleFlight[_PageKey, list[RawBSONDocument]](
+    "getCommentsOfPostRaw",
+)
+"""Reads of pages of comments of posts, as raw BSON."""
+
 
 @bp.get(
     "/of/<post_id>",
@@ -41,11 +67,58 @@ bp = APIBlueprint("comment", __name__, url_prefix="/comments")
     tags=[_comments_tag],
     responses={200: CommentsList},
 )
-def handle_get_comments_of_post(path: PostId):  # noqa: ANN201
+def handle_get_comments_of_post(path: PostId, query: PageQuery):  # noqa: ANN201
     """Get comments of post."""
-    comments = get_comments_of_post(path.post_id)
+    modified, etag = validate(
+        lambda: get_comments_of_post_versions(path.post_id, query.after, query.limit),
+    )
+
+    if not modified:
+        return "", 304, etag
+
+    if stream_lists and response_mimetype() == JSON:
+        cursor, last_id = stream_comments_of_post(
+            path.post_id, query.after, query.limit
+        )
+        response = stream_json_array(cursor, raw_json_encoder(Comment))
+        return response, 200, next_cursor_headers(last_id) | etag
+
+    key = (path.post_id, query.after, query.limit, etag.get("ETag"))
+
+    if raw_json_enabled():
+        raw = _comments_of_post_raw.call(
+            key,
+            lambda: get_comments_of_post_raw(path.post_id, query.after, query.limit),
+        )
+        headers = next_page_headers(raw, query.limit) | etag
+        return raw_json_list(Comment, raw), 200, headers
+
+    comments = _comments_of_post.call(
+        key,
+        lambda: get_comments_of_post(path.post_id, query.after, query.limit),
+    )
 
-    return model_convert(CommentsList, comments).model_dump()
+    return (
+        model_convert(CommentsList, comments).model_dump(),
+        200,
+        next_page_headers(comments.root, query.limit) | etag,
+    )
+
+
+@bp.get(
+    "/of/<post_id>/changes",
+    operation_id="getCommentsOfPostChanges",
+    tags=[_comments_tag],
+    responses={200: CommentsDelta, 410: SyncExpired},
+)
+def handle_get_comments_of_post_changes(path: PostId, query: SyncQuery):  # noqa: ANN201
+    """Get changes of comments of post since a watermark."""
+    try:
+        delta = get_comments_of_post_changes(path.post_id, query.since)
+    except DbSyncExpiredError:
+        return SyncExpired().model_dump(), 410
+
+    return model_convert(CommentsDelta, delta).model_dump(), 200
 
 
 @bp.get(
@@ -54,14 +127,18 @@ def handle_get_comments_of_post(path: PostId):  # noqa: ANN201
     tags=[_comments_tag],
     responses={200: CommentsList, 404: UserNotFound},
 )
-def handle_get_comments_by_author(path: UserId):  # noqa: ANN201
+def handle_get_comments_by_author(path: UserId, query: PageQuery):  # noqa: ANN201
     """Get comments by an author."""
     try:
-        comments = get_comments_by_author(path.user_id)
+        comments = get_comments_by_author(path.user_id, query.after, query.limit)
     except DbUserNotFoundError:
         return UserNotFound().model_dump(), 404
 
-    return model_convert(CommentsList, comments).model_dump()
+    return (
+        model_convert(CommentsList, comments).model_dump(),
+        200,
+        next_page_headers(comments.root, query.limit),
+    )
 
 
 @bp.post(
@@ -104,12 +181,17 @@ def handle_create_comment(body: CommentInit):  # noqa: ANN201
 )
 def handle_get_comment_by_id(path: CommentId):  # noqa: ANN201
     """Get a comment by ID."""
+    modified, etag = validate(lambda: get_comment_version(path.comment_id))
+
+    if not modified:
+        return "", 304, etag
+
     try:
         comment = get_comment_by_id(path.comment_id)
     except DbCommentNotFoundError:
         return CommentNotFound().model_dump(), 404
 
-    return model_convert(Comment, comment).model_dump()
+    return model_convert(Comment, comment).model_dump(), 200, etag
 
 
 @bp.patch(
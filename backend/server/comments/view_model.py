@@ -46,3 +46,15 @@ class CommentNotFound(BaseModel):
 
 CommentsList = RootModel[list[Comment]]
 """List of comments."""
+
+
+class CommentsDelta(BaseModel):
+    """Changes of a list of comments since a watermark.
+
+    Comments which were created or modified since then are oldest change
+    first. Pass `watermark` as `since` on the next sync.
+    """
+
+    changed: list[Comment]
+    deleted: list[ObjectIdStr]
+    watermark: Instant
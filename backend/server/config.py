@@ -78,3 +78,51 @@ admin_email = getenv_required("SOCIAL_BE_ADMIN_EMAIL")
 """Admin account email."""
 admin_pass = getenv_required("SOCIAL_BE_ADMIN_PASS")
 """Admin account password."""
+
+page_size_default = int(getenv("SOCIAL_BE_PAGE_SIZE") or "20")
+"""Default number of items in a page of a list."""
+page_size_max = int(getenv("SOCIAL_BE_PAGE_SIZE_MAX") or "100")
+"""Maximum number of items in a page of a list."""
+
+feed_strategy = getenv("SOCIAL_BE_FEED_STRATEGY") or "timeline"
+"""Strategy used to assemble post feeds."""
+timeline_length = int(getenv("SOCIAL_BE_TIMELINE_LENGTH") or "800")
+"""Maximum number of posts kept in a materialized home timeline."""
+feed_pull_threshold = int(getenv("SOCIAL_BE_FEED_PULL_THRESHOLD") or "10000")
+"""Follower count above which posts are pulled into feeds instead of pushed."""
+feed_merge_batch_size = int(getenv("SOCIAL_BE_FEED_MERGE_BATCH_SIZE") or "100")
+"""Number of followed users read by each stream of the merge feed strategy."""
+
+raw_bson = getenv("SOCIAL_BE_RAW_BSON") == "1"
+"""Encode public lists from raw BSON, without decoding them into models."""
+stream_lists = getenv("SOCIAL_BE_STREAM_LISTS") == "1"
+"""Stream public lists in chunks, as they are read from the database."""
+etags = getenv("SOCIAL_BE_ETAGS") == "1"
+"""Tag responses of posts, comments and users, and answer conditional GETs."""
+
+sync_max_changes = int(getenv("SOCIAL_BE_SYNC_MAX_CHANGES") or "1000")
+"""Number of changes above which delta syncs have to reload the list instead."""
+sync_overlap = int(getenv("SOCIAL_BE_SYNC_OVERLAP") or "5")
+"""Seconds by which sync watermarks lag behind, to include writes in flight."""
+tombstone_ttl = int(getenv("SOCIAL_BE_TOMBSTONE_TTL") or "2592000")
+"""Seconds for which deletions are kept, for delta syncs."""
+
+events_size = int(getenv("SOCIAL_BE_EVENTS_SIZE") or "16777216")
+"""Size in bytes of the capped collection of events shared by workers."""
+user_cache_size = int(getenv("SOCIAL_BE_USER_CACHE_SIZE") or "0")
+"""Number of users cached by each worker. 0 to disable."""
+user_cache_ttl = int(getenv("SOCIAL_BE_USER_CACHE_TTL") or "60")
+"""Seconds for which each worker keeps a cached user."""
+recent_posts = int(getenv("SOCIAL_BE_RECENT_POSTS") or "0")
+"""Number of newest posts each worker keeps rendered. 0 to disable."""
+coalesce_reads = getenv("SOCIAL_BE_COALESCE_READS") == "1"
+"""Share identical concurrent reads of posts and comments within each worker."""
+coalesce_stale_ms = int(getenv("SOCIAL_BE_COALESCE_STALE_MS") or "0")
+"""Milliseconds for which coalesced reads are served stale while revalidating."""
+
+capture_path = getenv("SOCIAL_BE_CAPTURE_PATH") or ""
+"""File to record requests to, for replaying them later. Empty to disable."""
+capture_max_bytes = int(getenv("SOCIAL_BE_CAPTURE_MAX_BYTES") or "104857600")
+"""Size of the capture file after which it is rotated."""
+capture_backups = int(getenv("SOCIAL_BE_CAPTURE_BACKUPS") or "5")
+"""Number of rotated capture files to keep."""
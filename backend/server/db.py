@@ -3,6 +3,8 @@
 from typing import Any
 from urllib.parse import quote_plus
 
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 from pymongo import MongoClient
 from pymongo.command_cursor import CommandCursor
 
@@ -14,6 +16,9 @@ USER_NOT_FOUND = 11
 DUPLICATE_KEY = 11000
 """This database operation violates a unique index."""
 
+RAW = CodecOptions(document_class=RawBSONDocument)
+"""Codec which keeps documents as undecoded BSON."""
+
 client = MongoClient(
     f"mongodb://{quote_plus(db_user)}:{quote_plus(db_pass)}@{db_host}:{db_port}/",
 )
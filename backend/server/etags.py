@@ -0,0 +1,68 @@
+"""Strong ETags and conditional GET requests.
+
+A response is tagged with a hash of the fields it is built from, other than
+immutable ones, like `modification_time` and author snapshots. These fields
+are read by a projected query, as raw BSON, which is much cheaper than
+building the response. If the client already has the same version, the view
+replies 304 without reading or serializing anything else.
+
+The negotiated format is part of the hash, since each format is a different
+representation of the same resource.
+"""
+
+from collections.abc import Callable
+from hashlib import blake2b
+
+from bson.raw_bson import RawBSONDocument
+from flask import request
+from werkzeug.http import quote_etag
+
+from server.config import etags
+from server.formats import response_mimetype
+
+type Versions = RawBSONDocument | list[RawBSONDocument] | None
+"""Projected fields of the documents of a response, or None if the response
+has no document."""
+
+
+def etag(versions: RawBSONDocument | list[RawBSONDocument]) -> str:
+    """Hash the projected fields of the documents of a response.
+
+    Args:
+        versions (RawBSONDocument | list[RawBSONDocument]): Projected fields.
+
+    Returns:
+        str: Unquoted strong ETag.
+
+    """
+    digest = blake2b(response_mimetype().encode(), digest_size=16)
+
+    for i in versions if isinstance(versions, list) else [versions]:
+        digest.update(i.raw)
+
+    return digest.hexdigest()
+
+
+def validate(versions: Callable[[], Versions]) -> tuple[bool, dict[str, str]]:
+    """Check if the client already has the current version of a response.
+
+    Args:
+        versions (Callable[[], Versions]): Reads the projected fields of the
+            documents of the response. It is not called if ETags are disabled.
+
+    Returns:
+        tuple[bool, dict[str, str]]: Whether the response has to be sent, and
+            its ETag headers.
+
+    """
+    if not etags:
+        return True, {}
+
+    current = versions()
+
+    if current is None:
+        return True, {}
+
+    tag = etag(current)
+
+    return not request.if_none_match.contains_weak(tag), {"ETag": quote_etag(tag)}
@@ -0,0 +1,171 @@
+"""Events shared by every worker, for keeping in-memory state current.
+
+Workers keep some database documents in memory, like cached users. When a
+worker changes such a document, it publishes an event naming its topic and
+the IDs of the changed documents. Events are appended to a capped collection,
+which every worker tails with a tailable cursor, on a background thread.
+Change streams would do the same, but need a replica set.
+
+Events are applied by the publishing worker right away, and by the others
+shortly after. They can be delivered more than once, so handlers have to be
+idempotent. Whenever a worker stops tailing, because the database failed or
+the capped collection overwrote events it did not read yet, it resets every
+subscriber, which drops its state and rebuilds it from the database.
+"""
+
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from functools import cache
+from itertools import batched
+from logging import getLogger
+from threading import Thread
+from time import sleep
+from typing import Any
+
+from bson.objectid import ObjectId
+from pymongo import CursorType
+from pymongo.collection import Collection
+from pymongo.errors import CollectionInvalid
+
+from server.config import events_size
+from server.db import db
+
+EVENTS_COLLECTION = "events"
+"""Capped collection of events."""
+
+CLOCK_SKEW = 60
+"""Seconds of events which are read again when tailing starts, since ObjectIds
+published by other nodes are not ordered by their insertion."""
+
+RETRY_DELAY = 1
+"""Seconds to wait before tailing again, after a failure."""
+
+EVENT_BATCH_SIZE = 1000
+"""Number of document IDs in a single event."""
+
+type Handler = Callable[[list[ObjectId]], None]
+"""Applies an event, given the IDs of the changed documents."""
+
+_handlers: defaultdict[str, list[Handler]] = defaultdict(list)
+"""Handlers of each topic."""
+
+_resets: list[Callable[[], None]] = []
+"""Drop the state of each subscriber."""
+
+_logger = getLogger(__name__)
+
+
+def subscribe(topic: str, handler: Handler, reset: Callable[[], None]) -> None:
+    """Apply the events of a topic to in-memory state.
+
+    Events are only received from other workers once `listen` was called.
+
+    Args:
+        topic (str): Topic of the events.
+        handler (Handler): Applies an event.
+        reset (Callable[[], None]): Drops the whole state, when events may
+            have been missed.
+
+    """
+    _handlers[topic].append(handler)
+    _resets.append(reset)
+
+
+def _dispatch(topic: str | None, keys: list[ObjectId]) -> None:
+    """Apply an event to every subscriber of its topic."""
+    for handler in _handlers.get(topic or "", []):
+        handler(keys)
+
+
+@cache
+def _event_log() -> Collection[Any]:
+    """Get the capped collection of events, creating it if it is missing.
+
+    A collection which is not capped, for example one restored from a
+    snapshot, cannot be tailed, so it is replaced.
+
+    Returns:
+        Collection: Capped collection of events.
+
+    """
+    try:
+        return db.create_collection(EVENTS_COLLECTION, capped=True, size=events_size)
+    except CollectionInvalid:
+        if db[EVENTS_COLLECTION].options().get("capped"):
+            return db[EVENTS_COLLECTION]
+
+    _logger.warning("Replacing the events collection, which is not capped.")
+    db.drop_collection(EVENTS_COLLECTION)
+
+    try:
+        return db.create_collection(EVENTS_COLLECTION, capped=True, size=events_size)
+    except CollectionInvalid:
+        # Another worker replaced it first.
+        return db[EVENTS_COLLECTION]
+
+
+def publish(topic: str, keys: list[ObjectId]) -> None:
+    """Publish a change of documents to every worker.
+
+    Call this after writing the change to the database.
+
+    Args:
+        topic (str): Topic of the event.
+        keys (list[ObjectId]): Id of the changed documents.
+
+    """
+    if not keys:
+        return
+
+    _dispatch(topic, keys)
+    _event_log().insert_many(
+        [{"topic": topic, "keys": list(i)} for i in batched(keys, EVENT_BATCH_SIZE)],
+    )
+
+
+def _tail() -> None:
+    """Apply the events published by every worker, until the cursor dies."""
+    log = _event_log()
+    start = ObjectId.from_datetime(datetime.now(UTC) - timedelta(seconds=CLOCK_SKEW))
+
+    # Tailable cursors die right away if nothing matches, so mark the start.
+    log.insert_one({"topic": None, "keys": []})
+
+    cursor = log.find({"_id": {"$gte": start}}, cursor_type=CursorType.TAILABLE_AWAIT)
+
+    # Iteration stops whenever no event arrived for a while, without killing
+    # the cursor.
+    while cursor.alive:
+        for event in cursor:
+            _dispatch(event["topic"], event["keys"])
+
+
+def _listen_forever() -> None:
+    """Tail the events, and reset every subscriber whenever tailing stops.
+
+    Failures of handlers are logged rather than raised, since they would stop
+    this worker from receiving any further event.
+    """
+    while True:
+        try:
+            _tail()
+        except Exception:
+            _logger.exception("Tailing the events failed.")
+
+        # The collection may have been replaced meanwhile, so check it again.
+        _event_log.cache_clear()
+
+        for reset in _resets:
+            try:
+                reset()
+            except Exception:
+                _logger.exception("Resetting an event subscriber failed.")
+
+        sleep(RETRY_DELAY)
+
+
+@cache
+def listen() -> None:
+    """Start receiving the events of other workers, if not started already."""
+    Thread(target=_listen_forever, name="events", daemon=True).start()
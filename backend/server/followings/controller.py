@@ -1,48 +1,162 @@
-"""Controller for User Followings."""
+"""Controller for User Followings.
+
+Each follow relationship is a separate edge document:
+
+    {"follower": follower_id, "following": following_id}
+
+Edges are indexed in both directions, so followers and followings of a user
+are both read as sorted index ranges.
+"""
+
+from collections.abc import Iterator
+from itertools import batched, compress
+from typing import Any
 
 from bson.objectid import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from server.config import page_size_default
+from server.db import DUPLICATE_KEY, db
+from server.pagination import keyset, page_limit
+from server.users.controller import PROFILE_PROJECTION, invalidate_users
+from server.users.controller_model import DbUserNotFoundError, DbUserProfileList
 
-from server.db import db
-from server.users.controller_model import DbUserList, DbUserNotFoundError
+EDGE_BATCH_SIZE = 1000
+"""Number of users to update in a single counter write, when deleting edges."""
 
 
-def get_user_followers(following_id: ObjectId) -> DbUserList:
-    """Get user followers.
+def _get_profiles(user_ids: list[ObjectId]) -> DbUserProfileList:
+    """Get the profiles of users by their IDs, sorted by ID.
+
+    Args:
+        user_ids (list[ObjectId]): Id of users.
+
+    Returns:
+        DbUserProfileList: Users.
+
+    """
+    if not user_ids:
+        return DbUserProfileList([])
+
+    result = (
+        db.users.find({"_id": {"$in": user_ids}}, PROFILE_PROJECTION)
+        .sort("_id", 1)
+        .to_list()
+    )
+
+    return DbUserProfileList.model_validate(result)
+
+
+def get_user_followers(
+    following_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbUserProfileList:
+    """Get a page of user followers.
 
     Args:
         following_id (ObjectId): Id of user being followed.
+        after (ObjectId, optional): Id of the last follower on the previous page.
+            Defaults to None, which starts from the first follower.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Returns:
-        DbUserList: Followers.
+        DbUserProfileList: Followers.
 
     """
-    result = db.users.find(
-        {"followings": following_id},
-    ).to_list()
+    edges = (
+        db.followings.find(
+            {"following": following_id, **keyset(after, field="follower")},
+            {"_id": 0, "follower": 1},
+        )
+        .sort("follower", 1)
+        .limit(page_limit(limit))
+        .to_list()
+    )
 
-    return DbUserList.model_validate(result)
+    return _get_profiles([i["follower"] for i in edges])
 
 
-def get_user_followings(follower_id: ObjectId) -> DbUserList:
-    """Get user followings.
+def iter_follower_ids(following_id: ObjectId) -> Iterator[ObjectId]:
+    """Iterate over the IDs of every follower of a user.
+
+    Args:
+        following_id (ObjectId): Id of user being followed.
+
+    Yields:
+        ObjectId: Id of a follower.
+
+    """
+    for i in db.followings.find({"following": following_id}, {"_id": 0, "follower": 1}):
+        yield i["follower"]
+
+
+def get_following_ids(follower_id: ObjectId) -> list[ObjectId]:
+    """Get the IDs of every user followed by a user.
+
+    Args:
+        follower_id (ObjectId): Id of user who is following others.
+
+    Raises:
+        DbUserNotFoundError: User with the given ID was not in the database.
+
+    Returns:
+        list[ObjectId]: Id of followed users.
+
+    """
+    from server.users.controller import validate_user_id
+
+    result = [
+        i["following"]
+        for i in db.followings.find(
+            {"follower": follower_id},
+            {"_id": 0, "following": 1},
+        )
+    ]
+
+    if not result:
+        validate_user_id(follower_id)
+
+    return result
+
+
+def get_user_followings(
+    follower_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbUserProfileList:
+    """Get a page of user followings.
 
     Args:
         follower_id (ObjectId): Id of user who is following others.
+        after (ObjectId, optional): Id of the last following on the previous page.
+            Defaults to None, which starts from the first following.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Raises:
         DbUserNotFoundError: User with the given ID was not in the database.
 
     Returns:
-        DbUserList: Followings.
+        DbUserProfileList: Followings.
 
     """
-    from server.users.controller import get_user_by_id
+    from server.users.controller import validate_user_id
 
-    follower = get_user_by_id(follower_id)
+    edges = (
+        db.followings.find(
+            {"follower": follower_id, **keyset(after, field="following")},
+            {"_id": 0, "following": 1},
+        )
+        .sort("following", 1)
+        .limit(page_limit(limit))
+        .to_list()
+    )
 
-    result = db.users.find({"_id": {"$in": follower.followings}}).to_list()
+    if not edges:
+        validate_user_id(follower_id)
 
-    return DbUserList.model_validate(result)
+    return _get_profiles([i["following"] for i in edges])
 
 
 def follow_user(follower_id: ObjectId, following_id: ObjectId) -> bool:
@@ -59,19 +173,28 @@ def follow_user(follower_id: ObjectId, following_id: ObjectId) -> bool:
         bool: did anything change?
 
     """
+    from server.timelines.controller import backfill_timeline
     from server.users.controller import validate_user_id
 
     validate_user_id(following_id)
+    validate_user_id(follower_id)
 
-    result = db.users.update_one(
-        {"_id": follower_id},
-        {"$addToSet": {"followings": following_id}},
-    )
+    try:
+        db.followings.insert_one({"follower": follower_id, "following": following_id})
+    except OperationFailure as e:
+        if e.code == DUPLICATE_KEY:
+            return False
 
-    if result.matched_count < 1:
-        raise DbUserNotFoundError
+        raise
 
-    return result.modified_count > 0
+    db.users.update_one({"_id": follower_id}, {"$inc": {"following_count": 1}})
+    db.users.update_one({"_id": following_id}, {"$inc": {"follower_count": 1}})
+    invalidate_users([follower_id, following_id])
+
+    if follower_id != following_id:
+        backfill_timeline(follower_id, [following_id])
+
+    return True
 
 
 def unfollow_user(follower_id: ObjectId, following_id: ObjectId) -> bool:
@@ -88,16 +211,179 @@ def unfollow_user(follower_id: ObjectId, following_id: ObjectId) -> bool:
         bool: did anything change?
 
     """
+    from server.timelines.controller import remove_authors_from_timeline
     from server.users.controller import validate_user_id
 
     validate_user_id(following_id)
 
-    result = db.users.update_one(
-        {"_id": follower_id},
-        {"$pull": {"followings": following_id}},
+    result = db.followings.delete_one(
+        {"follower": follower_id, "following": following_id},
     )
 
-    if result.matched_count < 1:
+    if result.deleted_count < 1:
+        validate_user_id(follower_id)
+        return False
+
+    db.users.update_one({"_id": follower_id}, {"$inc": {"following_count": -1}})
+    db.users.update_one({"_id": following_id}, {"$inc": {"follower_count": -1}})
+    invalidate_users([follower_id, following_id])
+
+    if follower_id != following_id:
+        remove_authors_from_timeline(follower_id, [following_id])
+
+    return True
+
+
+def get_following_states(
+    follower_id: ObjectId,
+    following_ids: list[ObjectId],
+) -> list[bool]:
+    """Check which of the given users are followed by a user.
+
+    Args:
+        follower_id (ObjectId): Id of user who may be following others.
+        following_ids (list[ObjectId]): Id of users who may be followed.
+
+    Returns:
+        list[bool]: Is each of the given users followed, in the given order?
+
+    """
+    followed = {
+        i["following"]
+        for i in db.followings.find(
+            {"follower": follower_id, "following": {"$in": following_ids}},
+            {"_id": 0, "following": 1},
+        )
+    }
+
+    return [i in followed for i in following_ids]
+
+
+def _upsert_edges(follower_id: ObjectId, follow: list[ObjectId]) -> dict[int, Any]:
+    """Create the edges of followed users, unless they exist.
+
+    Args:
+        follower_id (ObjectId): Id of user who is following the others.
+        follow (list[ObjectId]): Id of users to follow.
+
+    Returns:
+        dict[int, Any]: Id of the created edges, by index of the followed user.
+
+    """
+    if not follow:
+        return {}
+
+    edges = [
+        UpdateOne(
+            {"follower": follower_id, "following": i},
+            {"$setOnInsert": {"follower": follower_id, "following": i}},
+            upsert=True,
+        )
+        for i in follow
+    ]
+
+    try:
+        return db.followings.bulk_write(edges, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        # Concurrent upserts of the same edge fail on the unique index, after
+        # another one created it.
+        if any(i["code"] != DUPLICATE_KEY for i in e.details["writeErrors"]):
+            raise
+
+        return {i["index"]: i["_id"] for i in e.details["upserted"]}
+
+
+def update_followings(
+    follower_id: ObjectId,
+    follow: list[ObjectId],
+    unfollow: list[ObjectId],
+) -> bool:
+    """Follow and unfollow many users at once.
+
+    Every user is checked by a single query, and followed edges are written by
+    a single bulk write. Unfollowed edges are deleted one by one, since a bulk
+    write does not report which deletes matched, and a concurrent unfollow may
+    have deleted some of them first. Users which were already followed, or were
+    not followed, are skipped.
+
+    Args:
+        follower_id (ObjectId): Id of user who is following the others.
+        follow (list[ObjectId]): Id of users to follow.
+        unfollow (list[ObjectId]): Id of users to unfollow.
+
+    Raises:
+        DbUserNotFoundError: At least one of the users were not found.
+
+    Returns:
+        bool: did anything change?
+
+    """
+    from server.timelines.controller import (
+        backfill_timeline,
+        remove_authors_from_timeline,
+    )
+
+    user_ids = {follower_id, *follow, *unfollow}
+    found = db.users.count_documents({"_id": {"$in": list(user_ids)}})
+
+    if found < len(user_ids):
         raise DbUserNotFoundError
 
-    return result.modified_count > 0
+    current = set(compress(unfollow, get_following_states(follower_id, unfollow)))
+
+    # Upserts report the edges which were created.
+    followed = [follow[i] for i in _upsert_edges(follower_id, follow)]
+    unfollowed = [
+        i
+        for i in current
+        if db.followings.delete_one(
+            {"follower": follower_id, "following": i},
+        ).deleted_count
+    ]
+
+    if not followed and not unfollowed:
+        return False
+
+    db.users.bulk_write(
+        [
+            UpdateOne(
+                {"_id": follower_id},
+                {"$inc": {"following_count": len(followed) - len(unfollowed)}},
+            ),
+            UpdateMany({"_id": {"$in": followed}}, {"$inc": {"follower_count": 1}}),
+            UpdateMany({"_id": {"$in": unfollowed}}, {"$inc": {"follower_count": -1}}),
+        ],
+        ordered=False,
+    )
+    invalidate_users([follower_id, *followed, *unfollowed])
+
+    others = [i for i in followed if i != follower_id]
+    backfill_timeline(follower_id, others)
+
+    others = [i for i in unfollowed if i != follower_id]
+    remove_authors_from_timeline(follower_id, others)
+
+    return True
+
+
+def delete_user_followings(user_id: ObjectId) -> None:
+    """Delete every follow relationship of a user, in both directions.
+
+    Args:
+        user_id (ObjectId): Id of user.
+
+    """
+    for field, other, counter in (
+        ("follower", "following", "follower_count"),
+        ("following", "follower", "following_count"),
+    ):
+        others = (i[other] for i in db.followings.find({field: user_id}, {other: 1}))
+
+        for batch in batched(others, EDGE_BATCH_SIZE):
+            db.users.update_many(
+                {"_id": {"$in": list(batch)}},
+                {"$inc": {counter: -1}},
+            )
+            invalidate_users(list(batch))
+
+        db.followings.delete_many({field: user_id})
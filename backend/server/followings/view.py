@@ -7,12 +7,21 @@ from flask_openapi3.models.tag import Tag
 from server.auth.view_model import AuthnFailed, AuthzFailed
 from server.followings.controller import (
     follow_user,
+    get_following_states,
     get_user_followers,
     get_user_followings,
     unfollow_user,
+    update_followings,
+)
+from server.followings.view_model import (
+    Follower,
+    Following,
+    FollowingsPatch,
+    FollowingsQuery,
+    FollowingStates,
 )
-from server.followings.view_model import Following
 from server.model_utils import model_convert
+from server.pagination import PageQuery, next_page_headers
 from server.plugins import current_user
 from server.users.controller_model import DbUserNotFoundError
 from server.users.view_model import UserId, UserNotFound, UsersList
@@ -28,11 +37,15 @@ bp = APIBlueprint("following", __name__, url_prefix="/users")
     tags=[_followings_tag],
     responses={200: UsersList},
 )
-def handle_get_user_followers(path: UserId):  # noqa: ANN201
+def handle_get_user_followers(path: UserId, query: PageQuery):  # noqa: ANN201
     """Get user followers."""
-    followers = get_user_followers(path.user_id)
+    followers = get_user_followers(path.user_id, query.after, query.limit)
 
-    return model_convert(UsersList, followers).model_dump()
+    return (
+        model_convert(UsersList, followers).model_dump(),
+        200,
+        next_page_headers(followers.root, query.limit),
+    )
 
 
 @bp.get(
@@ -41,14 +54,18 @@ def handle_get_user_followers(path: UserId):  # noqa: ANN201
     tags=[_followings_tag],
     responses={200: UsersList, 404: UserNotFound},
 )
-def handle_get_user_followings(path: UserId):  # noqa: ANN201
+def handle_get_user_followings(path: UserId, query: PageQuery):  # noqa: ANN201
     """Get user followings."""
     try:
-        followings = get_user_followings(path.user_id)
+        followings = get_user_followings(path.user_id, query.after, query.limit)
     except DbUserNotFoundError:
         return UserNotFound().model_dump(), 404
 
-    return model_convert(UsersList, followings).model_dump()
+    return (
+        model_convert(UsersList, followings).model_dump(),
+        200,
+        next_page_headers(followings.root, query.limit),
+    )
 
 
 @bp.put(
@@ -91,3 +108,37 @@ def handle_unfollow_user(path: Following):  # noqa: ANN201
         return UserNotFound().model_dump(), 404
 
     return "", 204
+
+
+@bp.get(
+    "/<follower_id>/followings/check",
+    operation_id="getFollowingStates",
+    tags=[_followings_tag],
+    responses={200: FollowingStates},
+)
+def handle_get_following_states(path: Follower, query: FollowingsQuery):  # noqa: ANN201
+    """Check which of the given users are followed by a user."""
+    states = get_following_states(path.follower_id, query.ids)
+
+    return FollowingStates(following=states).model_dump()
+
+
+@bp.patch(
+    "/<follower_id>/followings",
+    operation_id="updateFollowings",
+    tags=[_followings_tag],
+    security=[{"jwt": []}],
+    responses={204: None, 401: AuthnFailed, 403: AuthzFailed, 404: UserNotFound},
+)
+@jwt_required()
+def handle_update_followings(path: Follower, body: FollowingsPatch):  # noqa: ANN201
+    """Follow and unfollow many users at once."""
+    if current_user.user_id != path.follower_id and not current_user.admin:
+        return AuthzFailed().model_dump(), 403
+
+    try:
+        update_followings(path.follower_id, body.follow, body.unfollow)
+    except DbUserNotFoundError:
+        return UserNotFound().model_dump(), 404
+
+    return "", 204
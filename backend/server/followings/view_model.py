@@ -1,7 +1,10 @@
 """Models for User Followings API."""
 
-from pydantic import BaseModel
+from typing import Self
 
+from pydantic import BaseModel, Field, model_validator
+
+from server.config import page_size_max
 from server.model_utils import ObjectIdStr
 
 
@@ -10,3 +13,37 @@ class Following(BaseModel):
 
     follower_id: ObjectIdStr
     following_id: ObjectIdStr
+
+
+class Follower(BaseModel):
+    """User who is following others."""
+
+    follower_id: ObjectIdStr
+
+
+class FollowingsPatch(BaseModel):
+    """Users to follow and unfollow at once."""
+
+    follow: list[ObjectIdStr] = Field(default=[], max_length=page_size_max)
+    unfollow: list[ObjectIdStr] = Field(default=[], max_length=page_size_max)
+
+    @model_validator(mode="after")
+    def _check_overlap(self) -> Self:
+        """Reject users which would be both followed and unfollowed."""
+        if set(self.follow) & set(self.unfollow):
+            msg = "Cannot both follow and unfollow the same user"
+            raise ValueError(msg)
+
+        return self
+
+
+class FollowingsQuery(BaseModel):
+    """Users who may be followed."""
+
+    ids: list[ObjectIdStr] = Field(min_length=1, max_length=page_size_max)
+
+
+class FollowingStates(BaseModel):
+    """Whether each of the queried users is followed, in the queried order."""
+
+    following: list[bool]
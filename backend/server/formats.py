@@ -0,0 +1,156 @@
+"""Binary response and request body formats, chosen by content negotiation.
+
+Clients which send `Accept: application/msgpack` or `Accept: application/cbor`
+get the same response models encoded as MessagePack or CBOR, instead of JSON.
+Request bodies are decoded the same way, according to their `Content-Type`.
+Errors raised before a view returns, such as validation errors, stay JSON.
+"""
+
+from collections.abc import Callable
+from datetime import UTC
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any
+
+import cbor2
+import msgpack
+from flask import Request as FlaskRequest
+from flask import Response, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+from server.json_provider import OrjsonProvider, encode
+
+if TYPE_CHECKING:
+    from flask_openapi3.openapi import OpenAPI
+
+JSON = OrjsonProvider.mimetype
+"""Mimetype of JSON, the default format."""
+MSGPACK = "application/msgpack"
+"""Mimetype of MessagePack."""
+CBOR = "application/cbor"
+"""Mimetype of CBOR."""
+
+
+def encode_msgpack(value: object) -> bytes:
+    """Encode a value as MessagePack.
+
+    Args:
+        value (object): The value.
+
+    Returns:
+        bytes: MessagePack data.
+
+    """
+    return msgpack.packb(value, default=DefaultJSONProvider.default)
+
+
+def _cbor_default(encoder: cbor2.CBOREncoder, value: object) -> None:
+    """Encode values which CBOR does not support, like JSON does."""
+    encoder.encode(DefaultJSONProvider.default(value))
+
+
+def encode_cbor(value: object) -> bytes:
+    """Encode a value as CBOR.
+
+    Args:
+        value (object): The value.
+
+    Returns:
+        bytes: CBOR data.
+
+    """
+    return cbor2.dumps(value, default=_cbor_default, timezone=UTC)
+
+
+ENCODERS: dict[str, Callable[[object], bytes]] = {
+    JSON: encode,
+    MSGPACK: encode_msgpack,
+    CBOR: encode_cbor,
+}
+"""Encoders of each response format, by mimetype. JSON comes first, so it is
+preferred when clients accept any format."""
+
+DECODERS: dict[str, Callable[[bytes], Any]] = {
+    MSGPACK: msgpack.unpackb,
+    CBOR: cbor2.loads,
+}
+"""Decoders of binary request bodies, by mimetype."""
+
+
+def response_mimetype() -> str:
+    """Choose the response format of the current request.
+
+    Returns:
+        str: The accepted mimetype, JSON by default or outside of requests.
+
+    """
+    if not has_request_context():
+        return JSON
+
+    return request.accept_mimetypes.best_match(ENCODERS, default=JSON) or JSON
+
+
+class Request(FlaskRequest):
+    """Request which decodes binary bodies like JSON ones."""
+
+    def get_json(
+        self,
+        force: bool = False,  # noqa: FBT001, FBT002
+        silent: bool = False,  # noqa: FBT001, FBT002
+        cache: bool = True,  # noqa: FBT001, FBT002
+    ) -> Any | None:  # noqa: ANN401
+        """Decode the body, as JSON or one of the binary formats.
+
+        See `flask.Request.get_json`.
+        """
+        decoder = DECODERS.get(self.mimetype)
+
+        if decoder is None:
+            return super().get_json(force=force, silent=silent, cache=cache)
+
+        try:
+            return decoder(self.get_data(cache=cache))
+        except (ValueError, TypeError, cbor2.CBORDecodeError) as e:
+            if silent:
+                return None
+
+            return self.on_json_loading_failed(e)
+
+
+class NegotiatingProvider(OrjsonProvider):
+    """JSON provider which encodes responses in the accepted format."""
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:  # noqa: ANN401
+        """Create a response in the accepted format.
+
+        See `flask.json.provider.JSONProvider`.
+        """
+        mimetype = response_mimetype()
+
+        if mimetype == JSON:
+            return super().response(*args, **kwargs)
+
+        return self._app.response_class(
+            ENCODERS[mimetype](self._prepare_response_obj(args, kwargs)),
+            mimetype=mimetype,
+        )
+
+
+def init_app(app: "OpenAPI") -> None:
+    """Negotiate the request and response formats of an app.
+
+    Args:
+        app (OpenAPI): The flask app.
+
+    """
+    app.json = NegotiatingProvider(app)
+    app.request_class = Request
+
+    @app.after_request
+    def vary(response: Response) -> Response:
+        if (
+            response.mimetype in ENCODERS
+            or response.status_code == HTTPStatus.NOT_MODIFIED
+        ):
+            response.vary.add("Accept")
+
+        return response
@@ -0,0 +1,65 @@
+"""Registry of database indexes.
+
+Every query of the controllers should be served by one of these indexes.
+Run `tasks/indexes.py` to build the missing ones on a live database.
+"""
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from server.config import tombstone_ttl
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "users": [
+        IndexModel("email", unique=True),
+        # Users whose posts are pulled into feeds.
+        IndexModel("feed_pulled", partialFilterExpression={"feed_pulled": True}),
+        # Users whose profile changes were not propagated to snapshots yet.
+        IndexModel(
+            "snapshot_pending",
+            partialFilterExpression={"snapshot_pending": {"$exists": True}},
+        ),
+    ],
+    "followings": [
+        # Followings of a user, sorted for pagination. Also prevents duplicates.
+        IndexModel([("follower", ASCENDING), ("following", ASCENDING)], unique=True),
+        # Followers of a user, sorted for pagination.
+        IndexModel([("following", ASCENDING), ("follower", ASCENDING)]),
+    ],
+    "posts": [
+        # Posts by an author, newest first. Also serves feeds, by merging one
+        # index range per followed user.
+        IndexModel([("author", ASCENDING), ("_id", DESCENDING)]),
+        # Changes of all posts, and of posts by authors, for delta syncs.
+        IndexModel([("change_time", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel(
+            [("author", ASCENDING), ("change_time", ASCENDING), ("_id", ASCENDING)],
+        ),
+    ],
+    "comments": [
+        # Comments of a post, oldest first.
+        IndexModel([("post", ASCENDING), ("_id", ASCENDING)]),
+        # Changes of the comments of a post, for delta syncs.
+        IndexModel(
+            [("post", ASCENDING), ("change_time", ASCENDING), ("_id", ASCENDING)],
+        ),
+        # Comments by an author, newest first.
+        IndexModel([("author", ASCENDING), ("_id", DESCENDING)]),
+    ],
+    "timelines": [
+        # Timelines containing a deleted post.
+        IndexModel("posts.post"),
+    ],
+    "post_tombstones": [
+        # Expiry, and deletions of all posts.
+        IndexModel("time", expireAfterSeconds=tombstone_ttl),
+        # Deletions of posts by authors.
+        IndexModel([("author", ASCENDING), ("time", ASCENDING)]),
+    ],
+    "comment_tombstones": [
+        # Expiry.
+        IndexModel("time", expireAfterSeconds=tombstone_ttl),
+        # Deletions of the comments of a post.
+        IndexModel([("post", ASCENDING), ("time", ASCENDING)]),
+    ],
+}
+"""Indexes of each collection, excluding the implicit `_id` index."""
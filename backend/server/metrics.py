@@ -0,0 +1,27 @@
+"""Metrics of the in-memory state of a worker, reported by `GET /metrics`."""
+
+from collections.abc import Callable
+
+_sources: dict[str, Callable[[], dict[str, int]]] = {}
+"""Reports each group of metrics."""
+
+
+def register(name: str, source: Callable[[], dict[str, int]]) -> None:
+    """Report a group of metrics.
+
+    Args:
+        name (str): Name of the group.
+        source (Callable[[], dict[str, int]]): Reports the current metrics.
+
+    """
+    _sources[name] = source
+
+
+def collect() -> dict[str, dict[str, int]]:
+    """Report every group of metrics.
+
+    Returns:
+        dict[str, dict[str, int]]: Metrics, by group.
+
+    """
+    return {name: source() for name, source in _sources.items()}
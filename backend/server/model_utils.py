@@ -1,7 +1,10 @@
 """Helpers for defining and user Pydantic models."""
 
+from collections.abc import Callable
 from datetime import UTC, datetime
-from typing import Annotated
+from functools import cache, partial
+from types import UnionType
+from typing import Annotated, Any, Union, get_args, get_origin
 
 from bson.errors import InvalidId
 from bson.objectid import ObjectId
@@ -13,6 +16,7 @@ from pydantic import (
     Field,
     GetPydanticSchema,
     PlainSerializer,
+    TypeAdapter,
 )
 from pydantic_core.core_schema import any_schema, str_schema
 
@@ -90,14 +94,110 @@ SelfIdStr = Annotated[
 """Stringified ObjectId with alias for `_id`, also deserializes string into ObjectId."""
 
 
+type _Converter = Callable[[Any], Any]
+"""Converts a trusted value of a field into its target type."""
+
+
+@cache
+def _adapter(target: type[BaseModel]) -> TypeAdapter[Any]:
+    """Get a cached type adapter of a Pydantic model.
+
+    Args:
+        target (type[BaseModel]): The model.
+
+    Returns:
+        TypeAdapter: Validator of the model.
+
+    """
+    return TypeAdapter(target)
+
+
+@cache
+def _converter(annotation: Any) -> _Converter | None:  # noqa: ANN401
+    """Get a converter of trusted values into a field type.
+
+    Args:
+        annotation (Any): Type of the field.
+
+    Returns:
+        _Converter | None: The converter, or None if values are kept as is.
+
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return partial(_construct, annotation)
+
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin is list and args:
+        item = _converter(args[0])
+        return None if item is None else lambda x: [item(i) for i in x]
+
+    if origin in {Union, UnionType}:
+        converters = [i for i in map(_converter, args) if i is not None]
+
+        if len(converters) == 1:
+            convert = converters[0]
+            return lambda x: None if x is None else convert(x)
+
+    return None
+
+
+@cache
+def _plan(target: type[BaseModel]) -> tuple[tuple[str, _Converter | None], ...]:
+    """Get the fields of a Pydantic model, and converters of their values.
+
+    Args:
+        target (type[BaseModel]): The model.
+
+    Returns:
+        tuple[tuple[str, _Converter | None], ...]: Name and converter of each
+            field.
+
+    """
+    return tuple(
+        (name, _converter(field.annotation))
+        for name, field in target.model_fields.items()
+    )
+
+
+def _construct[T: BaseModel](target: type[T], value: object) -> T:
+    """Construct a Pydantic model from a trusted model with the same fields.
+
+    Values which are not models are validated instead.
+
+    Args:
+        target (type[T]): The model to construct.
+        value (object): Source model, or any value to validate.
+
+    Returns:
+        T: Instance of the target model.
+
+    """
+    if not isinstance(value, BaseModel):
+        return _adapter(target).validate_python(value)
+
+    source = value.__dict__
+    values: dict[str, Any] = {}
+
+    for name, convert in _plan(target):
+        if name in source:
+            field = source[name]
+            values[name] = field if convert is None or field is None else convert(field)
+
+    return target.model_construct(**values)
+
+
 def model_convert[T: BaseModel](target: type[T], value: BaseModel) -> T:
     """Convert a Pydantic model instance into another Pydantic model.
 
-    Raises:
-        ValidationError: Could not convert between the models.
+    The value has to be validated already, like models returned by the
+    controllers, since fields are matched by name and copied without being
+    validated again. Nested models and lists of models are converted the same
+    way. Fields which are missing from the value take their default.
 
     Returns:
         T: Instance of the other pydantic model.
 
     """
-    return target.model_validate(value.model_dump(by_alias=True))
+    return _construct(target, value)
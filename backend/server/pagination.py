@@ -0,0 +1,304 @@
+"""Keyset pagination of lists."""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import Annotated, Any, Protocol
+
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pydantic import BaseModel, BeforeValidator, Field, GetPydanticSchema
+from pydantic_core.core_schema import any_schema, str_schema
+from pymongo.collection import Collection
+
+from server.config import page_size_default, page_size_max
+from server.db import RAW
+from server.json_provider import STREAM_BATCH_SIZE
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+"""Response header containing the cursor of the next page."""
+
+_OID_LENGTH = 12
+"""Length of an ObjectId in bytes."""
+
+
+class InvalidCursorError(ValueError):
+    """Given page cursor was invalid."""
+
+    def __init__(self, value: str) -> None:
+        """Represent an invalid page cursor.
+
+        Args:
+            value (str): Given cursor.
+
+        """
+        super().__init__(f"Invalid page cursor: {value!r}")
+
+
+class _HasId(Protocol):
+    """Any item with an ObjectId."""
+
+    @property
+    def id(self) -> ObjectId: ...
+
+
+def encode_cursor(value: ObjectId) -> str:
+    """Encode an ObjectId into an opaque page cursor.
+
+    Args:
+        value (ObjectId): Id of the last item on a page.
+
+    Returns:
+        str: Page cursor.
+
+    """
+    return urlsafe_b64encode(value.binary).decode().rstrip("=")
+
+
+def decode_cursor(value: str | ObjectId) -> ObjectId:
+    """Decode an opaque page cursor into an ObjectId.
+
+    Args:
+        value (str | ObjectId): Page cursor.
+
+    Raises:
+        InvalidCursorError: Value is not a valid page cursor.
+
+    Returns:
+        ObjectId: Id of the last item on the previous page.
+
+    """
+    if isinstance(value, ObjectId):
+        return value
+
+    try:
+        raw = urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    except (BinasciiError, ValueError, TypeError) as e:
+        raise InvalidCursorError(value) from e
+
+    if len(raw) != _OID_LENGTH:
+        raise InvalidCursorError(value)
+
+    return ObjectId(raw)
+
+
+Cursor = Annotated[
+    ObjectId,
+    GetPydanticSchema(
+        lambda _tp, _handler: any_schema(),
+        lambda _tp, handler: handler(str_schema()),
+    ),
+    BeforeValidator(decode_cursor),
+]
+"""Opaque page cursor, deserializes into the ObjectId of the last seen item."""
+
+
+class PageQuery(BaseModel):
+    """Page of a list.
+
+    Pass the `X-Next-Cursor` response header as `after` to get the next page.
+    The header is missing on the last page.
+    """
+
+    after: Cursor | None = None
+    limit: int = Field(default=page_size_default, ge=1, le=page_size_max)
+
+
+def page_limit(limit: int) -> int:
+    """Clamp a requested page size to the server-side bounds.
+
+    Args:
+        limit (int): Requested page size.
+
+    Returns:
+        int: Effective page size.
+
+    """
+    return max(1, min(limit, page_size_max))
+
+
+def keyset(
+    after: ObjectId | None,
+    *,
+    descending: bool = False,
+    field: str = "_id",
+) -> dict[str, Any]:
+    """Create a filter which skips everything up to and including a cursor.
+
+    Args:
+        after (ObjectId, optional): Id of the last seen item.
+        descending (bool, optional): Are items sorted by descending `field`?
+            Defaults to False.
+        field (str, optional): Field holding the item ID. Defaults to `_id`.
+
+    Returns:
+        dict[str, Any]: Filter on `field`, empty if `after` is None.
+
+    """
+    if after is None:
+        return {}
+
+    return {field: {"$lt" if descending else "$gt": after}}
+
+
+def next_page_headers(
+    items: Sequence[_HasId] | Sequence[RawBSONDocument],
+    limit: int,
+) -> dict[str, str]:
+    """Create response headers pointing to the next page.
+
+    Args:
+        items (Sequence[_HasId] | Sequence[RawBSONDocument]): Items on the
+            current page, as models or raw documents.
+        limit (int): Requested page size.
+
+    Returns:
+        dict[str, str]: Response headers, empty if this is the last page.
+
+    """
+    if not items or len(items) < page_limit(limit):
+        return {}
+
+    last = items[-1]
+
+    return next_cursor_headers(
+        last["_id"] if isinstance(last, RawBSONDocument) else last.id,
+    )
+
+
+def next_cursor_headers(last_id: ObjectId | None) -> dict[str, str]:
+    """Create response headers pointing to the page after an item.
+
+    Args:
+        last_id (ObjectId, optional): Id of the last item on a full page, or
+            None if this is the last page.
+
+    Returns:
+        dict[str, str]: Response headers, empty if this is the last page.
+
+    """
+    if last_id is None:
+        return {}
+
+    return {NEXT_CURSOR_HEADER: encode_cursor(last_id)}
+
+
+def last_page_id(
+    collection: Collection[Any],
+    pipeline: list[dict[str, Any]],
+    limit: int,
+) -> ObjectId | None:
+    """Find the ID of the last item of a page, without reading the page.
+
+    This allows sending the next page cursor before the page itself. The query
+    only reads the `_id` of items, so it is covered by the index of the page.
+    It is separate from the read of the page, so it races with writes: when an
+    item of the page is deleted in between, the cursor skips an item, and when
+    one is inserted, an item is sent twice.
+
+    Args:
+        collection (Collection): Collection of the items.
+        pipeline (list[dict[str, Any]]): Aggregation of the page, which has to
+            start with its `$match` and `$sort` stages.
+        limit (int): Requested page size.
+
+    Returns:
+        ObjectId | None: Id of the last item, or None if the page is not full.
+
+    """
+    last = (
+        collection.find(pipeline[0]["$match"], {"_id": 1})
+        .sort(pipeline[1]["$sort"])
+        .skip(page_limit(limit) - 1)
+        .limit(1)
+        .to_list()
+    )
+
+    return last[0]["_id"] if last else None
+
+
+def stream_page(
+    collection: Collection[RawBSONDocument],
+    pipeline: list[dict[str, Any]],
+    limit: int,
+) -> tuple[Iterable[RawBSONDocument], ObjectId | None]:
+    """Read a page as raw BSON, along with the ID of its last item.
+
+    Pages which fit in the first batch of the cursor are read right away, and
+    their last item is taken from the page itself. Larger pages are read one
+    batch at a time, and their last item is found by `last_page_id`.
+
+    Args:
+        collection (Collection): Collection of the items, with raw BSON codec
+            options.
+        pipeline (list[dict[str, Any]]): Aggregation of the page, which has to
+            start with its `$match` and `$sort` stages.
+        limit (int): Requested page size.
+
+    Returns:
+        tuple[Iterable[RawBSONDocument], ObjectId | None]: Items of the page,
+            and ID of the last one if the page is full.
+
+    """
+    cursor = collection.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+
+    if page_limit(limit) > STREAM_BATCH_SIZE:
+        return cursor, last_page_id(collection, pipeline, limit)
+
+    page = cursor.to_list()
+
+    return page, page[-1]["_id"] if len(page) == page_limit(limit) else None
+
+
+def iterate_pages[T: _HasId](
+    fetch: Callable[[ObjectId | None, int], Sequence[T]],
+) -> Iterator[T]:
+    """Iterate over every item of a paginated list.
+
+    Args:
+        fetch (Callable[[ObjectId | None, int], Sequence[T]]): Fetches a page,
+            given the cursor and the page size.
+
+    Yields:
+        T: Items of all pages.
+
+    """
+    after: ObjectId | None = None
+
+    while True:
+        page = fetch(after, page_size_max)
+
+        yield from page
+
+        if len(page) < page_size_max:
+            return
+
+        after = page[-1].id
+
+
+def page_versions(
+    collection: Collection[Any],
+    pipeline: list[dict[str, Any]],
+    limit: int,
+    projection: dict[str, Any],
+) -> list[RawBSONDocument]:
+    """Read the mutable fields of the items of a page, for its ETag.
+
+    Args:
+        collection (Collection): Collection of the items.
+        pipeline (list[dict[str, Any]]): Aggregation of the page, which has to
+            start with its `$match` and `$sort` stages.
+        limit (int): Requested page size.
+        projection (dict[str, Any]): Mutable fields of each item.
+
+    Returns:
+        list[RawBSONDocument]: Projected items, with their IDs.
+
+    """
+    return (
+        collection.with_options(codec_options=RAW)
+        .find(pipeline[0]["$match"], projection)
+        .sort(pipeline[1]["$sort"])
+        .limit(page_limit(limit))
+        .to_list()
+    )
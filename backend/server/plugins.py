@@ -14,12 +14,13 @@ from server.auth.view_model import (
     AuthnMissing,
 )
 from server.config import admin_email, fe_url
+from server.pagination import NEXT_CURSOR_HEADER
 from server.users.view_model import User
 
 bcrypt = Bcrypt()
 """Bcrypt extension, for hashing and verifying passwords."""
 
-cors = CORS(origins=fe_url)
+cors = CORS(origins=fe_url, expose_headers=[NEXT_CURSOR_HEADER, "ETag"])
 """Cross-Origin Resource Sharing extension, to allow frontend to access the API."""
 
 jwt = JWTManager()
@@ -1,36 +1,271 @@
 """Controller for posts."""
 
+from collections.abc import Iterable
 from datetime import UTC, datetime
+from heapq import merge
+from itertools import batched, chain, islice
 from typing import Any
 
 from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from server.config import (
+    feed_merge_batch_size,
+    feed_strategy,
+    page_size_default,
+    recent_posts,
+)
+from server.db import RAW, db, get_one
+from server.events import publish
+from server.pagination import keyset, page_limit, page_versions, stream_page
+from server.posts.controller_model import (
+    DbPost,
+    DbPostDelta,
+    DbPostList,
+    DbPostNotFoundError,
+    FeedStrategy,
+)
+from server.sync import (
+    add_tombstones,
+    changes_pipeline,
+    check_changes,
+    get_tombstones,
+    sync_watermark,
+)
+from server.timelines.controller_model import DbTimelinePage
+from server.users.controller import AUTHOR_SNAPSHOT, invalidate_users
+
+VERSION_PROJECTION = {"modification_time": 1, "comment_count": 1, "author_snapshot": 1}
+"""Projection of the post fields which change, for ETags."""
+
+POSTS_TOPIC = "posts"
+"""Topic of the events of changed posts."""
+
+
+def publish_posts(post_ids: list[ObjectId]) -> None:
+    """Update changed posts in the recent posts of every worker.
+
+    Call this after every write to posts, including their comment counts and
+    author snapshots.
 
-from server.db import db, get_one
-from server.posts.controller_model import DbPost, DbPostList, DbPostNotFoundError
+    Args:
+        post_ids (list[ObjectId]): Id of the changed posts.
+
+    """
+    if recent_posts:
+        publish(POSTS_TOPIC, post_ids)
 
 
-def get_all_posts() -> DbPostList:
-    """Get all posts.
+def _all_posts_pipeline(after: ObjectId | None, limit: int) -> list[dict[str, Any]]:
+    """Create the aggregation of a page of all posts, newest first.
+
+    Args:
+        after (ObjectId, optional): Id of the last post on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        list[dict[str, Any]]: Aggregation pipeline.
+
+    """
+    return [
+        {"$match": keyset(after, descending=True)},
+        {"$sort": {"_id": -1}},
+        {"$limit": page_limit(limit)},
+        *AUTHOR_SNAPSHOT,
+    ]
+
+
+def get_all_posts(
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbPostList:
+    """Get a page of all posts, newest first.
+
+    Args:
+        after (ObjectId, optional): Id of the last post on the previous page.
+            Defaults to None, which starts from the newest post.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Returns:
         DbPostList: Posts.
 
     """
-    result = db.posts.aggregate(
+    result = db.posts.aggregate(_all_posts_pipeline(after, limit)).to_list()
+
+    return DbPostList.model_validate(result)
+
+
+def get_all_posts_raw(
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> list[RawBSONDocument]:
+    """Get a page of all posts as raw BSON, newest first. See `get_all_posts`.
+
+    Returns:
+        list[RawBSONDocument]: Posts.
+
+    """
+    return (
+        db.posts.with_options(codec_options=RAW)
+        .aggregate(_all_posts_pipeline(after, limit))
+        .to_list()
+    )
+
+
+def stream_all_posts(
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> tuple[Iterable[RawBSONDocument], ObjectId | None]:
+    """Stream a page of all posts as raw BSON, newest first.
+
+    See `get_all_posts`.
+
+    Returns:
+        tuple[Iterable[RawBSONDocument], ObjectId | None]: Posts,
+            and ID of the last one if the page is full.
+
+    """
+    pipeline = _all_posts_pipeline(after, limit)
+    posts = db.posts.with_options(codec_options=RAW)
+
+    return stream_page(posts, pipeline, limit)
+
+
+def _get_posts_with_versions(
+    match: dict[str, Any],
+    limit: int,
+) -> list[tuple[DbPost, RawBSONDocument]]:
+    """Get the newest posts matching a filter, along with their ETag versions.
+
+    Args:
+        match (dict[str, Any]): Filter of the posts.
+        limit (int): Maximum number of posts.
+
+    Returns:
+        list[tuple[DbPost, RawBSONDocument]]: Posts, newest first, and their
+            fields projected like `get_all_posts_versions`.
+
+    """
+    posts = db.posts.aggregate(
         [
-            {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "author",
-                    "foreignField": "_id",
-                    "as": "author",
-                },
-            },
-            {"$unwind": {"path": "$author"}},
+            {"$match": match},
+            {"$sort": {"_id": -1}},
+            {"$limit": limit},
+            *AUTHOR_SNAPSHOT,
         ],
     ).to_list()
+    versions = {
+        i["_id"]: i
+        for i in db.posts.with_options(codec_options=RAW).find(
+            {"_id": {"$in": [i["_id"] for i in posts]}},
+            VERSION_PROJECTION,
+        )
+    }
 
-    return DbPostList.model_validate(result)
+    return [
+        (DbPost.model_validate(i), versions[i["_id"]])
+        for i in posts
+        if i["_id"] in versions
+    ]
+
+
+def get_newest_posts(limit: int) -> list[tuple[DbPost, RawBSONDocument]]:
+    """Get the newest posts, along with their ETag versions.
+
+    Unlike `get_all_posts`, the limit is not capped to the maximum page size.
+
+    Args:
+        limit (int): Number of posts.
+
+    Returns:
+        list[tuple[DbPost, RawBSONDocument]]: Posts, newest first, and their
+            versions.
+
+    """
+    return _get_posts_with_versions({}, limit)
+
+
+def get_posts_with_versions(
+    post_ids: list[ObjectId],
+) -> list[tuple[DbPost, RawBSONDocument]]:
+    """Get posts by their IDs, along with their ETag versions.
+
+    Args:
+        post_ids (list[ObjectId]): Id of posts.
+
+    Returns:
+        list[tuple[DbPost, RawBSONDocument]]: Posts which exist, newest first,
+            and their versions.
+
+    """
+    if not post_ids:
+        return []
+
+    return _get_posts_with_versions({"_id": {"$in": post_ids}}, len(post_ids))
+
+
+def get_all_posts_versions(
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> list[RawBSONDocument]:
+    """Get the changing fields of a page of all posts. See `get_all_posts`.
+
+    Returns:
+        list[RawBSONDocument]: Projected posts.
+
+    """
+    return page_versions(
+        db.posts,
+        _all_posts_pipeline(after, limit),
+        limit,
+        VERSION_PROJECTION,
+    )
+
+
+def _get_post_changes(match: dict[str, Any], since: datetime) -> DbPostDelta:
+    """Get the changes of a list of posts since a watermark.
+
+    Args:
+        match (dict[str, Any]): Filter of the list.
+        since (datetime): Watermark of the sync.
+
+    Raises:
+        DbSyncExpiredError: Changes since the watermark are not available.
+
+    Returns:
+        DbPostDelta: Changed and deleted posts.
+
+    """
+    watermark = sync_watermark(since)
+    changed = db.posts.aggregate(
+        [*changes_pipeline(match, since), *AUTHOR_SNAPSHOT],
+    ).to_list()
+
+    check_changes(changed)
+
+    return DbPostDelta.model_validate(
+        {
+            "changed": changed,
+            "deleted": get_tombstones(db.post_tombstones, match, since),
+            "watermark": watermark,
+        },
+    )
+
+
+def get_all_posts_changes(since: datetime) -> DbPostDelta:
+    """Get the changes of all posts since a watermark. See `get_all_posts`.
+
+    Args:
+        since (datetime): Watermark of the sync.
+
+    Raises:
+        DbSyncExpiredError: Changes since the watermark are not available.
+
+    Returns:
+        DbPostDelta: Changed and deleted posts.
+
+    """
+    return _get_post_changes({}, since)
 
 
 def get_post_by_id(post_id: ObjectId) -> DbPost:
@@ -50,15 +285,7 @@ def get_post_by_id(post_id: ObjectId) -> DbPost:
         db.posts.aggregate(
             [
                 {"$match": {"_id": post_id}},
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "author",
-                        "foreignField": "_id",
-                        "as": "author",
-                    },
-                },
-                {"$unwind": {"path": "$author"}},
+                *AUTHOR_SNAPSHOT,
             ],
         )
     )
@@ -69,6 +296,22 @@ def get_post_by_id(post_id: ObjectId) -> DbPost:
     return DbPost.model_validate(result)
 
 
+def get_post_version(post_id: ObjectId) -> RawBSONDocument | None:
+    """Get the changing fields of a post, without building it.
+
+    Args:
+        post_id (ObjectId): ID of post.
+
+    Returns:
+        RawBSONDocument | None: Projected post, or None if it does not exist.
+
+    """
+    return db.posts.with_options(codec_options=RAW).find_one(
+        {"_id": post_id},
+        VERSION_PROJECTION,
+    )
+
+
 def validate_post_id(post_id: ObjectId) -> None:
     """Check if a post with the given ID exists without fetching its data.
 
@@ -85,39 +328,152 @@ def validate_post_id(post_id: ObjectId) -> None:
         raise DbPostNotFoundError
 
 
-def get_posts_by_author(author_id: ObjectId) -> DbPostList:
-    """Get posts by an author.
+def increment_comment_count(post_id: ObjectId, amount: int = 1) -> bool:
+    """Add to the comment count of a post.
+
+    Args:
+        post_id (ObjectId): Id of post.
+        amount (int, optional): Number of added comments, negative for removed
+            ones. Defaults to 1.
+
+    Returns:
+        bool: Did the post exist?
+
+    """
+    result = db.posts.update_one(
+        {"_id": post_id},
+        {"$inc": {"comment_count": amount}, "$set": {"change_time": datetime.now(UTC)}},
+    )
+
+    if result.matched_count < 1:
+        return False
+
+    publish_posts([post_id])
+
+    return True
+
+
+def _posts_by_author_pipeline(
+    author_id: ObjectId,
+    after: ObjectId | None,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """Create the aggregation of a page of posts by an author, newest first.
 
     Args:
         author_id (ObjectId): Id of authoring user.
+        after (ObjectId, optional): Id of the last post on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        list[dict[str, Any]]: Aggregation pipeline.
+
+    """
+    return [
+        {"$match": {"author": author_id, **keyset(after, descending=True)}},
+        {"$sort": {"_id": -1}},
+        {"$limit": page_limit(limit)},
+        *AUTHOR_SNAPSHOT,
+    ]
+
+
+def get_posts_by_author(
+    author_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbPostList:
+    """Get a page of posts by an author, newest first.
+
+    Args:
+        author_id (ObjectId): Id of authoring user.
+        after (ObjectId, optional): Id of the last post on the previous page.
+            Defaults to None, which starts from the newest post.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Returns:
         DbPostList: Posts by the author.
 
     """
     result = db.posts.aggregate(
-        [
-            {"$match": {"author": author_id}},
-            {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "author",
-                    "foreignField": "_id",
-                    "as": "author",
-                },
-            },
-            {"$unwind": {"path": "$author"}},
-        ],
+        _posts_by_author_pipeline(author_id, after, limit),
     ).to_list()
 
     return DbPostList.model_validate(result)
 
 
-def get_post_feed(user_id: ObjectId) -> DbPostList:
-    """Get post feed of user.
+def get_posts_by_author_raw(
+    author_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> list[RawBSONDocument]:
+    """Get a page of posts by an author as raw BSON, newest first.
+
+    See `get_posts_by_author`.
+
+    Returns:
+        list[RawBSONDocument]: Posts by the author.
+
+    """
+    return (
+        db.posts.with_options(codec_options=RAW)
+        .aggregate(_posts_by_author_pipeline(author_id, after, limit))
+        .to_list()
+    )
+
+
+def stream_posts_by_author(
+    author_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> tuple[Iterable[RawBSONDocument], ObjectId | None]:
+    """Stream a page of posts by an author as raw BSON, newest first.
+
+    See `get_posts_by_author`.
+
+    Returns:
+        tuple[Iterable[RawBSONDocument], ObjectId | None]: Posts,
+            and ID of the last one if the page is full.
+
+    """
+    pipeline = _posts_by_author_pipeline(author_id, after, limit)
+    posts = db.posts.with_options(codec_options=RAW)
+
+    return stream_page(posts, pipeline, limit)
+
+
+def get_posts_by_author_versions(
+    author_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> list[RawBSONDocument]:
+    """Get the changing fields of a page of posts by an author.
+
+    See `get_posts_by_author`.
+
+    Returns:
+        list[RawBSONDocument]: Projected posts.
+
+    """
+    return page_versions(
+        db.posts,
+        _posts_by_author_pipeline(author_id, after, limit),
+        limit,
+        VERSION_PROJECTION,
+    )
+
+
+def get_post_feed(
+    user_id: ObjectId,
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbPostList:
+    """Get a page of the post feed of user, newest first.
 
     Args:
         user_id (ObjectId): Id of user.
+        after (ObjectId, optional): Id of the last post on the previous page.
+            Defaults to None, which starts from the newest post.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Raises:
         DbUserNotFoundError: User with the given ID was not in the database.
@@ -126,26 +482,217 @@ def get_post_feed(user_id: ObjectId) -> DbPostList:
         DbPostList: Posts in user's feed.
 
     """
-    from server.users.controller import get_user_by_id
+    from server.followings.controller import get_following_ids
+    from server.timelines import controller as timelines
 
-    user = get_user_by_id(user_id)
+    followings = get_following_ids(user_id)
+    authors = [user_id, *followings]
+    limit = page_limit(limit)
 
-    result = db.posts.aggregate(
+    strategy = FeedStrategy(feed_strategy)
+
+    if strategy is FeedStrategy.PULL:
+        return DbPostList.model_validate(_get_feed_posts(authors, after, limit))
+
+    if strategy is FeedStrategy.MERGE:
+        return DbPostList.model_validate(
+            _get_posts_by_ids(_merge_feed_ids(authors, after, limit)),
+        )
+
+    result = _get_timeline_posts(user_id, authors, after, limit)
+
+    # Posts of users with too many followers are not pushed to timelines, so
+    # they are pulled and merged into the page here.
+    pulled = timelines.get_pulled_authors().intersection(followings)
+
+    if pulled:
+        result = _merge_newest(
+            result,
+            _get_feed_posts(list(pulled), after, limit),
+            limit=limit,
+        )
+
+    return DbPostList.model_validate(result)
+
+
+def get_post_feed_changes(user_id: ObjectId, since: datetime) -> DbPostDelta:
+    """Get the changes of the post feed of user since a watermark.
+
+    Posts of users who were followed or unfollowed since then are not part of
+    the changes, so the feed should be reloaded after changing followings.
+
+    Args:
+        user_id (ObjectId): Id of user.
+        since (datetime): Watermark of the sync.
+
+    Raises:
+        DbUserNotFoundError: User with the given ID was not in the database.
+        DbSyncExpiredError: Changes since the watermark are not available.
+
+    Returns:
+        DbPostDelta: Changed and deleted posts.
+
+    """
+    from server.followings.controller import get_following_ids
+
+    authors = [user_id, *get_following_ids(user_id)]
+
+    return _get_post_changes({"author": {"$in": authors}}, since)
+
+
+def _get_timeline_posts(
+    user_id: ObjectId,
+    author_ids: list[ObjectId],
+    after: ObjectId | None,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """Query a page of posts through the home timeline of user, newest first.
+
+    Args:
+        user_id (ObjectId): Id of user.
+        author_ids (list[ObjectId]): Id of users in the feed.
+        after (ObjectId, optional): Id of the last post on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        list[dict[str, Any]]: Posts, with their authors embedded.
+
+    """
+    from server.timelines import controller as timelines
+
+    page = timelines.get_timeline_page(user_id, after, limit)
+
+    if page is None:
+        timelines.build_timeline(user_id, author_ids)
+        page = timelines.get_timeline_page(user_id, after, limit) or DbTimelinePage(
+            posts=[],
+            partial=True,
+        )
+
+    result = _get_posts_by_ids(page.posts)
+
+    # Posts older than a partial timeline were dropped from it, so the rest of
+    # the page falls back to the posts collection.
+    if len(page.posts) < limit and page.partial:
+        boundary = min((i for i in (after, page.oldest) if i is not None), default=None)
+        result += _get_feed_posts(author_ids, boundary, limit - len(page.posts))
+
+    return result
+
+
+def _merge_feed_ids(
+    author_ids: list[ObjectId],
+    after: ObjectId | None,
+    limit: int,
+) -> list[ObjectId]:
+    """Merge sorted streams of post IDs by the given authors, newest first.
+
+    Each stream reads a batch of authors through the `(author, _id)` index,
+    and none can contribute more than a page. Merging stops as soon as the
+    page is filled, so the cost does not grow with the history of each author.
+
+    Args:
+        author_ids (list[ObjectId]): Id of authoring users.
+        after (ObjectId, optional): Id of the last post on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        list[ObjectId]: Id of posts on the page.
+
+    """
+    streams = [
+        (
+            i["_id"]
+            for i in db.posts.find(
+                {"author": {"$in": list(batch)}, **keyset(after, descending=True)},
+                {"_id": 1},
+            )
+            .sort("_id", -1)
+            .limit(limit)
+            .batch_size(limit)
+        )
+        for batch in batched(author_ids, feed_merge_batch_size)
+    ]
+
+    return list(islice(merge(*streams, reverse=True), limit))
+
+
+def _merge_newest(*pages: list[dict[str, Any]], limit: int) -> list[dict[str, Any]]:
+    """Merge pages of posts into one page, newest first, without duplicates.
+
+    Args:
+        *pages (list[dict[str, Any]]): Pages of posts, sorted newest first.
+        limit (int): Page size.
+
+    Returns:
+        list[dict[str, Any]]: Merged page.
+
+    """
+    result: list[dict[str, Any]] = []
+
+    for post in merge(*pages, key=lambda i: i["_id"], reverse=True):
+        if result and result[-1]["_id"] == post["_id"]:
+            continue
+
+        result.append(post)
+
+        if len(result) >= limit:
+            break
+
+    return result
+
+
+def _get_feed_posts(
+    author_ids: list[ObjectId],
+    after: ObjectId | None,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """Query a page of posts by any of the given authors, newest first.
+
+    Args:
+        author_ids (list[ObjectId]): Id of authoring users.
+        after (ObjectId, optional): Id of the last post on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        list[dict[str, Any]]: Posts, with their authors embedded.
+
+    """
+    return db.posts.aggregate(
         [
-            {"$match": {"author": {"$in": [user_id, *user.followings]}}},
             {
-                "$lookup": {
-                    "from": "users",
-                    "localField": "author",
-                    "foreignField": "_id",
-                    "as": "author",
+                "$match": {
+                    "author": {"$in": author_ids},
+                    **keyset(after, descending=True),
                 },
             },
-            {"$unwind": {"path": "$author"}},
+            {"$sort": {"_id": -1}},
+            {"$limit": limit},
+            *AUTHOR_SNAPSHOT,
         ],
     ).to_list()
 
-    return DbPostList.model_validate(result)
+
+def _get_posts_by_ids(post_ids: list[ObjectId]) -> list[dict[str, Any]]:
+    """Query posts by their IDs, newest first.
+
+    Args:
+        post_ids (list[ObjectId]): Id of posts.
+
+    Returns:
+        list[dict[str, Any]]: Posts, with their authors embedded.
+
+    """
+    if not post_ids:
+        return []
+
+    return db.posts.aggregate(
+        [
+            {"$match": {"_id": {"$in": post_ids}}},
+            {"$sort": {"_id": -1}},
+            *AUTHOR_SNAPSHOT,
+        ],
+    ).to_list()
 
 
 def create_post(
@@ -165,23 +712,36 @@ def create_post(
         DbPost: Created post.
 
     """
-    from server.users.controller import get_user_by_id
+    from server.followings.controller import iter_follower_ids
+    from server.timelines.controller import is_pulled_author, push_to_timelines
+    from server.users.controller import author_snapshot, get_user_profile
 
     now = datetime.now(UTC)
-    user = get_user_by_id(author_id)
+    user = get_user_profile(author_id)
 
     post: dict[str, Any] = {
         "content": content,
         "creation_time": now,
         "modification_time": now,
+        "change_time": now,
         "author": author_id,
+        "author_snapshot": author_snapshot(user),
+        "comment_count": 0,
     }
 
     result = db.posts.insert_one(post)
 
+    db.users.update_one({"_id": author_id}, {"$inc": {"post_count": 1}})
+    invalidate_users([author_id])
+
     post["_id"] = result.inserted_id
+    publish_posts([post["_id"]])
     post["author"] = user.model_dump()
 
+    followers = () if is_pulled_author(author_id) else iter_follower_ids(author_id)
+
+    push_to_timelines(result.inserted_id, author_id, chain([author_id], followers))
+
     return DbPost.model_validate(post)
 
 
@@ -217,6 +777,7 @@ def update_post(
             "$set": {
                 "content": content,
                 "modification_time": now,
+                "change_time": now,
             },
         },
     )
@@ -224,6 +785,9 @@ def update_post(
     if result.matched_count < 1:
         raise DbPostNotFoundError
 
+    if result.modified_count > 0:
+        publish_posts([post_id])
+
     return result.modified_count > 0
 
 
@@ -240,17 +804,25 @@ def delete_post(post_id: ObjectId, author_id: ObjectId | None = None) -> None:
 
     """
     from server.comments.controller import delete_comments_of_post
+    from server.timelines.controller import remove_from_timelines
 
     post_filter = {"_id": post_id}
 
     if author_id is not None:
         post_filter["author"] = author_id
 
-    result = db.posts.delete_one(post_filter)
+    result = db.posts.find_one_and_delete(post_filter, {"author": 1})
 
-    if result.deleted_count < 1:
+    if result is None:
         raise DbPostNotFoundError
 
+    add_tombstones(db.post_tombstones, [result])
+    publish_posts([post_id])
+
+    db.users.update_one({"_id": result["author"]}, {"$inc": {"post_count": -1}})
+    invalidate_users([result["author"]])
+
+    remove_from_timelines([post_id])
     delete_comments_of_post(post_id)
 
 
@@ -265,11 +837,23 @@ def delete_posts_by_author(author_id: ObjectId) -> bool:
 
     """
     from server.comments.controller import delete_comments_of_many_posts
+    from server.timelines.controller import remove_from_timelines
 
     posts = db.posts.find({"author": author_id}, {"_id": 1}).to_list()
+    post_ids = [i["_id"] for i in posts]
 
-    delete_comments_of_many_posts([i["_id"] for i in posts])
+    remove_from_timelines(post_ids)
+    delete_comments_of_many_posts(post_ids)
 
     result = db.posts.delete_many({"author": author_id})
 
+    add_tombstones(db.post_tombstones, ({**i, "author": author_id} for i in posts))
+    publish_posts(post_ids)
+
+    db.users.update_one(
+        {"_id": author_id},
+        {"$inc": {"post_count": -result.deleted_count}},
+    )
+    invalidate_users([author_id])
+
     return result.deleted_count > 0
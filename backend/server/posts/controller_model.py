@@ -1,11 +1,12 @@
 """Controller models for Posts."""
 
 from datetime import datetime
+from enum import StrEnum
 
 from pydantic import BaseModel, RootModel
 
-from server.model_utils import SelfIdRaw
-from server.users.controller_model import DbUser
+from server.model_utils import ObjectIdRaw, SelfIdRaw
+from server.users.controller_model import DbUserProfile
 
 
 class DbPost(BaseModel):
@@ -15,7 +16,8 @@ class DbPost(BaseModel):
     content: str
     creation_time: datetime
     modification_time: datetime
-    author: DbUser
+    author: DbUserProfile
+    comment_count: int = 0
 
 
 class DbPostNotFoundError(Exception):
@@ -24,3 +26,22 @@ class DbPostNotFoundError(Exception):
 
 DbPostList = RootModel[list[DbPost]]
 """List of database posts."""
+
+
+class DbPostDelta(BaseModel):
+    """Changes of a list of posts since a watermark."""
+
+    changed: list[DbPost]
+    deleted: list[ObjectIdRaw]
+    watermark: datetime
+
+
+class FeedStrategy(StrEnum):
+    """Strategy used to assemble post feeds."""
+
+    PULL = "pull"
+    """Query the posts of every followed user on each read."""
+    TIMELINE = "timeline"
+    """Read materialized home timelines, which are filled when posting."""
+    MERGE = "merge"
+    """Merge sorted streams of posts of followed users, until a page is filled."""
@@ -0,0 +1,215 @@
+"""Newest posts, rendered and kept in memory by each worker.
+
+The first page of all posts is the most read list. Each worker keeps the
+newest `SOCIAL_BE_RECENT_POSTS` posts as dumped response models, and serves
+first pages from them without querying the database. They are read in the
+background when the app starts, and kept current by the events of changed
+posts, see `server/events.py`. Deeper pages, and first pages larger than the
+kept posts, are queried as usual.
+
+The kept posts are always the newest ones, without gaps. Deleted posts shrink
+them, and they are read again once half of them are gone. Posts older than
+the oldest kept one are ignored, even if they were created later, which
+happens when clocks of nodes are skewed.
+"""
+
+from logging import getLogger
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import PyMongoError
+
+from server import metrics
+from server.config import recent_posts
+from server.events import listen, subscribe
+from server.model_utils import model_convert
+from server.pagination import page_limit
+from server.posts.controller import (
+    POSTS_TOPIC,
+    get_newest_posts,
+    get_posts_with_versions,
+)
+from server.posts.controller_model import DbPost
+from server.posts.view_model import Post
+
+if TYPE_CHECKING:
+    from flask_openapi3.openapi import OpenAPI
+
+_logger = getLogger(__name__)
+
+
+class RecentPost(NamedTuple):
+    """A rendered post."""
+
+    id: ObjectId
+    post: dict[str, Any]
+    """Dumped response model."""
+    version: RawBSONDocument
+    """Changing fields, for ETags."""
+
+
+class RecentPage(NamedTuple):
+    """First page of all posts."""
+
+    posts: list[dict[str, Any]]
+    """Dumped response models."""
+    versions: list[RawBSONDocument]
+    """Changing fields of each post, for ETags."""
+    last_id: ObjectId | None
+    """Id of the last post, for the next page cursor, or None if this is the
+    last page."""
+
+
+def _render(posts: list[tuple[DbPost, RawBSONDocument]]) -> list[RecentPost]:
+    """Render posts read from the database, along with their versions."""
+    return [
+        RecentPost(post.id, model_convert(Post, post).model_dump(), version)
+        for post, version in posts
+    ]
+
+
+class RecentPosts:
+    """Newest posts of a worker.
+
+    Readers take the current list without locking, since it is replaced
+    rather than modified. Writers are serialized by a lock.
+    """
+
+    def __init__(self, size: int) -> None:
+        """Create empty recent posts, which serve nothing until seeded.
+
+        Args:
+            size (int): Number of posts to keep. 0 disables them.
+
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._posts: list[RecentPost] | None = None
+        # Whether the kept posts are every post in the database.
+        self._complete = False
+        self._lock = Lock()
+
+    def page(self, limit: int) -> RecentPage | None:
+        """Get the first page of all posts, if it is kept.
+
+        Args:
+            limit (int): Requested page size.
+
+        Returns:
+            RecentPage | None: The page, or None if it has to be queried.
+
+        """
+        if self.size <= 0:
+            return None
+
+        posts = self._posts
+        limit = page_limit(limit)
+
+        if not posts or (len(posts) < limit and not self._complete):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        page = posts[:limit]
+
+        return RecentPage(
+            [i.post for i in page],
+            [i.version for i in page],
+            page[-1].id if len(page) == limit else None,
+        )
+
+    def _seed(self) -> None:
+        """Read the newest posts, while holding the lock."""
+        posts = _render(get_newest_posts(self.size))
+        self._complete = len(posts) < self.size
+        self._posts = posts
+
+    def apply(self, post_ids: list[ObjectId]) -> None:
+        """Read changed posts again, adding new ones and dropping deleted ones.
+
+        Args:
+            post_ids (list[ObjectId]): Id of the changed posts.
+
+        """
+        with self._lock:
+            if self._posts is None:
+                return
+
+            try:
+                self._apply(self._posts, post_ids)
+            except PyMongoError:
+                _logger.exception("Updating the recent posts failed.")
+                self._posts = None
+
+    def _apply(self, current: list[RecentPost], post_ids: list[ObjectId]) -> None:
+        """Update the kept posts, while holding the lock."""
+        changed = set(post_ids)
+        oldest = None if self._complete or not current else current[-1].id
+        posts = [
+            *(i for i in current if i.id not in changed),
+            *(
+                i
+                for i in _render(get_posts_with_versions(post_ids))
+                if oldest is None or i.id >= oldest
+            ),
+        ]
+        posts.sort(key=lambda x: x.id, reverse=True)
+
+        if len(posts) > self.size:
+            self._complete = False
+            del posts[self.size :]
+
+        if len(posts) < self.size // 2 and not self._complete:
+            self._seed()
+        else:
+            self._posts = posts
+
+    def reset(self) -> None:
+        """Drop the kept posts, and read them again."""
+        with self._lock:
+            self._posts = None
+
+            try:
+                self._seed()
+            except PyMongoError:
+                _logger.exception("Reading the recent posts failed.")
+
+    def stats(self) -> dict[str, int]:
+        """Report the usage of the recent posts.
+
+        Returns:
+            dict[str, int]: Number of hits, misses and kept posts.
+
+        """
+        posts = self._posts
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": 0 if posts is None else len(posts),
+        }
+
+
+recent = RecentPosts(recent_posts)
+"""Newest posts of this worker."""
+
+if recent_posts:
+    subscribe(POSTS_TOPIC, recent.apply, recent.reset)
+    metrics.register("recent_posts", recent.stats)
+
+
+def init_app(_app: "OpenAPI") -> None:
+    """Start keeping the newest posts, if enabled.
+
+    Args:
+        _app (OpenAPI): The flask app.
+
+    """
+    if not recent_posts:
+        return
+
+    listen()
+    Thread(target=recent.reset, name="recent-posts", daemon=True).start()
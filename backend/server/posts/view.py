@@ -1,30 +1,50 @@
 """Posts API."""
 
+from bson.objectid import ObjectId
 from flask_jwt_extended import jwt_required
 from flask_openapi3.blueprint import APIBlueprint
 from flask_openapi3.models.tag import Tag
 
 from server.auth.view_model import AuthnFailed, AuthzFailed
+from server.coalesce import SingleFlight
+from server.config import stream_lists
+from server.etags import validate
+from server.formats import JSON, response_mimetype
+from server.json_provider import stream_json_array
 from server.model_utils import model_convert
+from server.pagination import PageQuery, next_cursor_headers, next_page_headers
 from server.plugins import current_user
 from server.posts.controller import (
     create_post,
     delete_post,
     get_all_posts,
+    get_all_posts_changes,
+    get_all_posts_raw,
+    get_all_posts_versions,
     get_post_by_id,
     get_post_feed,
+    get_post_feed_changes,
+    get_post_version,
     get_posts_by_author,
+    get_posts_by_author_raw,
+    get_posts_by_author_versions,
+    stream_all_posts,
+    stream_posts_by_author,
     update_post,
 )
-from server.posts.controller_model import DbPostNotFoundError
+from server.posts.controller_model import DbPost, DbPostNotFoundError
+from server.posts.recent import recent
 from server.posts.view_model import (
     Post,
     PostId,
     PostInit,
     PostNotFound,
     PostPatch,
+    PostsDelta,
     PostsList,
 )
+from server.raw_json import raw_json_enabled, raw_json_encoder, raw_json_list
+from server.sync import DbSyncExpiredError, SyncExpired, SyncQuery
 from server.users.controller_model import DbUserNotFoundError
 from server.users.view_model import UserId, UserNotFound
 
@@ -32,13 +52,61 @@ _posts_tag = Tag(name="posts")
 bp = APIBlueprint("post", __name__, url_prefix="/posts")
 """Posts route blueprint."""
 
+_post_by_id = SingleFlight[tuple[ObjectId, str | None], DbPost]("getPostById")
+"""Reads of posts, by ID and ETag."""
+
 
 @bp.get("/", operation_id="getAllPosts", tags=[_posts_tag], responses={200: PostsList})
-def handle_get_all_posts():  # noqa: ANN201
+def handle_get_all_posts(query: PageQuery):  # noqa: ANN201
     """Get all posts."""
-    posts = get_all_posts()
+    page = recent.page(query.limit) if query.after is None else None
+    modified, etag = validate(
+        lambda: (
+            page.versions
+            if page is not None
+            else get_all_posts_versions(query.after, query.limit)
+        ),
+    )
+
+    if not modified:
+        return "", 304, etag
+
+    if page is not None:
+        return page.posts, 200, next_cursor_headers(page.last_id) | etag
+
+    if stream_lists and response_mimetype() == JSON:
+        cursor, last_id = stream_all_posts(query.after, query.limit)
+        response = stream_json_array(cursor, raw_json_encoder(Post))
+        return response, 200, next_cursor_headers(last_id) | etag
+
+    if raw_json_enabled():
+        raw = get_all_posts_raw(query.after, query.limit)
+        headers = next_page_headers(raw, query.limit) | etag
+        return raw_json_list(Post, raw), 200, headers
+
+    posts = get_all_posts(query.after, query.limit)
+
+    return (
+        model_convert(PostsList, posts).model_dump(),
+        200,
+        next_page_headers(posts.root, query.limit) | etag,
+    )
+
+
+@bp.get(
+    "/changes",
+    operation_id="getAllPostsChanges",
+    tags=[_posts_tag],
+    responses={200: PostsDelta, 410: SyncExpired},
+)
+def handle_get_all_posts_changes(query: SyncQuery):  # noqa: ANN201
+    """Get changes of all posts since a watermark."""
+    try:
+        delta = get_all_posts_changes(query.since)
+    except DbSyncExpiredError:
+        return SyncExpired().model_dump(), 410
 
-    return model_convert(PostsList, posts).model_dump()
+    return model_convert(PostsDelta, delta).model_dump(), 200
 
 
 @bp.get(
@@ -47,11 +115,32 @@ def handle_get_all_posts():  # noqa: ANN201
     tags=[_posts_tag],
     responses={200: PostsList},
 )
-def handle_get_posts_by_author(path: UserId):  # noqa: ANN201
+def handle_get_posts_by_author(path: UserId, query: PageQuery):  # noqa: ANN201
     """Get posts by an author."""
-    posts = get_posts_by_author(path.user_id)
+    modified, etag = validate(
+        lambda: get_posts_by_author_versions(path.user_id, query.after, query.limit),
+    )
+
+    if not modified:
+        return "", 304, etag
+
+    if stream_lists and response_mimetype() == JSON:
+        cursor, last_id = stream_posts_by_author(path.user_id, query.after, query.limit)
+        response = stream_json_array(cursor, raw_json_encoder(Post))
+        return response, 200, next_cursor_headers(last_id) | etag
 
-    return model_convert(PostsList, posts).model_dump()
+    if raw_json_enabled():
+        raw = get_posts_by_author_raw(path.user_id, query.after, query.limit)
+        headers = next_page_headers(raw, query.limit) | etag
+        return raw_json_list(Post, raw), 200, headers
+
+    posts = get_posts_by_author(path.user_id, query.after, query.limit)
+
+    return (
+        model_convert(PostsList, posts).model_dump(),
+        200,
+        next_page_headers(posts.root, query.limit) | etag,
+    )
 
 
 @bp.get(
@@ -67,17 +156,50 @@ def handle_get_posts_by_author(path: UserId):  # noqa: ANN201
     },
 )
 @jwt_required()
-def handle_get_post_feed(path: UserId):  # noqa: ANN201
+def handle_get_post_feed(path: UserId, query: PageQuery):  # noqa: ANN201
     """Get post feed of user."""
     if current_user.user_id != path.user_id and not current_user.admin:
         return AuthzFailed().model_dump(), 403
 
     try:
-        posts = get_post_feed(path.user_id)
+        posts = get_post_feed(path.user_id, query.after, query.limit)
     except DbUserNotFoundError:
         return UserNotFound().model_dump(), 404
 
-    return model_convert(PostsList, posts).model_dump()
+    return (
+        model_convert(PostsList, posts).model_dump(),
+        200,
+        next_page_headers(posts.root, query.limit),
+    )
+
+
+@bp.get(
+    "/feed/<user_id>/changes",
+    operation_id="getPostFeedChanges",
+    tags=[_posts_tag],
+    security=[{"jwt": []}],
+    responses={
+        200: PostsDelta,
+        401: AuthnFailed,
+        403: AuthzFailed,
+        404: UserNotFound,
+        410: SyncExpired,
+    },
+)
+@jwt_required()
+def handle_get_post_feed_changes(path: UserId, query: SyncQuery):  # noqa: ANN201
+    """Get changes of post feed of user since a watermark."""
+    if current_user.user_id != path.user_id and not current_user.admin:
+        return AuthzFailed().model_dump(), 403
+
+    try:
+        delta = get_post_feed_changes(path.user_id, query.since)
+    except DbUserNotFoundError:
+        return UserNotFound().model_dump(), 404
+    except DbSyncExpiredError:
+        return SyncExpired().model_dump(), 410
+
+    return model_convert(PostsDelta, delta).model_dump(), 200
 
 
 @bp.post(
@@ -112,12 +234,20 @@ def handle_create_post(body: PostInit):  # noqa: ANN201
 )
 def handle_get_post_by_id(path: PostId):  # noqa: ANN201
     """Get post by ID."""
+    modified, etag = validate(lambda: get_post_version(path.post_id))
+
+    if not modified:
+        return "", 304, etag
+
     try:
-        post = get_post_by_id(path.post_id)
+        post = _post_by_id.call(
+            (path.post_id, etag.get("ETag")),
+            lambda: get_post_by_id(path.post_id),
+        )
     except DbPostNotFoundError:
         return PostNotFound().model_dump(), 404
 
-    return Post.model_validate(post).model_dump()
+    return model_convert(Post, post).model_dump(), 200, etag
 
 
 @bp.patch(
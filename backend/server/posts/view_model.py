@@ -14,6 +14,7 @@ class Post(BaseModel):
     creation_time: Instant
     modification_time: Instant
     author: User
+    comment_count: int = 0
 
 
 class PostInit(BaseModel):
@@ -44,3 +45,15 @@ class PostNotFound(BaseModel):
 
 PostsList = RootModel[list[Post]]
 """List of posts."""
+
+
+class PostsDelta(BaseModel):
+    """Changes of a list of posts since a watermark.
+
+    Posts which were created or modified since then are oldest change first.
+    Pass `watermark` as `since` on the next sync.
+    """
+
+    changed: list[Post]
+    deleted: list[ObjectIdStr]
+    watermark: Instant
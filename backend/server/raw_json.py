@@ -0,0 +1,414 @@
+"""Encode raw BSON documents straight into JSON responses.
+
+Read-only list endpoints can skip decoding documents into dictionaries and
+validating them twice with Pydantic. Instead, the raw BSON of each document is
+walked once, and its fields are encoded as JSON in the shape of a response
+model. Fields are looked up by their name and validation aliases, and written
+in sorted order, so the output is byte-identical to the JSON provider of the
+app, see `server.json_provider`.
+
+Documents which do not match the response model, for example because a field
+has an unexpected type, fall back to the regular Pydantic path.
+"""
+
+import re
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from functools import cache
+from struct import Struct
+from time import gmtime, strftime
+from types import UnionType
+from typing import Any, Union, get_args, get_origin
+
+from bson import decode
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from flask import Response, current_app
+from pydantic import AliasChoices, BaseModel, EmailStr
+from pydantic.fields import FieldInfo
+
+from server.config import raw_bson
+from server.formats import JSON, response_mimetype
+from server.json_provider import OrjsonProvider, encode
+
+_unpack_int32 = Struct("<i").unpack_from
+_unpack_int64 = Struct("<q").unpack_from
+
+# BSON element types.
+_STRING = 0x02
+_DOCUMENT = 0x03
+_ARRAY = 0x04
+_BINARY = 0x05
+_OBJECT_ID = 0x07
+_DATETIME = 0x09
+_NULL = 0x0A
+_INT32 = 0x10
+_INT64 = 0x12
+
+_FIXED_SIZES = {
+    0x01: 8,
+    0x06: 0,
+    _OBJECT_ID: 12,
+    0x08: 1,
+    _DATETIME: 8,
+    _NULL: 0,
+    _INT32: 4,
+    0x11: 8,
+    _INT64: 8,
+    0x13: 16,
+    0x7F: 0,
+    0xFF: 0,
+}
+"""Size of BSON values by their type, for types with a fixed size."""
+
+_INSTANT_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+"""Format of `server.model_utils.Instant`."""
+
+_ESCAPED = re.compile(rb'["\\\x00-\x1f]')
+"""Bytes which are escaped in JSON strings."""
+
+type _Encoder = Callable[[bytes, int, int], tuple[bytes, int]]
+"""Encodes a BSON value of the given type at an offset, and returns its JSON
+and the offset after the value."""
+
+
+class RawEncodingError(ValueError):
+    """Raw document did not match the response model."""
+
+
+def _object_id(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+    """Encode an ObjectId."""
+    if kind != _OBJECT_ID:
+        raise RawEncodingError
+
+    return b'"%s"' % data[offset : offset + 12].hex().encode(), offset + 12
+
+
+def _string(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+    """Encode a string."""
+    if kind != _STRING:
+        raise RawEncodingError
+
+    end = offset + 4 + _unpack_int32(data, offset)[0]
+    value = data[offset + 4 : end - 1]
+
+    # Strings are stored as UTF-8, so most of them are copied as they are.
+    if _ESCAPED.search(value):
+        return encode(value.decode()), end
+
+    return b'"%s"' % value, end
+
+
+def _instant(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+    """Encode a datetime, like `server.model_utils.Instant`."""
+    if kind != _DATETIME:
+        raise RawEncodingError
+
+    seconds = _unpack_int64(data, offset)[0] // 1000
+
+    return b'"%s"' % strftime(_INSTANT_FORMAT, gmtime(seconds)).encode(), offset + 8
+
+
+def _integer(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+    """Encode a 32 or 64 bit integer."""
+    if kind == _INT32:
+        return b"%d" % _unpack_int32(data, offset)[0], offset + 4
+
+    if kind == _INT64:
+        return b"%d" % _unpack_int64(data, offset)[0], offset + 8
+
+    raise RawEncodingError
+
+
+def _nullable(encoder: _Encoder) -> _Encoder:
+    """Allow a BSON null in place of a value."""
+
+    def encode(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+        if kind == _NULL:
+            return b"null", offset
+
+        return encoder(data, offset, kind)
+
+    return encode
+
+
+def _skip(data: bytes, offset: int, kind: int) -> int:
+    """Find the end of a BSON value which is not in the response model.
+
+    Raises:
+        RawEncodingError: The value has a type which cannot be skipped.
+
+    """
+    if kind in _FIXED_SIZES:
+        return offset + _FIXED_SIZES[kind]
+
+    size = _unpack_int32(data, offset)[0]
+
+    if kind in {_DOCUMENT, _ARRAY}:
+        return offset + size
+
+    if kind == _BINARY:
+        return offset + 5 + size
+
+    if kind in {_STRING, 0x0D, 0x0E}:
+        return offset + 4 + size
+
+    raise RawEncodingError
+
+
+class _Schema:
+    """Compiled encoder of a response model."""
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        """Compile the encoder of a response model.
+
+        Args:
+            model (type[BaseModel]): The response model.
+
+        Raises:
+            TypeError: The model has a field which cannot be encoded.
+
+        """
+        fields = sorted(model.model_fields.items())
+
+        self.keys = [encode(name) + b":" for name, _ in fields]
+        self.defaults: list[bytes | None] = [
+            None
+            if i.is_required()
+            else encode(i.get_default(call_default_factory=True))
+            for _, i in fields
+        ]
+        self.fields: dict[bytes, tuple[int, _Encoder]] = {}
+
+        for slot, (name, field) in enumerate(fields):
+            encoder = _field_encoder(field.annotation)
+
+            for key in _field_keys(name, field):
+                self.fields[key.encode()] = (slot, encoder)
+
+    def encode(self, data: bytes, offset: int = 0) -> bytes:
+        """Encode a BSON document as a JSON object.
+
+        Args:
+            data (bytes): BSON data.
+            offset (int, optional): Start of the document. Defaults to 0.
+
+        Raises:
+            RawEncodingError: The document did not match the response model.
+
+        Returns:
+            bytes: JSON object.
+
+        """
+        end = offset + _unpack_int32(data, offset)[0] - 1
+        values = self.defaults.copy()
+        offset += 4
+
+        while offset < end:
+            kind = data[offset]
+            key_end = data.index(0, offset + 1)
+            field = self.fields.get(data[offset + 1 : key_end])
+            offset = key_end + 1
+
+            if field is None:
+                offset = _skip(data, offset, kind)
+            else:
+                slot, encoder = field
+                values[slot], offset = encoder(data, offset, kind)
+
+        if None in values:
+            raise RawEncodingError
+
+        return b"{%s}" % b",".join(
+            k + v for k, v in zip(self.keys, values, strict=True) if v is not None
+        )
+
+
+def _field_keys(name: str, field: FieldInfo) -> list[str]:
+    """Get the document keys which are accepted for a field.
+
+    Args:
+        name (str): Name of the field.
+        field (FieldInfo): The field.
+
+    Returns:
+        list[str]: Keys, like the ones accepted by Pydantic validation.
+
+    """
+    alias = field.validation_alias
+
+    if isinstance(alias, AliasChoices):
+        return [i for i in alias.choices if isinstance(i, str)]
+
+    if isinstance(alias, str):
+        return [alias]
+
+    return [field.alias or name]
+
+
+def _array(schema: _Schema) -> _Encoder:
+    """Encode a BSON array of documents."""
+
+    def encode(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+        if kind != _ARRAY:
+            raise RawEncodingError
+
+        end = offset + _unpack_int32(data, offset)[0]
+        items: list[bytes] = []
+        offset += 4
+
+        while offset < end - 1:
+            if data[offset] != _DOCUMENT:
+                raise RawEncodingError
+
+            offset = data.index(0, offset + 1) + 1
+            items.append(schema.encode(data, offset))
+            offset += _unpack_int32(data, offset)[0]
+
+        return b"[%s]" % b",".join(items), end
+
+    return encode
+
+
+def _document(schema: _Schema) -> _Encoder:
+    """Encode an embedded BSON document."""
+
+    def encode(data: bytes, offset: int, kind: int) -> tuple[bytes, int]:
+        if kind != _DOCUMENT:
+            raise RawEncodingError
+
+        return schema.encode(data, offset), offset + _unpack_int32(data, offset)[0]
+
+    return encode
+
+
+def _field_encoder(annotation: Any) -> _Encoder:  # noqa: ANN401
+    """Get the encoder of a field type.
+
+    Args:
+        annotation (Any): Type of the field.
+
+    Raises:
+        TypeError: The type cannot be encoded.
+
+    Returns:
+        _Encoder: The encoder.
+
+    """
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin in {Union, UnionType} and len(args) == 2 and type(None) in args:  # noqa: PLR2004
+        inner = args[0] if args[1] is type(None) else args[1]
+        return _nullable(_field_encoder(inner))
+
+    if origin is list and args:
+        return _array(_schema(args[0]))
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _document(_schema(annotation))
+
+    encoders: dict[Any, _Encoder] = {
+        ObjectId: _object_id,
+        str: _string,
+        EmailStr: _string,
+        int: _integer,
+    }
+
+    if annotation in encoders:
+        return encoders[annotation]
+
+    if annotation is datetime:
+        return _instant
+
+    msg = f"Cannot encode {annotation!r} from raw BSON"
+    raise TypeError(msg)
+
+
+@cache
+def _schema(model: type[BaseModel]) -> _Schema:
+    """Get the cached encoder of a response model.
+
+    Args:
+        model (type[BaseModel]): The response model.
+
+    Returns:
+        _Schema: The encoder.
+
+    """
+    return _Schema(model)
+
+
+def raw_json_enabled() -> bool:
+    """Check if raw BSON documents should be encoded straight into JSON.
+
+    The mode has to be enabled, the client has to accept JSON, and the app has
+    to use the compact orjson provider, whose output is reproduced.
+
+    Returns:
+        bool: Should read-only list endpoints use raw BSON?
+
+    """
+    provider = current_app.json
+
+    return (
+        raw_bson
+        and isinstance(provider, OrjsonProvider)
+        and not provider.indent
+        and response_mimetype() == JSON
+    )
+
+
+def raw_json_encoder(
+    model: type[BaseModel],
+) -> Callable[[RawBSONDocument], bytes]:
+    """Get an encoder of raw BSON documents into JSON objects of a model.
+
+    Documents are encoded straight from BSON if the raw mode is enabled, and
+    through the model otherwise.
+
+    Args:
+        model (type[BaseModel]): Response model of each document.
+
+    Returns:
+        Callable[[RawBSONDocument], bytes]: The encoder.
+
+    """
+
+    def validate(document: RawBSONDocument) -> bytes:
+        return encode(model.model_validate(decode(document.raw)).model_dump())
+
+    if not raw_json_enabled():
+        return validate
+
+    schema = _schema(model)
+
+    def encode_raw(document: RawBSONDocument) -> bytes:
+        try:
+            return schema.encode(document.raw)
+        except RawEncodingError:
+            return validate(document)
+
+    return encode_raw
+
+
+def raw_json_list(
+    model: type[BaseModel],
+    documents: Iterable[RawBSONDocument],
+) -> Response:
+    """Encode raw BSON documents as a JSON array of a response model.
+
+    Args:
+        model (type[BaseModel]): Response model of each document.
+        documents (Iterable[RawBSONDocument]): Documents.
+
+    Returns:
+        Response: JSON response.
+
+    """
+    items = map(raw_json_encoder(model), documents)
+
+    return current_app.response_class(
+        b"[%s]\n" % b",".join(items),
+        mimetype=OrjsonProvider.mimetype,
+    )
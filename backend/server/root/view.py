@@ -1,5 +1,7 @@
 """API Root."""
 
+from os import getpid
+
 from flask import redirect
 from flask_openapi3.blueprint import APIBlueprint
 
@@ -8,6 +10,7 @@ import server.comments.view
 import server.followings.view
 import server.posts.view
 import server.users.view
+from server import metrics
 
 bp = APIBlueprint("root", __name__, url_prefix="/")
 """Root blueprint."""
@@ -23,3 +26,9 @@ bp.register_api(server.comments.view.bp)
 def handle_root_get():  # noqa: ANN201
     """Redirect to a OpenAPI viewer."""
     return redirect("/openapi")
+
+
+@bp.get("/metrics", responses={200: None}, doc_ui=False)
+def handle_metrics_get():  # noqa: ANN201
+    """Report the metrics of the worker which serves the request."""
+    return {"pid": getpid(), **metrics.collect()}, 200
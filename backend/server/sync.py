@@ -0,0 +1,170 @@
+"""Delta sync of lists, since a watermark.
+
+Clients which already loaded a list can ask for its changes since their last
+sync, instead of loading it again. Changed items are found by their
+`change_time`, which is set by every write that changes the response of an
+item, including comment counts and author snapshots. Deleted items leave
+tombstones, which expire after `SOCIAL_BE_TOMBSTONE_TTL` seconds. Comments
+which are deleted along with their post do not, since the tombstone of the
+post covers them.
+
+Each delta carries the watermark of the next sync. It lags behind the time of
+the sync by `SOCIAL_BE_SYNC_OVERLAP` seconds, so that writes which were still
+in flight are not missed, at the cost of sending a few items twice.
+"""
+
+from collections.abc import Iterable, Sized
+from datetime import UTC, datetime, timedelta
+from itertools import batched
+from typing import Annotated, Any
+
+from bson.objectid import ObjectId
+from pydantic import AfterValidator, BaseModel, BeforeValidator
+from pymongo.collection import Collection
+
+from server.config import sync_max_changes, sync_overlap, tombstone_ttl
+
+TOMBSTONE_BATCH_SIZE = 1000
+"""Number of tombstones inserted by a single write."""
+
+
+class DbSyncExpiredError(Exception):
+    """Changes since the watermark are no longer known, or too many to send."""
+
+
+def _object_id_time(value: object) -> object:
+    """Convert an ObjectId into the time it was generated at."""
+    if isinstance(value, ObjectId) or (
+        isinstance(value, str) and ObjectId.is_valid(value)
+    ):
+        return ObjectId(value).generation_time
+
+    return value
+
+
+Watermark = Annotated[
+    datetime,
+    BeforeValidator(_object_id_time),
+    AfterValidator(lambda x: x.replace(tzinfo=UTC) if x.tzinfo is None else x),
+]
+"""A point in time, given as an ISO 8601 string, a UNIX timestamp, or the
+ObjectId of an item created at that time. Naive times are in UTC."""
+
+
+class SyncQuery(BaseModel):
+    """Changes of a list since a watermark.
+
+    Pass the `watermark` of the previous delta as `since`. The first sync can
+    pass the time the list was loaded at, or the ID of its newest item.
+    """
+
+    since: Watermark
+
+
+class SyncExpired(BaseModel):
+    """Changes since the watermark are no longer available."""
+
+    type: str = "SyncExpired"
+    message: str = "Changes are no longer available, reload the list"
+
+
+def sync_watermark(since: datetime) -> datetime:
+    """Check that changes since a watermark are known, and create the next one.
+
+    Args:
+        since (datetime): Watermark of the sync.
+
+    Raises:
+        DbSyncExpiredError: Tombstones since the watermark may have expired.
+
+    Returns:
+        datetime: Watermark of the next sync.
+
+    """
+    now = datetime.now(UTC)
+
+    if since < now - timedelta(seconds=tombstone_ttl):
+        raise DbSyncExpiredError
+
+    return now - timedelta(seconds=sync_overlap)
+
+
+def changes_pipeline(match: dict[str, Any], since: datetime) -> list[dict[str, Any]]:
+    """Create the aggregation stages of the items of a list changed since a time.
+
+    Args:
+        match (dict[str, Any]): Filter of the list.
+        since (datetime): Watermark of the sync.
+
+    Returns:
+        list[dict[str, Any]]: Aggregation stages, oldest change first. One item
+            more than the maximum is read, see `check_changes`.
+
+    """
+    return [
+        {"$match": {**match, "change_time": {"$gte": since}}},
+        {"$sort": {"change_time": 1, "_id": 1}},
+        {"$limit": sync_max_changes + 1},
+    ]
+
+
+def check_changes(changes: Sized) -> None:
+    """Check that changes are few enough to be sent as a delta.
+
+    Args:
+        changes (Sized): Changed or deleted items.
+
+    Raises:
+        DbSyncExpiredError: There were too many changes.
+
+    """
+    if len(changes) > sync_max_changes:
+        raise DbSyncExpiredError
+
+
+def get_tombstones(
+    collection: Collection[Any],
+    match: dict[str, Any],
+    since: datetime,
+) -> list[ObjectId]:
+    """Get the items of a list deleted since a time.
+
+    Args:
+        collection (Collection): Tombstones of the items.
+        match (dict[str, Any]): Filter of the list.
+        since (datetime): Watermark of the sync.
+
+    Raises:
+        DbSyncExpiredError: There were too many deletions.
+
+    Returns:
+        list[ObjectId]: Id of deleted items.
+
+    """
+    result = (
+        collection.find({**match, "time": {"$gte": since}}, {"_id": 1})
+        .limit(sync_max_changes + 1)
+        .to_list()
+    )
+
+    check_changes(result)
+
+    return [i["_id"] for i in result]
+
+
+def add_tombstones(
+    collection: Collection[Any],
+    items: Iterable[dict[str, Any]],
+) -> None:
+    """Record the deletion of items.
+
+    Args:
+        collection (Collection): Tombstones of the items.
+        items (Iterable[dict[str, Any]]): Id of each item, as `_id`, and the
+            fields which its lists are filtered by.
+
+    """
+    now = datetime.now(UTC)
+
+    for batch in batched(items, TOMBSTONE_BATCH_SIZE):
+        collection.insert_many([{**i, "time": now} for i in batch], ordered=False)
@@ -0,0 +1 @@
+"""Home Timelines component."""
@@ -0,0 +1,300 @@
+"""Controller of Home Timelines.
+
+A home timeline is a single document per user, holding the newest posts of
+their feed in descending order:
+
+    {"_id": user_id, "posts": [{"post": post_id, "author": author_id}, ...]}
+
+Timelines are capped to `timeline_length` posts. Once anything was dropped to
+respect the cap, the timeline is marked `partial`, and posts older than its
+oldest entry have to be read from the posts collection instead.
+
+Users with more than `feed_pull_threshold` followers are marked `feed_pulled`.
+Their posts are only pushed to their own timeline, and feeds pull them from
+the posts collection when reading instead.
+"""
+
+from collections.abc import Iterable
+from itertools import batched
+from typing import Any
+
+from bson.objectid import ObjectId
+
+from server.config import feed_pull_threshold, feed_strategy, timeline_length
+from server.db import db, get_one
+from server.posts.controller_model import FeedStrategy
+from server.timelines.controller_model import DbTimelinePage
+from server.users.controller import invalidate_users
+
+FANOUT_BATCH_SIZE = 1000
+"""Number of timelines to update in a single fan-out write."""
+
+enabled = FeedStrategy(feed_strategy) is FeedStrategy.TIMELINE
+"""Are timelines maintained when posting and following?"""
+
+
+def _merge(entries: dict[str, Any]) -> list[dict[str, Any]]:
+    """Create an update pipeline which merges entries into a timeline.
+
+    Args:
+        entries (dict[str, Any]): Expression of the merged entries, evaluated
+            against the timeline document.
+
+    Returns:
+        list[dict[str, Any]]: Update pipeline.
+
+    """
+    return [
+        {"$set": {"merged": entries}},
+        {
+            "$set": {
+                "partial": {
+                    "$or": [
+                        "$partial",
+                        {"$gt": [{"$size": "$merged"}, timeline_length]},
+                    ],
+                },
+                "posts": {
+                    "$slice": [
+                        {"$sortArray": {"input": "$merged", "sortBy": {"post": -1}}},
+                        timeline_length,
+                    ],
+                },
+            },
+        },
+        {"$unset": "merged"},
+    ]
+
+
+def is_pulled_author(author_id: ObjectId) -> bool:
+    """Check if the posts of a user should be pulled instead of pushed.
+
+    Users are marked as pulled once they cross the follower threshold, and
+    stay pulled afterwards. Otherwise, posts made before going back under the
+    threshold would be missing from timelines.
+
+    Args:
+        author_id (ObjectId): Id of user.
+
+    Returns:
+        bool: Should the posts of the user be pulled?
+
+    """
+    if not feed_pull_threshold:
+        return False
+
+    if db.users.find_one({"_id": author_id, "feed_pulled": True}, {"_id": 1}):
+        return True
+
+    followers = db.followings.count_documents(
+        {"following": author_id},
+        limit=feed_pull_threshold + 1,
+    )
+
+    if followers <= feed_pull_threshold:
+        return False
+
+    db.users.update_one({"_id": author_id}, {"$set": {"feed_pulled": True}})
+    invalidate_users([author_id])
+
+    return True
+
+
+def get_pulled_authors() -> set[ObjectId]:
+    """Get the IDs of every user whose posts are pulled instead of pushed.
+
+    Returns:
+        set[ObjectId]: Id of pulled users.
+
+    """
+    return {i["_id"] for i in db.users.find({"feed_pulled": True}, {"_id": 1})}
+
+
+def get_timeline_page(
+    owner_id: ObjectId,
+    after: ObjectId | None,
+    limit: int,
+) -> DbTimelinePage | None:
+    """Get a page of a home timeline.
+
+    Args:
+        owner_id (ObjectId): Id of user who owns the timeline.
+        after (ObjectId, optional): Id of the last post on the previous page.
+        limit (int): Page size.
+
+    Returns:
+        DbTimelinePage: Page of the timeline, None if it was not built yet.
+
+    """
+    posts: Any = "$posts.post"
+
+    if after is not None:
+        posts = {"$filter": {"input": posts, "cond": {"$lt": ["$$this", after]}}}
+
+    result = get_one(
+        db.timelines.aggregate(
+            [
+                {"$match": {"_id": owner_id}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "partial": 1,
+                        "oldest": {"$last": "$posts.post"},
+                        "posts": {"$slice": [posts, limit]},
+                    },
+                },
+            ],
+        ),
+    )
+
+    if result is None:
+        return None
+
+    return DbTimelinePage.model_validate(result)
+
+
+def build_timeline(owner_id: ObjectId, author_ids: list[ObjectId]) -> None:
+    """Build a home timeline from the posts of the given authors.
+
+    Args:
+        owner_id (ObjectId): Id of user who owns the timeline.
+        author_ids (list[ObjectId]): Id of users in the feed of the owner.
+
+    """
+    posts = (
+        db.posts.find({"author": {"$in": author_ids}}, {"author": 1})
+        .sort("_id", -1)
+        .limit(timeline_length)
+        .to_list()
+    )
+
+    db.timelines.replace_one(
+        {"_id": owner_id},
+        {
+            "posts": [{"post": i["_id"], "author": i["author"]} for i in posts],
+            "partial": len(posts) >= timeline_length,
+        },
+        upsert=True,
+    )
+
+
+def push_to_timelines(
+    post_id: ObjectId,
+    author_id: ObjectId,
+    owner_ids: Iterable[ObjectId],
+) -> None:
+    """Add a new post to the home timelines of the given users.
+
+    Timelines which were not built yet are skipped.
+
+    Args:
+        post_id (ObjectId): Id of post.
+        author_id (ObjectId): Id of authoring user.
+        owner_ids (Iterable[ObjectId]): Id of users who will see the post.
+
+    """
+    if not enabled:
+        return
+
+    entry = {"post": post_id, "author": author_id}
+    update = _merge({"$concatArrays": [{"$literal": [entry]}, "$posts"]})
+
+    for batch in batched(owner_ids, FANOUT_BATCH_SIZE):
+        db.timelines.update_many({"_id": {"$in": list(batch)}}, update)
+
+
+def backfill_timeline(owner_id: ObjectId, author_ids: list[ObjectId]) -> None:
+    """Add the posts of newly followed users to a home timeline.
+
+    On partial timelines, only posts newer than the oldest entry are added, so
+    that the timeline stays an exact prefix of the feed.
+
+    Args:
+        owner_id (ObjectId): Id of user who owns the timeline.
+        author_ids (list[ObjectId]): Id of followed users.
+
+    """
+    if not enabled or not author_ids:
+        return
+
+    posts = (
+        db.posts.find({"author": {"$in": author_ids}}, {"author": 1})
+        .sort("_id", -1)
+        .limit(timeline_length)
+        .to_list()
+    )
+
+    if not posts:
+        return
+
+    entries = {
+        "$literal": [{"post": i["_id"], "author": i["author"]} for i in posts],
+    }
+    newer = {
+        "$and": [
+            {"$gt": [{"$size": "$posts"}, 0]},
+            {"$gte": ["$$this.post", {"$last": "$posts.post"}]},
+        ],
+    }
+
+    db.timelines.update_one(
+        {"_id": owner_id},
+        _merge(
+            {
+                "$concatArrays": [
+                    "$posts",
+                    {
+                        "$filter": {
+                            "input": entries,
+                            "cond": {"$or": [{"$not": ["$partial"]}, newer]},
+                        },
+                    },
+                ],
+            },
+        ),
+    )
+
+
+def remove_authors_from_timeline(
+    owner_id: ObjectId, author_ids: list[ObjectId]
+) -> None:
+    """Remove the posts of unfollowed users from a home timeline.
+
+    Args:
+        owner_id (ObjectId): Id of user who owns the timeline.
+        author_ids (list[ObjectId]): Id of unfollowed users.
+
+    """
+    if not enabled or not author_ids:
+        return
+
+    db.timelines.update_one(
+        {"_id": owner_id},
+        {"$pull": {"posts": {"author": {"$in": author_ids}}}},
+    )
+
+
+def remove_from_timelines(post_ids: list[ObjectId]) -> None:
+    """Remove deleted posts from every home timeline.
+
+    Args:
+        post_ids (list[ObjectId]): Id of deleted posts.
+
+    """
+    if not enabled or not post_ids:
+        return
+
+    db.timelines.update_many(
+        {"posts.post": {"$in": post_ids}},
+        {"$pull": {"posts": {"post": {"$in": post_ids}}}},
+    )
+
+
+def delete_timeline(owner_id: ObjectId) -> None:
+    """Delete a home timeline.
+
+    Args:
+        owner_id (ObjectId): Id of user who owns the timeline.
+
+    """
+    db.timelines.delete_one({"_id": owner_id})
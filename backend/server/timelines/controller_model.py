@@ -0,0 +1,16 @@
+"""Controller models of Home Timelines."""
+
+from pydantic import BaseModel
+
+from server.model_utils import ObjectIdRaw
+
+
+class DbTimelinePage(BaseModel):
+    """Page of a materialized home timeline."""
+
+    posts: list[ObjectIdRaw]
+    """Ids of posts on the page, newest first."""
+    partial: bool
+    """Were older posts dropped from the timeline to respect its length?"""
+    oldest: ObjectIdRaw | None = None
+    """Id of the oldest post in the whole timeline."""
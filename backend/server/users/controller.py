@@ -1,29 +1,151 @@
 """Controller for Users."""
 
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import UTC, datetime
+from itertools import batched
+from logging import getLogger
+from typing import Any
+
 from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
 from pydantic import validate_email
 from pymongo.errors import OperationFailure
 
-from server.config import admin_email
-from server.db import DUPLICATE_KEY, db
+from server import metrics
+from server.cache import Cache
+from server.config import (
+    admin_email,
+    page_size_default,
+    user_cache_size,
+    user_cache_ttl,
+)
+from server.db import DUPLICATE_KEY, RAW, db
+from server.events import listen, publish, subscribe
+from server.model_utils import model_convert
+from server.pagination import keyset, page_limit
 from server.users.controller_model import (
     DbUser,
     DbUserExistsError,
-    DbUserList,
     DbUserNotFoundError,
+    DbUserProfile,
+    DbUserProfileList,
 )
 
+PROFILE_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "follower_count": 1,
+    "following_count": 1,
+    "post_count": 1,
+}
+"""Projection of the fields in `DbUserProfile`."""
+
+SNAPSHOT_BATCH_SIZE = 1000
+"""Number of posts or comments to update in a single snapshot propagation write."""
+
+AUTHOR_SNAPSHOT: list[dict[str, Any]] = [
+    # Items written before snapshots existed have none, until they are
+    # backfilled by `tasks/snapshots.py`. Only those look up the profile of
+    # their author, since the others have no `author_lookup` to match.
+    {
+        "$set": {
+            "author_lookup": {
+                "$cond": [
+                    {"$ifNull": ["$author_snapshot", False]},
+                    "$$REMOVE",
+                    "$author",
+                ],
+            },
+        },
+    },
+    {
+        "$lookup": {
+            "from": "users",
+            "localField": "author_lookup",
+            "foreignField": "_id",
+            "as": "author_profile",
+        },
+    },
+    {
+        "$set": {
+            "author": {
+                "_id": "$author",
+                "name": {
+                    "$ifNull": [
+                        "$author_snapshot.name",
+                        {"$first": "$author_profile.name"},
+                    ],
+                },
+                "email": {
+                    "$ifNull": [
+                        "$author_snapshot.email",
+                        {"$first": "$author_profile.email"},
+                    ],
+                },
+            },
+        },
+    },
+    {"$unset": ["author_snapshot", "author_lookup", "author_profile"]},
+]
+"""Aggregation stages which replace the `author` ID with its profile snapshot."""
+
+_propagation = ThreadPoolExecutor(1, thread_name_prefix="snapshot-propagation")
+"""Worker which propagates profile changes to author snapshots, in order.
+
+Pending propagations are also marked on the user, as `snapshot_pending`, so
+the ones which were lost when a worker stopped are resumed later, see
+`resume_profile_propagation`.
+"""
+
+_logger = getLogger(__name__)
+
+USERS_TOPIC = "users"
+"""Topic of the events of changed users."""
 
-def get_all_users() -> DbUserList:
-    """Get all users.
+_users = Cache[ObjectId, DbUser](user_cache_size, user_cache_ttl)
+"""Users by ID, cached by this worker."""
+
+subscribe(USERS_TOPIC, _users.invalidate, _users.clear)
+metrics.register("user_cache", _users.stats)
+
+
+def invalidate_users(user_ids: list[ObjectId]) -> None:
+    """Drop changed users from the cache of every worker.
+
+    Call this after every write to user documents, including their counters.
+
+    Args:
+        user_ids (list[ObjectId]): Id of the changed users.
+
+    """
+    if user_cache_size:
+        publish(USERS_TOPIC, user_ids)
+
+
+def get_all_users(
+    after: ObjectId | None = None,
+    limit: int = page_size_default,
+) -> DbUserProfileList:
+    """Get a page of all users, oldest first.
+
+    Args:
+        after (ObjectId, optional): Id of the last user on the previous page.
+            Defaults to None, which starts from the oldest user.
+        limit (int, optional): Page size. Defaults to the configured page size.
 
     Returns:
-        DbUserList: Users in the database.
+        DbUserProfileList: Users in the database.
 
     """
-    result = db.users.find({}).to_list()
+    result = (
+        db.users.find(keyset(after), PROFILE_PROJECTION)
+        .sort("_id", 1)
+        .limit(page_limit(limit))
+        .to_list()
+    )
 
-    return DbUserList.model_validate(result)
+    return DbUserProfileList.model_validate(result)
 
 
 def get_user_by_id(user_id: ObjectId) -> DbUser:
@@ -36,9 +158,19 @@ def get_user_by_id(user_id: ObjectId) -> DbUser:
         DbUserNotFoundError: User with the given ID was not in the database.
 
     Returns:
-        DbUser: The user in the database.
+        DbUser: The user in the database, or in the cache of this worker.
 
     """
+    if not user_cache_size:
+        return _find_user(user_id)
+
+    listen()
+
+    return _users.get(user_id, _find_user)
+
+
+def _find_user(user_id: ObjectId) -> DbUser:
+    """Get user by ID from the database. See `get_user_by_id`."""
     result = db.users.find_one({"_id": user_id})
 
     if result is None:
@@ -47,6 +179,46 @@ def get_user_by_id(user_id: ObjectId) -> DbUser:
     return DbUser.model_validate(result)
 
 
+def get_user_profile(user_id: ObjectId) -> DbUserProfile:
+    """Get the profile of a user by ID, without their private data.
+
+    Args:
+        user_id (ObjectId): ID of user.
+
+    Raises:
+        DbUserNotFoundError: User with the given ID was not in the database.
+
+    Returns:
+        DbUserProfile: The user profile in the database.
+
+    """
+    if user_cache_size:
+        return model_convert(DbUserProfile, get_user_by_id(user_id))
+
+    result = db.users.find_one({"_id": user_id}, PROFILE_PROJECTION)
+
+    if result is None:
+        raise DbUserNotFoundError
+
+    return DbUserProfile.model_validate(result)
+
+
+def get_user_version(user_id: ObjectId) -> RawBSONDocument | None:
+    """Get the profile of a user as raw BSON, for its ETag.
+
+    Args:
+        user_id (ObjectId): ID of user.
+
+    Returns:
+        RawBSONDocument | None: The user profile, or None if it does not exist.
+
+    """
+    return db.users.with_options(codec_options=RAW).find_one(
+        {"_id": user_id},
+        PROFILE_PROJECTION,
+    )
+
+
 def validate_user_id(user_id: ObjectId) -> None:
     """Verify that a user by the given ID exists without retrieving their data.
 
@@ -57,6 +229,10 @@ def validate_user_id(user_id: ObjectId) -> None:
         DbUserNotFoundError: User with the given ID was not in the database.
 
     """
+    if user_cache_size:
+        get_user_by_id(user_id)
+        return
+
     result = db.users.find_one({"_id": user_id}, {"_id": 1})
 
     if result is None:
@@ -113,7 +289,9 @@ def create_user(
         "name": name,
         "email": email,
         "credential": credential,
-        "followings": [],
+        "follower_count": 0,
+        "following_count": 0,
+        "post_count": 0,
     }
 
     try:
@@ -129,6 +307,27 @@ def create_user(
     return DbUser.model_validate(user)
 
 
+def _user_patch(
+    name: str | None,
+    email: str | None,
+    credential: bytes | None,
+) -> dict[str, Any]:
+    """Create the fields to set by `update_user`, skipping the missing ones."""
+    patch: dict[str, Any] = {}
+
+    if name is not None:
+        patch["name"] = name
+
+    if email is not None:
+        validate_email(email)
+        patch["email"] = email
+
+    if credential is not None:
+        patch["credential"] = credential
+
+    return patch
+
+
 def update_user(
     user_id: ObjectId,
     name: str | None = None,
@@ -140,6 +339,11 @@ def update_user(
     Do not use the `credential` parameter directly.
     Use `server.auth.controller.change_password` instead.
 
+    Name and email changes are copied to the author snapshots of posts and
+    comments in the background. Until that finishes, reads may show the
+    previous profile of the user. The user is marked as pending propagation
+    before the change, so propagations which were lost are resumed later.
+
     Args:
         user_id (ObjectId): Id of user.
         name (str, optional): New name of user. Defaults to None.
@@ -151,21 +355,19 @@ def update_user(
         DbUserNotFoundError: No user with the given id exist.
 
     """
-    patch = {}
-
-    if name is not None:
-        patch["name"] = name
-
-    if email is not None:
-        validate_email(email)
-        patch["email"] = email
-
-    if credential is not None:
-        patch["credential"] = credential
+    patch = _user_patch(name, email, credential)
 
     if not patch:
         return False
 
+    propagate = "name" in patch or "email" in patch
+
+    if propagate:
+        db.users.update_one(
+            {"_id": user_id},
+            {"$set": {"snapshot_pending": ObjectId()}},
+        )
+
     try:
         result = db.users.update_one(
             {
@@ -183,9 +385,121 @@ def update_user(
     if result.matched_count < 1:
         raise DbUserNotFoundError
 
+    if result.modified_count > 0:
+        invalidate_users([user_id])
+
+    if propagate:
+        _submit_propagation(propagate_user_profile, user_id)
+
     return result.modified_count > 0
 
 
+def author_snapshot(user: DbUserProfile) -> dict[str, Any]:
+    """Create the author snapshot stored on posts and comments.
+
+    Args:
+        user (DbUserProfile): Profile of authoring user.
+
+    Returns:
+        dict[str, Any]: Author snapshot.
+
+    """
+    return {"name": user.name, "email": user.email}
+
+
+def _log_propagation_failure(future: Future[int]) -> None:
+    """Log the exception of a failed propagation."""
+    error = future.exception()
+
+    if error is not None:
+        _logger.error("Propagating a user profile failed.", exc_info=error)
+
+
+def _submit_propagation(function: Callable[..., int], *args: object) -> None:
+    """Run a propagation in the background, and log it if it fails."""
+    _propagation.submit(function, *args).add_done_callback(_log_propagation_failure)
+
+
+def propagate_user_profile(user_id: ObjectId) -> int:
+    """Copy the current profile of a user into their author snapshots.
+
+    Snapshots are updated in batches, so other writes are not blocked for
+    long. The profile is read when propagating rather than when it changed,
+    so running this repeatedly or out of order still converges. Once done,
+    the pending mark of the user is cleared, unless it changed meanwhile.
+
+    Args:
+        user_id (ObjectId): Id of user.
+
+    Returns:
+        int: Number of posts and comments which were updated.
+
+    """
+    from server.posts.controller import publish_posts
+
+    user = db.users.find_one(
+        {"_id": user_id},
+        {**PROFILE_PROJECTION, "snapshot_pending": 1},
+    )
+
+    if user is None:
+        return 0
+
+    snapshot = author_snapshot(DbUserProfile.model_validate(user))
+
+    updated = 0
+
+    for collection in (db.posts, db.comments):
+        stale = collection.find(
+            {"author": user_id, "author_snapshot": {"$ne": snapshot}},
+            {"_id": 1},
+        ).sort("_id", 1)
+
+        for batch in batched((i["_id"] for i in stale), SNAPSHOT_BATCH_SIZE):
+            result = collection.update_many(
+                {"_id": {"$in": list(batch)}},
+                {
+                    "$set": {
+                        "author_snapshot": snapshot,
+                        "change_time": datetime.now(UTC),
+                    },
+                },
+            )
+            updated += result.modified_count
+
+            if collection is db.posts:
+                publish_posts(list(batch))
+
+    if "snapshot_pending" in user:
+        db.users.update_one(
+            {"_id": user_id, "snapshot_pending": user["snapshot_pending"]},
+            {"$unset": {"snapshot_pending": ""}},
+        )
+
+    return updated
+
+
+def propagate_pending_profiles() -> int:
+    """Propagate the profile of every user marked as pending propagation.
+
+    Returns:
+        int: Number of posts and comments which were updated.
+
+    """
+    pending = db.users.find({"snapshot_pending": {"$exists": True}}, {"_id": 1})
+
+    return sum(propagate_user_profile(i["_id"]) for i in pending)
+
+
+def resume_profile_propagation() -> None:
+    """Resume the propagations which were lost, in the background.
+
+    Called when a worker starts, since workers which stopped before finishing
+    their propagations leave their users marked as pending.
+    """
+    _submit_propagation(propagate_pending_profiles)
+
+
 def delete_user(user_id: ObjectId) -> None:
     """Delete user.
 
@@ -197,7 +511,9 @@ def delete_user(user_id: ObjectId) -> None:
 
     """
     from server.comments.controller import delete_comments_by_author
+    from server.followings.controller import delete_user_followings
     from server.posts.controller import delete_posts_by_author
+    from server.timelines.controller import delete_timeline
 
     result = db.users.delete_one(
         {"_id": user_id, "email": {"$ne": {"$literal": admin_email}}},
@@ -206,7 +522,8 @@ def delete_user(user_id: ObjectId) -> None:
     if result.deleted_count < 1:
         raise DbUserNotFoundError
 
-    db.users.update_many({"followings": user_id}, {"$pull": {"followings": user_id}})
-
+    invalidate_users([user_id])
+    delete_user_followings(user_id)
+    delete_timeline(user_id)
     delete_posts_by_author(user_id)
     delete_comments_by_author(user_id)
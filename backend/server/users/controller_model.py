@@ -2,17 +2,28 @@
 
 from pydantic import BaseModel, EmailStr, RootModel
 
-from server.model_utils import ObjectIdRaw, SelfIdRaw
+from server.model_utils import SelfIdRaw
 
 
-class DbUser(BaseModel):
-    """User database schema."""
+class DbUserProfile(BaseModel):
+    """Public part of the user database schema, used by read paths.
+
+    Counters are None on author snapshots, which do not store them.
+    """
 
     id: SelfIdRaw
     name: str
     email: EmailStr
+    follower_count: int | None = None
+    following_count: int | None = None
+    post_count: int | None = None
+
+
+class DbUser(DbUserProfile):
+    """User database schema."""
+
     credential: bytes
-    followings: list[ObjectIdRaw]
+    feed_pulled: bool = False
 
 
 class DbUserNotFoundError(Exception):
@@ -23,5 +34,5 @@ class DbUserExistsError(Exception):
     """User was already in the database."""
 
 
-DbUserList = RootModel[list[DbUser]]
-"""List of database users."""
+DbUserProfileList = RootModel[list[DbUserProfile]]
+"""List of database user profiles."""
@@ -5,12 +5,15 @@ from flask_openapi3.blueprint import APIBlueprint
 from flask_openapi3.models.tag import Tag
 
 from server.auth.view_model import AuthnFailed, AuthzFailed
+from server.etags import validate
 from server.model_utils import model_convert
+from server.pagination import PageQuery, next_page_headers
 from server.plugins import current_user
 from server.users.controller import (
     delete_user,
     get_all_users,
-    get_user_by_id,
+    get_user_profile,
+    get_user_version,
     update_user,
 )
 from server.users.controller_model import DbUserExistsError, DbUserNotFoundError
@@ -29,11 +32,15 @@ bp = APIBlueprint("user", __name__, url_prefix="/users")
 
 
 @bp.get("/", operation_id="getAllUsers", tags=[_users_tag], responses={200: UsersList})
-def handle_get_all_users():  # noqa: ANN201
+def handle_get_all_users(query: PageQuery):  # noqa: ANN201
     """Get all users."""
-    users = get_all_users()
+    users = get_all_users(query.after, query.limit)
 
-    return model_convert(UsersList, users).model_dump()
+    return (
+        model_convert(UsersList, users).model_dump(),
+        200,
+        next_page_headers(users.root, query.limit),
+    )
 
 
 @bp.get(
@@ -47,12 +54,17 @@ def handle_get_all_users():  # noqa: ANN201
 )
 def handle_get_user_by_id(path: UserId):  # noqa: ANN201
     """Get user by ID."""
+    modified, etag = validate(lambda: get_user_version(path.user_id))
+
+    if not modified:
+        return "", 304, etag
+
     try:
-        user = get_user_by_id(path.user_id)
+        user = get_user_profile(path.user_id)
     except DbUserNotFoundError:
         return UserNotFound().model_dump(), 404
 
-    return model_convert(User, user).model_dump()
+    return model_convert(User, user).model_dump(), 200, etag
 
 
 @bp.patch(
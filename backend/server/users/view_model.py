@@ -6,11 +6,17 @@ from server.model_utils import ObjectIdStr, SelfIdStr
 
 
 class User(BaseModel):
-    """Signed-up user."""
+    """Signed-up user.
+
+    Counters are null on the authors of posts and comments.
+    """
 
     id: SelfIdStr
     name: str
     email: EmailStr
+    follower_count: int | None = None
+    following_count: int | None = None
+    post_count: int | None = None
 
 
 class UserInit(BaseModel):
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""Micro-benchmark the hot paths of the backend, stage by stage.
+
+By default, this spawns a throwaway `mongod` (which has to be on the PATH)
+with its data on a memory-backed file system when one is available. It is
+populated in bulk mode at each of the given dataset sizes. Pass `--external`
+to benchmark the configured database instead, which must already be
+populated.
+
+Each controller call is split into stages, by their median time:
+
+- `db`: Database round trips, as reported by the driver.
+- `controller`: The rest of the controller call. This is mostly decoding
+  documents and validating them into database models.
+- `convert`: Conversion of the database models into response models.
+- `serialize`: Dumping the response models, and encoding them as JSON.
+
+Helpers which do not use the database only have a `python` stage.
+"""
+
+from argparse import ArgumentParser
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from datetime import UTC, datetime
+from json import dumps
+from logging import getLogger
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from threading import get_ident
+from time import perf_counter_ns
+from typing import Any
+
+import __init__  # noqa: F401
+from pymongo import monitoring
+
+from tasks.explain import spawn_mongod
+
+MEMORY_FS = Path("/dev/shm")  # noqa: S108
+"""Memory-backed file system, for the data of the spawned database."""
+
+_logger = getLogger(__name__)
+
+
+class _CommandTimer(monitoring.CommandListener):
+    """Sum the duration of database commands sent by the benchmarking thread.
+
+    Background threads of the app, like the events tailer, send commands
+    meanwhile, which are ignored. Listeners are called by the thread which
+    sent the command.
+    """
+
+    def __init__(self) -> None:
+        """Create a timer with no recorded time, for the current thread."""
+        self.nanoseconds = 0
+        self.thread = get_ident()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """Ignore started commands."""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """Record the duration of a command."""
+        if get_ident() == self.thread:
+            self.nanoseconds += event.duration_micros * 1000
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """Record the duration of a failed command."""
+        if get_ident() == self.thread:
+            self.nanoseconds += event.duration_micros * 1000
+
+
+_timer = _CommandTimer()
+"""Timer of controller commands.
+
+It has to be registered before the database client is created.
+"""
+monitoring.register(_timer)
+
+type _Stages = dict[str, Callable[[Any], Any]]
+"""Stages of a benchmark, each one given the result of the previous one."""
+
+type _Scenario = tuple[Callable[[], Any] | None, Any, _Stages]
+"""Controller call and stages of a benchmark.
+
+Benchmarks without a controller call give a fixed input to their first stage.
+"""
+
+
+def _scenarios() -> dict[str, _Scenario]:
+    """Create every benchmark, using ids from the database.
+
+    Returns:
+        dict[str, _Scenario]: Benchmarks by name.
+
+    """
+    from flask_jwt_extended import create_access_token, decode_token
+    from pydantic import BaseModel, TypeAdapter
+
+    from server.app import create_app
+    from server.comments import controller as comments
+    from server.comments.view_model import CommentsList
+    from server.db import db
+    from server.json_provider import encode
+    from server.model_utils import Instant, ObjectIdStr, model_convert
+    from server.plugins import user_lookup
+    from server.posts import controller as posts
+    from server.posts.view_model import Post, PostsList
+    from server.users import controller as users
+    from server.users.view_model import User
+
+    user = db.users.aggregate(
+        [
+            {"$project": {"following_count": 1}},
+            {"$sort": {"following_count": -1}},
+            {"$limit": 1},
+        ],
+    ).next()
+    post = db.comments.aggregate(
+        [
+            {"$group": {"_id": "$post", "n": {"$sum": 1}}},
+            {"$sort": {"n": -1}},
+            {"$limit": 1},
+        ],
+    ).next()
+    user_id = user["_id"]
+    post_id = post["_id"]
+
+    def response(target: type[BaseModel]) -> _Stages:
+        return {
+            "convert": lambda x: model_convert(target, x),
+            "serialize": lambda x: encode(x.model_dump()),
+        }
+
+    with create_app().app_context():
+        token = create_access_token(model_convert(User, users.get_user_by_id(user_id)))
+        jwt_data = decode_token(token)
+
+    instant = TypeAdapter(Instant)
+    object_id = TypeAdapter(ObjectIdStr)
+
+    return {
+        "get_post_feed": (
+            lambda: posts.get_post_feed(user_id),
+            None,
+            response(PostsList),
+        ),
+        "get_post_by_id": (lambda: posts.get_post_by_id(post_id), None, response(Post)),
+        "get_comments_of_post": (
+            lambda: comments.get_comments_of_post(post_id),
+            None,
+            response(CommentsList),
+        ),
+        "get_user_by_id": (lambda: users.get_user_by_id(user_id), None, response(User)),
+        "model_convert(PostsList)": (
+            None,
+            posts.get_post_feed(user_id),
+            {"python": lambda x: model_convert(PostsList, x)},
+        ),
+        "user_lookup": (None, jwt_data, {"python": lambda x: user_lookup({}, x)}),
+        "Instant": (None, datetime.now(UTC), {"python": instant.dump_python}),
+        "ObjectIdStr": (
+            None,
+            str(user_id),
+            {"python": lambda x: object_id.dump_python(object_id.validate_python(x))},
+        ),
+    }
+
+
+def _measure(scenario: _Scenario, iterations: int) -> dict[str, float]:
+    """Run a benchmark repeatedly, and time each of its stages.
+
+    Args:
+        scenario (_Scenario): The benchmark.
+        iterations (int): Number of measured runs, after as many warmup runs.
+
+    Returns:
+        dict[str, float]: Median time of each stage, and in total, in
+            microseconds.
+
+    """
+    controller, value, stages = scenario
+    times: defaultdict[str, list[int]] = defaultdict(list)
+
+    for i in range(2 * iterations):
+        total = 0
+
+        if controller is not None:
+            _timer.nanoseconds = 0
+            start = perf_counter_ns()
+            value = controller()
+            elapsed = perf_counter_ns() - start
+            times["db"].append(_timer.nanoseconds)
+            times["controller"].append(elapsed - _timer.nanoseconds)
+            total += elapsed
+
+        result = value
+
+        for name, stage in stages.items():
+            start = perf_counter_ns()
+            result = stage(result)
+            elapsed = perf_counter_ns() - start
+            times[name].append(elapsed)
+            total += elapsed
+
+        times["total"].append(total)
+
+        if i + 1 == iterations:
+            times.clear()
+
+    return {name: median(values) / 1000 for name, values in times.items()}
+
+
+def benchmark(iterations: int) -> dict[str, dict[str, float]]:
+    """Run every benchmark against the configured database.
+
+    Args:
+        iterations (int): Number of measured runs of each benchmark.
+
+    Returns:
+        dict[str, dict[str, float]]: Median time of each stage, in
+            microseconds, by benchmark.
+
+    """
+    results: dict[str, dict[str, float]] = {}
+
+    for name, scenario in _scenarios().items():
+        results[name] = stages = _measure(scenario, iterations)
+        _logger.info(
+            "%-26s %s",
+            name,
+            "  ".join(f"{k} {v:9.1f}" for k, v in stages.items()),
+        )
+
+    return results
+
+
+def populated(sizes: list[int]) -> Iterator[int]:
+    """Spawn a throwaway database, and populate it at each dataset size.
+
+    Args:
+        sizes (list[int]): Numbers of users.
+
+    Yields:
+        int: Number of users, once the database is populated with them.
+
+    """
+    with TemporaryDirectory(dir=MEMORY_FS if MEMORY_FS.is_dir() else None) as path:
+        mongod = spawn_mongod(Path(path))
+
+        try:
+            # Modules which use the configuration are imported only after
+            # pointing it to the spawned database.
+            from tasks.populate import BulkSizes, populate_bulk
+
+            for size in sizes:
+                populate_bulk(
+                    BulkSizes(
+                        users=size,
+                        followings=50,
+                        posts=10,
+                        comments=3,
+                        batch_size=10_000,
+                        seed=0,
+                    ),
+                )
+                yield size
+        finally:
+            mongod.terminate()
+            mongod.wait()
+
+
+def main() -> None:
+    """Run the benchmarks, as configured by the command line."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--external",
+        action="store_true",
+        help="benchmark the configured database instead of spawning one",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda x: [int(i) for i in x.split(",")],
+        default=[1000, 10_000],
+        help="comma separated numbers of users to populate (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=200,
+        help="measured runs of each benchmark (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="file to save the results to")
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {
+        "time": datetime.now(UTC).isoformat(),
+        "config": {"iterations": args.iterations},
+        "unit": "microseconds",
+        "sizes": {},
+    }
+
+    if args.external:
+        results["sizes"]["external"] = benchmark(args.iterations)
+    else:
+        for size in populated(args.sizes):
+            _logger.info("Benchmarking %d users...", size)
+            results["sizes"][size] = benchmark(args.iterations)
+
+    if args.output:
+        args.output.write_text(dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
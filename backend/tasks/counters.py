@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Recompute the denormalized counters of users and posts.
+
+Counters are kept up to date by the controllers, but can drift when a write
+is interrupted halfway, or when data is edited by hand. This task recomputes
+all of them on the database server, and overwrites the stored values.
+
+Writes which happen while the task runs may be lost from the counters, so run
+it when the backend is idle.
+"""
+
+from typing import Any
+
+import __init__  # noqa: F401
+
+from server.db import db
+
+
+def _count(collection: str, field: str, name: str) -> list[dict[str, Any]]:
+    """Create aggregation stages which count the documents referring to the input.
+
+    Args:
+        collection (str): Name of the counted collection.
+        field (str): Field of the counted documents, holding the referred ID.
+        name (str): Field which will hold the count.
+
+    Returns:
+        list[dict[str, Any]]: Aggregation stages.
+
+    """
+    return [
+        {
+            "$lookup": {
+                "from": collection,
+                "localField": "_id",
+                "foreignField": field,
+                "pipeline": [{"$project": {"_id": 1}}, {"$count": "n"}],
+                "as": name,
+            },
+        },
+        {"$set": {name: {"$ifNull": [{"$first": f"${name}.n"}, 0]}}},
+    ]
+
+
+def _merge_into(collection: str) -> dict[str, Any]:
+    """Create an aggregation stage which writes the counters back.
+
+    Args:
+        collection (str): Name of the updated collection.
+
+    Returns:
+        dict[str, Any]: Aggregation stage.
+
+    """
+    return {
+        "$merge": {
+            "into": collection,
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard",
+        },
+    }
+
+
+def repair_counters() -> None:
+    """Recompute the counters of every user and post."""
+    db.users.aggregate(
+        [
+            {"$project": {"_id": 1}},
+            *_count("followings", "follower", "following_count"),
+            *_count("followings", "following", "follower_count"),
+            *_count("posts", "author", "post_count"),
+            _merge_into("users"),
+        ],
+        comment="Counter repair",
+    )
+    db.posts.aggregate(
+        [
+            {"$project": {"_id": 1}},
+            *_count("comments", "post", "comment_count"),
+            _merge_into("posts"),
+        ],
+        comment="Counter repair",
+    )
+
+
+if __name__ == "__main__":
+    repair_counters()
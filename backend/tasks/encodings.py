@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""Compare the size and encode time of the response formats.
+
+Feeds and comment lists are encoded as JSON, MessagePack and CBOR, see
+`server/formats.py`. Each format is reported with its payload size, before and
+after gzip, and the median time to encode and decode it.
+
+Like `tasks/benchmark.py`, this spawns a throwaway `mongod` populated at each
+of the given dataset sizes, unless `--external` is passed to use the
+configured database, which must already be populated.
+"""
+
+import gzip
+from argparse import ArgumentParser
+from collections.abc import Callable
+from datetime import UTC, datetime
+from json import dumps
+from logging import getLogger
+from pathlib import Path
+from statistics import median
+from time import perf_counter_ns
+from typing import Any
+
+import __init__  # noqa: F401
+
+from tasks.benchmark import populated
+
+_logger = getLogger(__name__)
+
+
+def _payloads() -> dict[str, Any]:
+    """Create the response bodies to encode, using the largest lists.
+
+    Returns:
+        dict[str, Any]: Dumped response models, by name.
+
+    """
+    from server.comments import controller as comments
+    from server.comments.view_model import CommentsList
+    from server.config import page_size_max
+    from server.db import db
+    from server.model_utils import model_convert
+    from server.posts import controller as posts
+    from server.posts.view_model import PostsList
+
+    user = db.users.find({}, {"_id": 1}).sort("following_count", -1).limit(1).next()
+    post = db.posts.find({}, {"_id": 1}).sort("comment_count", -1).limit(1).next()
+
+    return {
+        "get_post_feed": model_convert(
+            PostsList,
+            posts.get_post_feed(user["_id"], limit=page_size_max),
+        ).model_dump(),
+        "get_all_posts": model_convert(
+            PostsList,
+            posts.get_all_posts(limit=page_size_max),
+        ).model_dump(),
+        "get_comments_of_post": model_convert(
+            CommentsList,
+            comments.get_comments_of_post(post["_id"], limit=page_size_max),
+        ).model_dump(),
+    }
+
+
+def _median_time(function: Callable[[], object], iterations: int) -> float:
+    """Time a function by its median, after as many warmup runs.
+
+    Args:
+        function (Callable[[], object]): The function.
+        iterations (int): Number of measured runs.
+
+    Returns:
+        float: Median time, in microseconds.
+
+    """
+    times: list[int] = []
+
+    for i in range(2 * iterations):
+        start = perf_counter_ns()
+        function()
+        elapsed = perf_counter_ns() - start
+
+        if i >= iterations:
+            times.append(elapsed)
+
+    return median(times) / 1000
+
+
+def compare(iterations: int) -> dict[str, dict[str, dict[str, float]]]:
+    """Encode every payload in every format, against the configured database.
+
+    Args:
+        iterations (int): Number of measured runs of each encoding.
+
+    Returns:
+        dict[str, dict[str, dict[str, float]]]: Size in bytes, gzipped size,
+            and encode and decode time in microseconds, by payload and format.
+
+    """
+    from orjson import loads
+
+    from server.formats import DECODERS, ENCODERS, JSON
+
+    decoders = {JSON: loads, **DECODERS}
+    results: dict[str, dict[str, dict[str, float]]] = {}
+
+    for name, payload in _payloads().items():
+        results[name] = {}
+
+        for mimetype, encoder in ENCODERS.items():
+            data = encoder(payload)
+            decoder = decoders[mimetype]
+            results[name][mimetype] = stats = {
+                "size": len(data),
+                "gzip": len(gzip.compress(data)),
+                "encode": _median_time(lambda: encoder(payload), iterations),  # noqa: B023
+                "decode": _median_time(lambda: decoder(data), iterations),  # noqa: B023
+            }
+            _logger.info(
+                "%-21s %-19s %8d B  gzip %7d B  encode %8.1f us  decode %8.1f us",
+                name,
+                mimetype,
+                stats["size"],
+                stats["gzip"],
+                stats["encode"],
+                stats["decode"],
+            )
+
+    return results
+
+
+def main() -> None:
+    """Compare the formats, as configured by the command line."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--external",
+        action="store_true",
+        help="use the configured database instead of spawning one",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda x: [int(i) for i in x.split(",")],
+        default=[1000],
+        help="comma separated numbers of users to populate (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=200,
+        help="measured runs of each encoding (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="file to save the results to")
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {
+        "time": datetime.now(UTC).isoformat(),
+        "config": {"iterations": args.iterations},
+        "unit": {"size": "bytes", "time": "microseconds"},
+        "sizes": {},
+    }
+
+    if args.external:
+        results["sizes"]["external"] = compare(args.iterations)
+    else:
+        for size in populated(args.sizes):
+            _logger.info("Comparing %d users...", size)
+            results["sizes"][size] = compare(args.iterations)
+
+    if args.output:
+        args.output.write_text(dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
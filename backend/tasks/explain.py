@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""Check the query plans of every controller query.
+
+By default, this spawns a throwaway `mongod` (which has to be on the PATH),
+populates it with mock data, and then calls each read controller while
+recording the database commands it sends. Every recorded command is explained,
+and the task fails if any plan contains a collection scan, an in-memory sort,
+a `$lookup` without an index, or examines too many documents per result.
+
+Pass `--external` to check the configured database instead, which must
+already be populated.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from collections.abc import Callable, Iterator
+from logging import ERROR, INFO, getLogger
+from pathlib import Path
+from secrets import token_hex
+from shutil import which
+from socket import socket
+from subprocess import DEVNULL, Popen
+from tempfile import TemporaryDirectory
+from typing import Any
+
+import __init__  # noqa: F401
+from pymongo import MongoClient, monitoring
+
+EXPLAINABLE = {"aggregate", "count", "distinct", "find"}
+"""Commands which can be explained."""
+
+_logger = getLogger(__name__)
+
+
+class _CommandRecorder(monitoring.CommandListener):
+    """Record the database commands sent while recording."""
+
+    def __init__(self) -> None:
+        """Create a stopped recorder."""
+        self.recording = False
+        self.commands: list[dict[str, Any]] = []
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """Record a command, if recording."""
+        if self.recording and event.command_name in EXPLAINABLE:
+            self.commands.append(
+                {
+                    k: v
+                    for k, v in event.command.items()
+                    if not k.startswith("$") and k != "lsid"
+                },
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """Ignore command results."""
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """Ignore command failures."""
+
+
+_recorder = _CommandRecorder()
+"""Recorder of controller commands.
+
+It has to be registered before the database client is created.
+"""
+monitoring.register(_recorder)
+
+
+def _free_port() -> int:
+    """Find a free local TCP port.
+
+    Returns:
+        int: Port number.
+
+    """
+    with socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_mongod(path: Path) -> Popen[bytes]:
+    """Spawn a local mongod and point the backend configuration to it.
+
+    Args:
+        path (Path): Empty database directory.
+
+    Returns:
+        Popen[bytes]: The mongod process.
+
+    """
+    mongod = which("mongod")
+
+    if mongod is None:
+        _logger.critical("Could not find mongod on the PATH.")
+        _logger.info("Install MongoDB, or pass --external to use the configured one.")
+        sys.exit(1)
+
+    port = _free_port()
+    user = "explain"
+    password = token_hex(16)
+
+    process = Popen(  # noqa: S603
+        [
+            mongod,
+            *("--dbpath", str(path)),
+            *("--bind_ip", "127.0.0.1"),
+            *("--port", str(port)),
+            "--auth",
+        ],
+        stdout=DEVNULL,
+    )
+
+    # The localhost exception allows creating the first user without
+    # authenticating.
+    with MongoClient("127.0.0.1", port, directConnection=True) as client:
+        client.admin.command("ping")
+        client.admin.command("createUser", user, pwd=password, roles=["root"])
+
+    os.environ.update(
+        {
+            "SOCIAL_BE_MAINTENANCE": "1",
+            "SOCIAL_BE_DB_HOST": "127.0.0.1",
+            "SOCIAL_BE_DB_PORT": str(port),
+            "SOCIAL_DB_ROOT_USER": user,
+            "SOCIAL_DB_ROOT_PASS": password,
+        },
+    )
+
+    return process
+
+
+def _walk(node: object) -> Iterator[dict[str, Any]]:
+    """Iterate over every object nested in an explain result.
+
+    Args:
+        node (object): Explain result, or a part of it.
+
+    Yields:
+        dict[str, Any]: Nested objects, including the given one.
+
+    """
+    if isinstance(node, dict):
+        yield node
+
+        for i in node.values():
+            yield from _walk(i)
+    elif isinstance(node, list):
+        for i in node:
+            yield from _walk(i)
+
+
+def _inspect(explain: dict[str, Any], max_ratio: float) -> list[str]:
+    """Find performance problems in an explain result.
+
+    Args:
+        explain (dict[str, Any]): Explain result, in `executionStats` verbosity.
+        max_ratio (float): Maximum allowed documents examined per result.
+
+    Returns:
+        list[str]: Problems found in the plan.
+
+    """
+    problems: list[str] = []
+
+    for node in _walk(explain):
+        stage = node.get("stage")
+
+        if stage == "COLLSCAN":
+            problems.append("collection scan")
+
+        if stage == "SORT":
+            problems.append("in-memory sort")
+
+        if "$lookup" in node and node.get("collectionScans"):
+            problems.append("$lookup without an index")
+
+        stats = node.get("executionStats")
+
+        if isinstance(stats, dict):
+            examined = stats.get("totalDocsExamined", 0)
+            returned = stats.get("nReturned", 0)
+
+            if examined > max_ratio * max(returned, 1):
+                problems.append(f"examined {examined} documents for {returned} results")
+
+    return list(dict.fromkeys(problems))
+
+
+def _scenarios() -> list[tuple[str, Callable[[], object]]]:
+    """Create a call to every read controller, using ids from the database.
+
+    Returns:
+        list[tuple[str, Callable[[], object]]]: Name and call of each scenario.
+
+    """
+    from server.comments import controller as comments
+    from server.db import db
+    from server.followings import controller as followings
+    from server.posts import controller as posts
+    from server.timelines import controller as timelines
+    from server.users import controller as users
+
+    user = db.users.aggregate(
+        [
+            {"$project": {"email": 1, "following_count": 1}},
+            {"$sort": {"following_count": -1}},
+            {"$limit": 1},
+        ],
+    ).next()
+    post = db.comments.aggregate(
+        [
+            {"$group": {"_id": "$post", "n": {"$sum": 1}}},
+            {"$sort": {"n": -1}},
+            {"$limit": 1},
+        ],
+    ).next()
+    comment = db.comments.find_one({"post": post["_id"]}, {"_id": 1}) or {}
+    user_id = user["_id"]
+    post_id = post["_id"]
+
+    return [
+        ("get_all_posts", posts.get_all_posts),
+        ("get_all_posts(after)", lambda: posts.get_all_posts(after=post_id)),
+        ("get_post_by_id", lambda: posts.get_post_by_id(post_id)),
+        ("validate_post_id", lambda: posts.validate_post_id(post_id)),
+        ("get_posts_by_author", lambda: posts.get_posts_by_author(user_id)),
+        ("get_post_feed", lambda: posts.get_post_feed(user_id)),
+        ("get_post_feed(after)", lambda: posts.get_post_feed(user_id, after=post_id)),
+        ("get_comment_by_id", lambda: comments.get_comment_by_id(comment["_id"])),
+        ("validate_comment_id", lambda: comments.validate_comment_id(comment["_id"])),
+        ("get_comments_of_post", lambda: comments.get_comments_of_post(post_id)),
+        ("get_comments_by_author", lambda: comments.get_comments_by_author(user_id)),
+        ("get_all_users", users.get_all_users),
+        ("get_user_by_id", lambda: users.get_user_by_id(user_id)),
+        ("get_user_profile", lambda: users.get_user_profile(user_id)),
+        ("get_user_by_email", lambda: users.get_user_by_email(user["email"])),
+        ("validate_user_id", lambda: users.validate_user_id(user_id)),
+        ("get_user_followers", lambda: followings.get_user_followers(user_id)),
+        ("get_user_followings", lambda: followings.get_user_followings(user_id)),
+        ("get_following_ids", lambda: followings.get_following_ids(user_id)),
+        ("iter_follower_ids", lambda: list(followings.iter_follower_ids(user_id))),
+        (
+            "get_following_states",
+            lambda: followings.get_following_states(user_id, [user_id, post_id]),
+        ),
+        ("get_pulled_authors", timelines.get_pulled_authors),
+        ("is_pulled_author", lambda: timelines.is_pulled_author(user_id)),
+    ]
+
+
+def explain(max_ratio: float) -> bool:
+    """Explain every query of the read controllers.
+
+    Args:
+        max_ratio (float): Maximum allowed documents examined per result.
+
+    Returns:
+        bool: Were all plans acceptable?
+
+    """
+    from server.db import db
+
+    passed = True
+
+    for name, call in _scenarios():
+        _recorder.commands.clear()
+        _recorder.recording = True
+
+        try:
+            call()
+        finally:
+            _recorder.recording = False
+
+        for command in _recorder.commands:
+            collection = command[next(iter(command))]
+            result = db.command({"explain": command, "verbosity": "executionStats"})
+            problems = _inspect(result, max_ratio)
+            millis = next(
+                (
+                    i["executionTimeMillis"]
+                    for i in _walk(result)
+                    if "executionTimeMillis" in i
+                ),
+                "?",
+            )
+            passed = passed and not problems
+
+            _logger.log(
+                ERROR if problems else INFO,
+                "%s %s on %s (%s ms)%s",
+                "FAIL" if problems else "PASS",
+                name,
+                collection,
+                millis,
+                "".join(f"\n\t{i}" for i in problems),
+            )
+
+    return passed
+
+
+def main() -> None:
+    """Run the query plan checks."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--external",
+        action="store_true",
+        help="check the configured database instead of spawning one",
+    )
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=2,
+        help="maximum documents examined per result (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    if args.external:
+        sys.exit(0 if explain(args.max_ratio) else 1)
+
+    with TemporaryDirectory() as path:
+        mongod = spawn_mongod(Path(path))
+
+        try:
+            # Modules which use the configuration are imported only after
+            # pointing it to the spawned database.
+            from tasks.populate import populate
+
+            populate()
+            passed = explain(args.max_ratio)
+        finally:
+            mongod.terminate()
+            mongod.wait()
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Build missing database indexes and report unused ones.
+
+Indexes are compared against the registry in `server.indexes`. Missing indexes
+are built on the live database, without dropping anything. Indexes which
+differ from the registry or are not listed in it are only reported, and have
+to be dropped manually.
+"""
+
+import sys
+from logging import getLogger
+from typing import TYPE_CHECKING, Any
+
+import __init__  # noqa: F401
+
+from server.config import maintenance
+from server.db import db
+from server.indexes import INDEXES
+
+if TYPE_CHECKING:
+    from pymongo import IndexModel
+
+_COMPARED_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+)
+"""Index options which affect query results."""
+
+_logger = getLogger(__name__)
+
+
+def _describe(spec: dict[str, Any]) -> dict[str, Any]:
+    """Normalize an index specification for comparison.
+
+    Args:
+        spec (dict[str, Any]): Index specification, either from the database
+            or from the registry.
+
+    Returns:
+        dict[str, Any]: Keys and options of the index.
+
+    """
+    keys = spec["key"].items() if isinstance(spec["key"], dict) else spec["key"]
+
+    return {
+        "key": [(k, int(v) if isinstance(v, float) else v) for k, v in keys],
+        **{i: spec[i] for i in _COMPARED_OPTIONS if i in spec},
+    }
+
+
+def migrate_indexes() -> None:
+    """Build the indexes which are in the registry but not in the database."""
+    for name, models in INDEXES.items():
+        collection = db[name]
+        live = collection.index_information()
+        missing: list[IndexModel] = []
+
+        for model in models:
+            spec = model.document
+            current = live.get(spec["name"])
+
+            if current is None:
+                missing.append(model)
+            elif _describe(current) != _describe(spec):
+                _logger.warning(
+                    "Index %s.%s differs from the registry. Drop it to rebuild.",
+                    name,
+                    spec["name"],
+                )
+
+        listed = {i.document["name"] for i in models}
+
+        for index in live:
+            if index != "_id_" and index not in listed:
+                _logger.warning("Index %s.%s is not in the registry.", name, index)
+
+        if missing:
+            _logger.info("Building %d indexes on %s...", len(missing), name)
+            collection.create_indexes(missing, comment="Index migration")
+            _logger.info("\tDone.")
+
+
+def report_unused_indexes() -> None:
+    """Report the indexes which were never used since the database started.
+
+    Every index slows down writes, so unused ones should be reviewed and
+    dropped. The counters are per database node and reset on restart.
+    """
+    for name in INDEXES:
+        for stats in db[name].aggregate([{"$indexStats": {}}]):
+            if stats["name"] == "_id_" or stats["accesses"]["ops"] > 0:
+                continue
+
+            _logger.warning(
+                "Index %s.%s was not used since %s.",
+                name,
+                stats["name"],
+                stats["accesses"]["since"].isoformat(),
+            )
+
+
+if __name__ == "__main__":
+    if not maintenance:
+        _logger.critical("Cannot inspect database indexes without maintenance mode.")
+        _logger.warning("Set SOCIAL_BE_MAINTENANCE=1 before running this task.")
+        sys.exit(1)
+
+    migrate_indexes()
+    report_unused_indexes()
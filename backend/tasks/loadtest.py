@@ -0,0 +1,599 @@
+#!/usr/bin/env python
+"""Benchmark the API with a realistic mix of requests.
+
+Identities and posts are sampled from the configured database, which has to
+be populated already. The sampled users get a known password, so that they
+can log in. Requests create posts, comments and followings, so run this
+against a disposable dataset, for example one restored by `tasks/snapshot.py`.
+
+By default, requests are sent to an in-process app through the Flask test
+client. Pass `--gunicorn` to spawn a Gunicorn server instead, or `--url` to
+benchmark a server which is already running.
+
+Throughput, error rate, and latency percentiles are reported per
+`operation_id`. Pass `--output` to save them as JSON, for comparing runs.
+"""
+
+import sys
+from argparse import ArgumentParser
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import UTC, datetime
+from http.client import HTTPConnection
+from json import dumps, loads
+from logging import getLogger
+from pathlib import Path
+from random import Random
+from socket import create_connection, socket
+from statistics import fmean, quantiles
+from subprocess import DEVNULL, Popen, TimeoutExpired
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from typing import Any, Protocol
+from urllib.parse import urlsplit
+
+import __init__  # noqa: F401
+
+from server.app import create_app
+from server.db import db
+from server.plugins import bcrypt
+
+PASSWORD = "load-test"  # noqa: S105
+"""Password given to the sampled users."""
+
+DEFAULT_MIX = {
+    "getPostFeed": 60,
+    "createPost": 10,
+    "createComment": 15,
+    "login": 5,
+    "toggleFollow": 10,
+}
+"""Default relative weight of each request kind."""
+
+GUNICORN_TIMEOUT = 30
+"""Seconds to wait for a spawned Gunicorn server to accept connections."""
+
+_logger = getLogger(__name__)
+
+
+class Client(Protocol):
+    """Sends requests to the API."""
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: object = None,
+        token: str | None = None,
+    ) -> tuple[int, Any]:
+        """Send a request.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Request path, including the query string.
+            body (object, optional): JSON body. Defaults to None.
+            token (str, optional): JWT. Defaults to None.
+
+        Returns:
+            tuple[int, Any]: Status code and JSON body of the response.
+
+        """
+        ...
+
+
+class AppClient:
+    """Sends requests to an in-process app."""
+
+    def __init__(self) -> None:
+        """Create an app and its test client."""
+        self.client = create_app().test_client()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: object = None,
+        token: str | None = None,
+    ) -> tuple[int, Any]:
+        """Send a request. See `Client.request`."""
+        response = self.client.open(
+            path,
+            method=method,
+            json=body,
+            headers={"Authorization": f"Bearer {token}"} if token else {},
+        )
+
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Sends requests to a server, over a persistent connection."""
+
+    def __init__(self, url: str) -> None:
+        """Create a connection to a server.
+
+        Args:
+            url (str): Base URL of the server.
+
+        """
+        parts = urlsplit(url)
+        self.connection = HTTPConnection(parts.hostname or "", parts.port or 80)
+        self.prefix = parts.path.rstrip("/")
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: object = None,
+        token: str | None = None,
+    ) -> tuple[int, Any]:
+        """Send a request. See `Client.request`."""
+        headers = {"Content-Type": "application/json"}
+
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        self.connection.request(
+            method,
+            self.prefix + path,
+            None if body is None else dumps(body),
+            headers,
+        )
+        response = self.connection.getresponse()
+        data = response.read()
+
+        try:
+            return response.status, loads(data)
+        except ValueError:
+            # Like `get_json(silent=True)`, bodies which are not JSON, such as
+            # empty ones or error pages of a proxy, are read as None.
+            return response.status, None
+
+
+class _Session:
+    """A sampled user sending requests."""
+
+    def __init__(self, user: dict[str, Any]) -> None:
+        """Represent a sampled user, before logging in.
+
+        Args:
+            user (dict[str, Any]): User document.
+
+        """
+        self.user_id = str(user["_id"])
+        self.email: str = user["email"]
+        self.token: str | None = None
+        self.followed: set[str] = set()
+
+
+class _Dataset:
+    """IDs sampled from the database."""
+
+    def __init__(self, users: int, posts: int) -> None:
+        """Sample users and posts, and set the password of the users.
+
+        Args:
+            users (int): Number of users to sample.
+            posts (int): Number of posts to sample.
+
+        """
+        self.users = db.users.aggregate(
+            [{"$sample": {"size": users}}, {"$project": {"email": 1}}],
+        ).to_list()
+        self.posts = [
+            str(i["_id"])
+            for i in db.posts.aggregate(
+                [{"$sample": {"size": posts}}, {"$project": {"_id": 1}}],
+            )
+        ]
+
+        db.users.update_many(
+            {"_id": {"$in": [i["_id"] for i in self.users]}},
+            {"$set": {"credential": bcrypt.generate_password_hash(PASSWORD)}},
+        )
+
+
+type _Operation = Callable[[Client, _Session, _Dataset, Random], tuple[str, int]]
+"""Sends one kind of request, and returns its `operation_id` and status."""
+
+
+def _login(
+    client: Client,
+    session: _Session,
+    _dataset: _Dataset,
+    _rng: Random,
+) -> tuple[str, int]:
+    """Log in, and keep the new token."""
+    status, body = client.request(
+        "POST",
+        "/users/login",
+        {"email": session.email, "password": PASSWORD},
+    )
+
+    if status == 200:  # noqa: PLR2004
+        session.token = body["jwt"]
+
+    return "login", status
+
+
+def _get_post_feed(
+    client: Client,
+    session: _Session,
+    _dataset: _Dataset,
+    _rng: Random,
+) -> tuple[str, int]:
+    """Read the first page of the feed."""
+    status, _ = client.request(
+        "GET",
+        f"/posts/feed/{session.user_id}",
+        token=session.token,
+    )
+
+    return "getPostFeed", status
+
+
+def _create_post(
+    client: Client,
+    session: _Session,
+    _dataset: _Dataset,
+    rng: Random,
+) -> tuple[str, int]:
+    """Create a post."""
+    status, _ = client.request(
+        "POST",
+        "/posts/",
+        {"content": f"Load test post {rng.random()}", "author": session.user_id},
+        session.token,
+    )
+
+    return "createPost", status
+
+
+def _create_comment(
+    client: Client,
+    session: _Session,
+    dataset: _Dataset,
+    rng: Random,
+) -> tuple[str, int]:
+    """Comment on a sampled post."""
+    status, _ = client.request(
+        "POST",
+        "/comments/",
+        {
+            "content": f"Load test comment {rng.random()}",
+            "author": session.user_id,
+            "post": rng.choice(dataset.posts),
+        },
+        session.token,
+    )
+
+    return "createComment", status
+
+
+def _toggle_follow(
+    client: Client,
+    session: _Session,
+    dataset: _Dataset,
+    rng: Random,
+) -> tuple[str, int]:
+    """Follow a sampled user, or unfollow them if they were followed before."""
+    following_id = str(rng.choice(dataset.users)["_id"])
+    path = f"/users/{session.user_id}/followings/{following_id}"
+
+    if following_id in session.followed:
+        session.followed.discard(following_id)
+        status, _ = client.request("DELETE", path, token=session.token)
+        return "unfollowUser", status
+
+    session.followed.add(following_id)
+    status, _ = client.request("PUT", path, token=session.token)
+    return "followUser", status
+
+
+OPERATIONS: dict[str, _Operation] = {
+    "getPostFeed": _get_post_feed,
+    "createPost": _create_post,
+    "createComment": _create_comment,
+    "login": _login,
+    "toggleFollow": _toggle_follow,
+}
+"""Request kinds which can be used in the mix."""
+
+
+def _free_port() -> int:
+    """Find a free local TCP port.
+
+    Returns:
+        int: Port number.
+
+    """
+    with socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_gunicorn(workers: int) -> tuple[Popen[bytes], str]:
+    """Spawn a Gunicorn server on a free local port.
+
+    Args:
+        workers (int): Number of Gunicorn workers.
+
+    Returns:
+        tuple[Popen[bytes], str]: The server process and its URL.
+
+    """
+    port = _free_port()
+    process = Popen(  # noqa: S603
+        [
+            ".venv/bin/gunicorn",
+            *("-b", f"127.0.0.1:{port}"),
+            *("-w", str(workers)),
+            "server.app:create_app()",
+        ],
+        stdout=DEVNULL,
+    )
+    started = perf_counter()
+
+    while True:
+        try:
+            create_connection(("127.0.0.1", port)).close()
+            break
+        except ConnectionRefusedError:
+            if perf_counter() - started > GUNICORN_TIMEOUT:
+                process.kill()
+                raise
+
+            sleep(0.1)
+
+    return process, f"http://127.0.0.1:{port}"
+
+
+def stop_gunicorn(process: Popen[bytes]) -> None:
+    """Stop a spawned Gunicorn server.
+
+    Args:
+        process (Popen[bytes]): The server process.
+
+    """
+    process.terminate()
+
+    try:
+        process.wait(GUNICORN_TIMEOUT)
+    except TimeoutExpired:
+        process.kill()
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    """Summarize request latencies.
+
+    Args:
+        latencies (list[float]): Latencies in milliseconds.
+
+    Returns:
+        dict[str, float]: Mean and percentiles, in milliseconds.
+
+    """
+    if len(latencies) < 2:  # noqa: PLR2004
+        latencies = latencies * 2 or [0.0, 0.0]
+
+    cuts = quantiles(latencies, n=100, method="inclusive")
+
+    return {
+        "mean": fmean(latencies),
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+    }
+
+
+def run(  # noqa: PLR0913
+    client_factory: Callable[[], Client],
+    mix: dict[str, int],
+    *,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+) -> dict[str, Any]:
+    """Send a mix of requests from concurrent sessions, and measure them.
+
+    Args:
+        client_factory (Callable[[], Client]): Creates a client per session.
+        mix (dict[str, int]): Relative weight of each request kind.
+        concurrency (int): Number of concurrent sessions.
+        duration (float): Seconds to measure for.
+        warmup (float): Seconds to send requests for, before measuring.
+        seed (int): Seed of the random generators.
+
+    Returns:
+        dict[str, Any]: Results, per `operation_id` and in total.
+
+    """
+    dataset = _Dataset(concurrency, 10 * concurrency)
+    names = list(mix)
+    weights = list(mix.values())
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    errors: defaultdict[str, int] = defaultdict(int)
+    start = perf_counter() + warmup
+    stop = start + duration
+
+    def worker(index: int) -> None:
+        rng = Random(seed + index)  # noqa: S311
+        client = client_factory()
+        session = _Session(dataset.users[index % len(dataset.users)])
+        measured: list[tuple[str, float, bool]] = []
+
+        _login(client, session, dataset, rng)
+
+        while (now := perf_counter()) < stop:
+            name = rng.choices(names, weights)[0]
+
+            try:
+                operation_id, status = OPERATIONS[name](client, session, dataset, rng)
+            except OSError:
+                operation_id, status = name, 0
+
+            if now >= start:
+                failed = not 200 <= status < 400  # noqa: PLR2004
+                measured.append((operation_id, (perf_counter() - now) * 1000, failed))
+
+        # Results are merged once the session is over, so that sessions do
+        # not contend while measuring.
+        with lock:
+            for operation_id, latency, failed in measured:
+                latencies[operation_id].append(latency)
+                errors[operation_id] += failed
+
+    lock = Lock()
+    threads = [Thread(target=worker, args=(i,)) for i in range(concurrency)]
+
+    for i in threads:
+        i.start()
+
+    for i in threads:
+        i.join()
+
+    return {
+        "time": datetime.now(UTC).isoformat(),
+        "config": {
+            "mix": mix,
+            "concurrency": concurrency,
+            "duration": duration,
+            "seed": seed,
+        },
+        "total": {
+            "requests": sum(len(i) for i in latencies.values()),
+            "throughput": sum(len(i) for i in latencies.values()) / duration,
+            "error_rate": sum(errors.values())
+            / max(sum(len(i) for i in latencies.values()), 1),
+        },
+        "operations": {
+            name: {
+                "requests": len(values),
+                "throughput": len(values) / duration,
+                "error_rate": errors[name] / len(values),
+                **percentiles(values),
+            }
+            for name, values in sorted(latencies.items())
+        },
+    }
+
+
+def _parse_mix(value: str) -> dict[str, int]:
+    """Parse a request mix from the command line.
+
+    Args:
+        value (str): Comma separated `kind=weight` pairs.
+
+    Raises:
+        ValueError: The mix was malformed, or used an unknown request kind.
+
+    Returns:
+        dict[str, int]: Relative weight of each request kind.
+
+    """
+    mix: dict[str, int] = {}
+
+    for pair in value.split(","):
+        name, weight = pair.split("=")
+
+        if name not in OPERATIONS:
+            msg = f"Unknown request kind: {name!r}"
+            raise ValueError(msg)
+
+        mix[name] = int(weight)
+
+    return mix
+
+
+def main() -> None:
+    """Run the benchmark, as configured by the command line."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--gunicorn",
+        type=int,
+        metavar="WORKERS",
+        help="spawn a Gunicorn server with this many workers",
+    )
+    target.add_argument("--url", help="benchmark a running server")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=DEFAULT_MIX,
+        help=f"weights of {', '.join(OPERATIONS)} (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="concurrent sessions (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=30,
+        help="seconds to measure for (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=5,
+        help="seconds to send requests before measuring (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed of the random generators (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="file to save the results to")
+    args = parser.parse_args()
+
+    server: Popen[bytes] | None = None
+    url: str | None = args.url
+
+    if args.gunicorn:
+        server, url = spawn_gunicorn(args.gunicorn)
+
+    try:
+        results = run(
+            AppClient if url is None else lambda: HttpClient(url),
+            args.mix,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            seed=args.seed,
+        )
+    finally:
+        if server is not None:
+            stop_gunicorn(server)
+
+    total = results["total"]
+    _logger.info(
+        "%d requests, %.1f req/s, %.2f%% errors.",
+        total["requests"],
+        total["throughput"],
+        total["error_rate"] * 100,
+    )
+
+    for name, i in results["operations"].items():
+        _logger.info(
+            "%-16s %8.1f req/s %6.2f%% errors  p50 %7.2f  p95 %7.2f  p99 %7.2f ms",
+            name,
+            i["throughput"],
+            i["error_rate"] * 100,
+            i["p50"],
+            i["p95"],
+            i["p99"],
+        )
+
+    if args.output:
+        args.output.write_text(dumps(results, indent=2))
+
+    if not results["operations"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Backfill the change time of posts and comments created before delta sync.
+
+Delta sync finds changed items by their `change_time`, see `server/sync.py`.
+Older posts and comments do not have one, so this task copies it from their
+`modification_time`, in batches, so it can run while the backend is serving
+requests and resume after being interrupted. Items written meanwhile already
+have a newer change time, which is kept.
+
+Until an item is migrated, its later changes still show up in deltas, but
+changes to items that are never written again do not.
+"""
+
+from logging import getLogger
+
+import __init__  # noqa: F401
+from pymongo import UpdateOne
+
+from server.db import db
+from server.pagination import keyset
+
+MIGRATION_BATCH_SIZE = 1000
+"""Number of items migrated by each write."""
+
+_logger = getLogger(__name__)
+
+
+def migrate_change_times() -> int:
+    """Set the change time of every post and comment which is missing one.
+
+    Returns:
+        int: Number of updated items.
+
+    """
+    updated = 0
+
+    for collection in (db.posts, db.comments):
+        after = None
+
+        while True:
+            items = (
+                collection.find(
+                    {"change_time": {"$exists": False}, **keyset(after)},
+                    {"modification_time": 1},
+                )
+                .sort("_id", 1)
+                .limit(MIGRATION_BATCH_SIZE)
+                .to_list()
+            )
+
+            if not items:
+                break
+
+            result = collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": i["_id"], "change_time": {"$exists": False}},
+                        {"$set": {"change_time": i["modification_time"]}},
+                    )
+                    for i in items
+                ],
+                ordered=False,
+            )
+            updated += result.modified_count
+
+            after = items[-1]["_id"]
+            _logger.info("Migrated %s up to %s.", collection.name, after)
+
+    return updated
+
+
+if __name__ == "__main__":
+    migrate_change_times()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Move follow relationships from user documents into the followings collection.
+
+Older databases store followings as an array inside each user document. This
+task copies them into edge documents in batches of users, and removes each
+array once its edges were written, so it can run while the backend is serving
+requests and resume after being interrupted.
+
+Until a user is migrated, their followings are missing from feeds and lists.
+Build the indexes with `tasks/indexes.py` first, since the unique edge index
+is what prevents duplicates when a user follows someone during the migration.
+"""
+
+import sys
+from logging import getLogger
+
+import __init__  # noqa: F401
+from pymongo import UpdateOne
+
+from server.db import db
+from server.pagination import keyset
+
+MIGRATION_BATCH_SIZE = 100
+"""Number of users migrated by each write."""
+
+_EDGE_INDEX = "follower_1_following_1"
+"""Name of the unique index of edges."""
+
+_logger = getLogger(__name__)
+
+
+def migrate_followings() -> int:
+    """Move the followings arrays of every user into edge documents.
+
+    Returns:
+        int: Number of created edges.
+
+    """
+    created = 0
+    after = None
+
+    while True:
+        users = (
+            db.users.find(
+                {"followings": {"$exists": True}, **keyset(after)},
+                {"followings": 1},
+            )
+            .sort("_id", 1)
+            .limit(MIGRATION_BATCH_SIZE)
+            .to_list()
+        )
+
+        if not users:
+            return created
+
+        edges = [
+            UpdateOne(
+                {"follower": user["_id"], "following": following},
+                {"$setOnInsert": {"follower": user["_id"], "following": following}},
+                upsert=True,
+            )
+            for user in users
+            for following in user["followings"]
+        ]
+
+        if edges:
+            created += db.followings.bulk_write(edges, ordered=False).upserted_count
+
+        db.users.update_many(
+            {"_id": {"$in": [i["_id"] for i in users]}},
+            {"$unset": {"followings": ""}},
+        )
+
+        after = users[-1]["_id"]
+        _logger.info("Migrated users up to %s (%d edges created).", after, created)
+
+
+if __name__ == "__main__":
+    if _EDGE_INDEX not in db.followings.index_information():
+        _logger.critical("Cannot migrate followings without the edge indexes.")
+        _logger.warning("Run tasks/indexes.py before this task.")
+        sys.exit(1)
+
+    migrate_followings()
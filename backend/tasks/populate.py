@@ -1,25 +1,50 @@
 #!/usr/bin/env python
-"""Reset and populate the database with mock data."""
+"""Reset and populate the database with mock data.
+
+By default, data is created through the controllers, which is slow but
+exercises the same code paths as the API. Pass `--bulk` to generate documents
+in parallel worker processes and insert them in batches instead, which scales
+to millions of users for load testing. Pass `--seed` to make either mode
+reproducible.
+"""
 
 import sys
+from argparse import ArgumentParser
 from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from contextlib import suppress
+from datetime import UTC, datetime, timedelta
 from json import dumps
 from logging import getLogger
 from math import ceil
-from random import randint, random, sample, shuffle
+from multiprocessing import get_context
+from os import cpu_count
+from random import Random, randint, random, sample, seed, shuffle
+from typing import Any
 
 import __init__  # noqa: F401
 from bson.objectid import ObjectId
 from faker import Faker
+from faker.providers.lorem.en_US import Provider as LoremProvider
+from faker.providers.person.en_US import Provider as PersonProvider
+from pydantic import BaseModel
 from tqdm import tqdm
 
 from server.auth.controller import signup
 from server.comments.controller import create_comment
+from server.config import feed_pull_threshold
+from server.db import db
 from server.followings.controller import follow_user
+from server.pagination import iterate_pages
 from server.posts.controller import create_post
 from server.users.controller import delete_user, get_all_users
-from server.users.controller_model import DbUser, DbUserExistsError, DbUserNotFoundError
+from server.users.controller_model import (
+    DbUserExistsError,
+    DbUserNotFoundError,
+    DbUserProfile,
+)
+from tasks.counters import repair_counters
 from tasks.setup import setup
 
 USERS_MIN = 500
@@ -61,9 +86,43 @@ POST_MIN_COMMENTS = 1
 POST_MAX_COMMENTS = 10
 """Maximum comments a user can make."""
 
+BULK_CHUNK_SIZE = 10_000
+"""Number of users generated by each task of the bulk mode."""
+
+BULK_EPOCH = datetime(2024, 1, 1, tzinfo=UTC)
+"""Time of the oldest generated post in the bulk mode."""
+
+BULK_TIME_SPAN = timedelta(days=365)
+"""Time span of generated posts and comments in the bulk mode."""
+
+BULK_CELEBRITY_SKEW = 3
+"""Skew of followings towards the first users in the bulk mode.
+
+Higher values concentrate followers on fewer users.
+"""
+
+_FIRST_NAMES = list(PersonProvider.first_names)
+_LAST_NAMES = list(PersonProvider.last_names)
+_WORDS = list(LoremProvider.word_list)
+
 _logger = getLogger(__name__)
 
 
+class BulkSizes(BaseModel, frozen=True):
+    """Sizes of a dataset generated in the bulk mode.
+
+    Counts per user and per post are averages. Each one is drawn uniformly
+    between zero and twice its average.
+    """
+
+    users: int
+    followings: int
+    posts: int
+    comments: int
+    batch_size: int
+    seed: int
+
+
 def _randint_norm(min_value: int, max_value: int) -> int:
     """Return a random number, approximately following a normal distribution.
 
@@ -140,11 +199,13 @@ def _get_user_dims(users_count: int) -> tuple[int, ...]:
             return tuple(dims)
 
 
-def _generate_social_graph(users: list[DbUser]) -> defaultdict[ObjectId, set[ObjectId]]:
+def _generate_social_graph(
+    users: list[DbUserProfile],
+) -> defaultdict[ObjectId, set[ObjectId]]:
     """Generate a random followings graph.
 
     Args:
-        users (list[DbUser]): Users.
+        users (list[DbUserProfile]): Users.
 
     Returns:
         defaultdict[ObjectId, set[ObjectId]]: User followings.
@@ -176,6 +237,16 @@ def _generate_social_graph(users: list[DbUser]) -> defaultdict[ObjectId, set[Obj
     return followings
 
 
+def _get_all_users() -> list[DbUserProfile]:
+    """Get every user, across all pages.
+
+    Returns:
+        list[DbUserProfile]: Users.
+
+    """
+    return list(iterate_pages(lambda after, limit: get_all_users(after, limit).root))
+
+
 def populate() -> None:  # noqa: C901, PLR0912
     """Reset and populate the database with mock data."""
     setup()
@@ -197,7 +268,7 @@ def populate() -> None:  # noqa: C901, PLR0912
 
     _logger.info("\tDone.")
     _logger.info("Retrieving user list….")
-    users = get_all_users().root
+    users = _get_all_users()
 
     if not users:
         _logger.critical("There were no users, somehow.")
@@ -240,7 +311,7 @@ def populate() -> None:  # noqa: C901, PLR0912
 
     _logger.info("\tDone.")
     _logger.info("Retrieving user list… (again).")
-    users = get_all_users().root
+    users = _get_all_users()
 
     if not users:
         _logger.critical("There were no users, somehow.")
@@ -276,5 +347,274 @@ def populate() -> None:  # noqa: C901, PLR0912
     _logger.info("\tDone.")
 
 
+def _user_id(index: int) -> ObjectId:
+    """Get the ID of a generated user, without generating it.
+
+    Args:
+        index (int): Index of user.
+
+    Returns:
+        ObjectId: Id of user.
+
+    """
+    return ObjectId(int(BULK_EPOCH.timestamp()).to_bytes(4) + index.to_bytes(8))
+
+
+def _user_profile(index: int, sizes: BulkSizes) -> dict[str, Any]:
+    """Get the name and email address of a generated user, without generating it.
+
+    Args:
+        index (int): Index of user.
+        sizes (BulkSizes): Dataset sizes.
+
+    Returns:
+        dict[str, Any]: Name and email address.
+
+    """
+    rng = Random(f"{sizes.seed}/{index}")  # noqa: S311
+    first = rng.choice(_FIRST_NAMES)
+    last = rng.choice(_LAST_NAMES)
+
+    return {
+        "name": f"{first} {last}",
+        "email": f"{first}.{last}.{index}@example.com".lower(),
+    }
+
+
+def _random_id(rng: Random, time: datetime) -> ObjectId:
+    """Create a reproducible ObjectId.
+
+    Args:
+        rng (Random): Seeded random generator.
+        time (datetime): Creation time.
+
+    Returns:
+        ObjectId: Id, sorting by the creation time.
+
+    """
+    return ObjectId(int(time.timestamp()).to_bytes(4) + rng.randbytes(8))
+
+
+def _random_text(rng: Random) -> str:
+    """Create a random sentence.
+
+    Args:
+        rng (Random): Seeded random generator.
+
+    Returns:
+        str: Text.
+
+    """
+    return " ".join(rng.choices(_WORDS, k=rng.randint(5, 30))).capitalize() + "."
+
+
+def _generate_chunk(
+    first: int,
+    sizes: BulkSizes,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Generate the users of a chunk, along with their followings and content.
+
+    Args:
+        first (int): Index of the first user in the chunk.
+        sizes (BulkSizes): Dataset sizes.
+
+    Yields:
+        tuple[str, dict[str, Any]]: Collection name and document.
+
+    """
+    rng = Random(f"{sizes.seed}/chunk/{first}")  # noqa: S311
+    end = BULK_EPOCH + BULK_TIME_SPAN
+
+    for index in range(first, min(first + BULK_CHUNK_SIZE, sizes.users)):
+        user_id = _user_id(index)
+        profile = _user_profile(index, sizes)
+
+        yield "users", {"_id": user_id, **profile, "credential": b""}
+
+        # Followings are skewed towards the first users, so that some of them
+        # end up with many followers.
+        followings = {
+            int(sizes.users * rng.random() ** BULK_CELEBRITY_SKEW)
+            for _ in range(rng.randint(0, 2 * sizes.followings))
+        }
+        followings.discard(index)
+
+        for i in followings:
+            yield "followings", {"follower": user_id, "following": _user_id(i)}
+
+        for _ in range(rng.randint(0, 2 * sizes.posts)):
+            time = BULK_EPOCH + BULK_TIME_SPAN * rng.random()
+            post_id = _random_id(rng, time)
+
+            yield (
+                "posts",
+                {
+                    "_id": post_id,
+                    "content": _random_text(rng),
+                    "creation_time": time,
+                    "modification_time": time,
+                    "change_time": time,
+                    "author": user_id,
+                    "author_snapshot": profile,
+                },
+            )
+
+            for _ in range(rng.randint(0, 2 * sizes.comments)):
+                author = rng.randrange(sizes.users)
+                comment_time = time + (end - time) * rng.random()
+
+                yield (
+                    "comments",
+                    {
+                        "_id": _random_id(rng, comment_time),
+                        "content": _random_text(rng),
+                        "author": _user_id(author),
+                        "author_snapshot": _user_profile(author, sizes),
+                        "post": post_id,
+                        "creation_time": comment_time,
+                        "modification_time": comment_time,
+                        "change_time": comment_time,
+                    },
+                )
+
+
+def _load_chunk(first: int, sizes: BulkSizes) -> dict[str, int]:
+    """Generate and insert a chunk of users, in a worker process.
+
+    Args:
+        first (int): Index of the first user in the chunk.
+        sizes (BulkSizes): Dataset sizes.
+
+    Returns:
+        dict[str, int]: Number of inserted documents per collection.
+
+    """
+    batches: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
+    counts: defaultdict[str, int] = defaultdict(int)
+
+    for name, document in _generate_chunk(first, sizes):
+        batch = batches[name]
+        batch.append(document)
+
+        if len(batch) >= sizes.batch_size:
+            db[name].insert_many(batch, ordered=False)
+            counts[name] += len(batch)
+            batch.clear()
+
+    for name, batch in batches.items():
+        if batch:
+            db[name].insert_many(batch, ordered=False)
+            counts[name] += len(batch)
+
+    return counts
+
+
+def populate_bulk(sizes: BulkSizes, workers: int | None = None) -> None:
+    """Reset and populate the database with a large generated dataset.
+
+    Args:
+        sizes (BulkSizes): Dataset sizes.
+        workers (int, optional): Number of worker processes. Defaults to None,
+            which uses one per CPU.
+
+    """
+    setup()
+
+    _logger.info("Generating %d users and their content….", sizes.users)
+    counts: defaultdict[str, int] = defaultdict(int)
+
+    # Workers are spawned instead of forked, so that each one creates its own
+    # database client.
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        tasks = [
+            pool.submit(_load_chunk, i, sizes)
+            for i in range(0, sizes.users, BULK_CHUNK_SIZE)
+        ]
+
+        for task in tqdm(as_completed(tasks), total=len(tasks)):
+            for name, count in task.result().items():
+                counts[name] += count
+
+    _logger.info("\tInserted %s.", dumps(counts))
+    _logger.info("Computing counters….")
+    repair_counters()
+
+    if feed_pull_threshold:
+        db.users.update_many(
+            {"follower_count": {"$gt": feed_pull_threshold}},
+            {"$set": {"feed_pulled": True}},
+        )
+
+    _logger.info("\tDone.")
+
+
+def main() -> None:
+    """Populate the database, as configured by the command line."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="generate documents in worker processes and insert them in batches",
+    )
+    parser.add_argument("--seed", type=int, help="seed of the random generators")
+    parser.add_argument(
+        "--users",
+        type=int,
+        default=100_000,
+        help="number of users in bulk mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--followings",
+        type=int,
+        default=50,
+        help="average followings per user in bulk mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--posts",
+        type=int,
+        default=10,
+        help="average posts per user in bulk mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--comments",
+        type=int,
+        default=3,
+        help="average comments per post in bulk mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10_000,
+        help="documents per insert in bulk mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=cpu_count(),
+        help="worker processes in bulk mode (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    if not args.bulk:
+        if args.seed is not None:
+            seed(args.seed)
+            Faker.seed(args.seed)
+
+        populate()
+        return
+
+    populate_bulk(
+        BulkSizes(
+            users=args.users,
+            followings=args.followings,
+            posts=args.posts,
+            comments=args.comments,
+            batch_size=args.batch_size,
+            seed=0 if args.seed is None else args.seed,
+        ),
+        args.workers,
+    )
+
+
 if __name__ == "__main__":
-    populate()
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""Replay captured traffic, and compare its latency to the recorded one.
+
+Traffic is captured by setting `SOCIAL_BE_CAPTURE_PATH` on the server, see
+`server/capture.py`. Replay it against a copy of the same database, for
+example one restored by `tasks/snapshot.py`, since recorded paths refer to
+users, posts and comments by their IDs. Unset `SOCIAL_BE_CAPTURE_PATH` while
+replaying, so that the replayed requests are not captured as well.
+
+Requests are sent at their recorded offsets, divided by `--speed`. Tokens
+are signed for the recorded users, with the configured JWT secret. Recorded
+bodies only keep the length of strings, so they are filled with placeholder
+text of the same length. Logins use recorded users, who get a known password.
+
+Per `operation_id`, recorded and replayed latency percentiles are reported,
+along with the number of responses whose status differed from the recorded
+one. Pass `--output` to save them as JSON.
+"""
+
+import sys
+from argparse import ArgumentParser
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from itertools import count
+from json import dumps, loads
+from logging import getLogger
+from pathlib import Path
+from threading import Lock, local
+from time import perf_counter, sleep
+from typing import TYPE_CHECKING, Any
+
+import __init__  # noqa: F401
+from bson.objectid import ObjectId
+from flask_jwt_extended import create_access_token
+
+from server.app import create_app
+from server.config import admin_email, capture_backups
+from server.db import db
+from server.plugins import bcrypt
+from server.users.view_model import User
+from tasks.loadtest import (
+    PASSWORD,
+    AppClient,
+    Client,
+    HttpClient,
+    percentiles,
+    spawn_gunicorn,
+    stop_gunicorn,
+)
+
+if TYPE_CHECKING:
+    from subprocess import Popen
+
+UNMATCHED = "unmatched"
+"""Name reported for requests which did not match any operation."""
+
+_logger = getLogger(__name__)
+
+
+def read_capture(path: Path) -> Iterator[dict[str, Any]]:
+    """Read a captured log, including its rotated files, oldest first.
+
+    Args:
+        path (Path): The current log file.
+
+    Yields:
+        dict[str, Any]: A recorded request.
+
+    """
+    rotated = [
+        path.with_name(f"{path.name}.{i}") for i in range(capture_backups, 0, -1)
+    ]
+
+    for file in [*rotated, path]:
+        if not file.exists():
+            continue
+
+        with file.open() as lines:
+            for line in lines:
+                if line.strip():
+                    yield loads(line)
+
+
+def _fill(value: object, emails: Iterator[str]) -> object:
+    """Fill a recorded body shape with placeholder values.
+
+    Args:
+        value (object): Body shape, see `server.capture.shape`.
+        emails (Iterator[str]): Unique email addresses, for `email` fields.
+
+    Returns:
+        object: A body, with the recorded string lengths.
+
+    """
+    if isinstance(value, dict):
+        return {
+            k: next(emails) if k == "email" and isinstance(v, str) else _fill(v, emails)
+            for k, v in value.items()
+        }
+
+    if isinstance(value, list):
+        return [_fill(i, emails) for i in value]
+
+    if isinstance(value, str) and value.startswith("*"):
+        return "x" * int(value[1:])
+
+    return value
+
+
+class _Replay:
+    """Requests of a captured log, prepared to be sent."""
+
+    def __init__(self, records: list[dict[str, Any]]) -> None:
+        """Sign tokens for the recorded users, and set their password.
+
+        Args:
+            records (list[dict[str, Any]]): Recorded requests, oldest first.
+
+        """
+        self.records = records
+        admins = {i["u"]: i["a"] for i in records if i["u"]}
+
+        with create_app().app_context():
+            self.tokens = {
+                user_id: create_access_token(
+                    User.model_construct(
+                        id=ObjectId(user_id),
+                        email=admin_email if admin else "",
+                    ),
+                )
+                for user_id, admin in admins.items()
+            }
+
+        users = db.users.find(
+            {"_id": {"$in": [ObjectId(i) for i in admins]}},
+            {"email": 1},
+        ).to_list()
+        db.users.update_many(
+            {"_id": {"$in": [i["_id"] for i in users]}},
+            {"$set": {"credential": bcrypt.generate_password_hash(PASSWORD)}},
+        )
+
+        self.logins = [i["email"] for i in users]
+        run = ObjectId()
+        self.emails = (f"replay-{run}-{i}@example.com" for i in count())
+        self.lock = Lock()
+
+    def prepare(self, index: int) -> tuple[str, str, object, str | None]:
+        """Prepare a recorded request.
+
+        Args:
+            index (int): Index of the request.
+
+        Returns:
+            tuple[str, str, object, str | None]: Method, path, body and token.
+
+        """
+        record = self.records[index]
+        path = f"{record['p']}?{record['q']}" if record["q"] else record["p"]
+
+        with self.lock:
+            body = _fill(record["b"], self.emails)
+
+        if record["o"] == "login" and self.logins and isinstance(body, dict):
+            body = {
+                "email": self.logins[index % len(self.logins)],
+                "password": PASSWORD,
+            }
+
+        return record["m"], path, body, self.tokens.get(record["u"])
+
+
+def _send(
+    client: Client,
+    method: str,
+    path: str,
+    body: object,
+    token: str | None,
+) -> int:
+    """Send a request, returning status 0 if it failed."""
+    try:
+        status, _ = client.request(method, path, body, token)
+    except OSError:
+        return 0
+    except Exception:
+        # Count it as a mismatch, rather than losing it with its thread.
+        _logger.exception("Replaying %s %s failed.", method, path)
+        return 0
+
+    return status
+
+
+def replay(
+    client_factory: Callable[[], Client],
+    records: list[dict[str, Any]],
+    *,
+    speed: float,
+    concurrency: int,
+) -> dict[str, Any]:
+    """Send recorded requests at their recorded pace, and measure them.
+
+    Args:
+        client_factory (Callable[[], Client]): Creates a client per thread.
+        records (list[dict[str, Any]]): Recorded requests, oldest first.
+        speed (float): Pace, relative to the recorded one. Zero sends requests
+            as fast as possible.
+        concurrency (int): Maximum number of concurrent requests.
+
+    Returns:
+        dict[str, Any]: Results, per `operation_id`.
+
+    """
+    prepared = _Replay(records)
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    mismatches: defaultdict[str, int] = defaultdict(int)
+    clients = local()
+    lock = Lock()
+
+    def send(index: int) -> None:
+        if not hasattr(clients, "client"):
+            clients.client = client_factory()
+
+        record = records[index]
+        method, path, body, token = prepared.prepare(index)
+        start = perf_counter()
+
+        status = _send(clients.client, method, path, body, token)
+
+        latency = (perf_counter() - start) * 1000
+        operation_id = record["o"] or UNMATCHED
+
+        with lock:
+            latencies[operation_id].append(latency)
+            mismatches[operation_id] += status != record["s"]
+
+    started = perf_counter()
+    first = records[0]["t"] if records else 0.0
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        sent = []
+
+        for index, record in enumerate(records):
+            if speed:
+                delay = started + (record["t"] - first) / speed - perf_counter()
+
+                if delay > 0:
+                    sleep(delay)
+
+            sent.append(pool.submit(send, index))
+
+        # Raise failures of preparing the requests, instead of dropping them.
+        for i in sent:
+            i.result()
+
+    recorded: defaultdict[str, list[float]] = defaultdict(list)
+
+    for i in records:
+        recorded[i["o"] or UNMATCHED].append(i["d"])
+
+    operations: dict[str, Any] = {}
+
+    for name, values in sorted(latencies.items()):
+        before = percentiles(recorded[name])
+        after = percentiles(values)
+        operations[name] = {
+            "requests": len(values),
+            "mismatches": mismatches[name],
+            "recorded": before,
+            "replayed": after,
+            "delta": {k: after[k] - before[k] for k in after},
+        }
+
+    return {
+        "time": datetime.now(UTC).isoformat(),
+        "config": {"speed": speed, "concurrency": concurrency},
+        "total": {
+            "requests": len(records),
+            "duration": perf_counter() - started,
+            "mismatches": sum(mismatches.values()),
+        },
+        "operations": operations,
+    }
+
+
+def main() -> None:
+    """Replay a captured log, as configured by the command line."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path, help="captured log")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--gunicorn",
+        type=int,
+        metavar="WORKERS",
+        help="spawn a Gunicorn server with this many workers",
+    )
+    target.add_argument("--url", help="replay against a running server")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="pace relative to the recorded one, 0 for unpaced (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=32,
+        help="maximum concurrent requests (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="file to save the results to")
+    args = parser.parse_args()
+
+    # Requests are logged once they are done, so sort them by start time.
+    records = sorted(read_capture(args.path), key=lambda i: i["t"])
+
+    if not records:
+        _logger.critical("No requests were captured in %s.", args.path)
+        sys.exit(1)
+
+    server: Popen[bytes] | None = None
+    url: str | None = args.url
+
+    if args.gunicorn:
+        server, url = spawn_gunicorn(args.gunicorn)
+
+    try:
+        results = replay(
+            AppClient if url is None else lambda: HttpClient(url),
+            records,
+            speed=args.speed,
+            concurrency=args.concurrency,
+        )
+    finally:
+        if server is not None:
+            stop_gunicorn(server)
+
+    total = results["total"]
+    _logger.info(
+        "%d requests in %.1f s, %d status mismatches.",
+        total["requests"],
+        total["duration"],
+        total["mismatches"],
+    )
+
+    for name, i in results["operations"].items():
+        _logger.info(
+            "%-20s %6d req %5d mismatched  p50 %+8.2f  p95 %+8.2f  p99 %+8.2f ms",
+            name,
+            i["requests"],
+            i["mismatches"],
+            i["delta"]["p50"],
+            i["delta"]["p95"],
+            i["delta"]["p99"],
+        )
+
+    if args.output:
+        args.output.write_text(dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ from server.config import (
     maintenance,
 )
 from server.db import USER_NOT_FOUND, client, db
+from tasks.indexes import migrate_indexes
 
 _logger = getLogger(__name__)
 
@@ -93,11 +94,9 @@ def setup() -> None:
     )
 
     _logger.info("\tDone.")
-    _logger.info("Creating database indexes...")
 
-    db.users.create_index("email", unique=True)
+    migrate_indexes()
 
-    _logger.info("\tDone.")
     _logger.info("Creating the admin user...")
 
     signup(
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""Dump the database to a snapshot file, or restore it from one.
+
+A snapshot is a zip archive with one deflated member per collection. Each
+member holds the documents of its collection as raw, length-prefixed BSON,
+like `mongodump` does, so documents are copied without being decoded. A
+`manifest.json` member lists the collections and their document counts.
+Events of workers are transient, and are neither dumped nor restored.
+
+Restoring drops the snapshotted collections, inserts every collection in
+parallel using unordered batches, and builds the indexes of the registry
+only once all documents were loaded.
+"""
+
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import batched
+from json import dumps, loads
+from logging import getLogger
+from pathlib import Path
+from threading import BoundedSemaphore
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import __init__  # noqa: F401
+from bson import decode_file_iter
+from bson.raw_bson import RawBSONDocument
+
+from server.config import maintenance
+from server.db import RAW, db
+from server.events import EVENTS_COLLECTION
+from tasks.indexes import migrate_indexes
+
+MANIFEST = "manifest.json"
+"""Name of the archive member listing the collections."""
+
+_logger = getLogger(__name__)
+
+
+def dump(path: Path) -> None:
+    """Dump every collection of the database to a snapshot file.
+
+    Args:
+        path (Path): Snapshot file, which is overwritten.
+
+    """
+    manifest: dict[str, int] = {}
+
+    with ZipFile(path, "w", ZIP_DEFLATED, compresslevel=1) as archive:
+        for name in sorted(db.list_collection_names()):
+            if name.startswith("system.") or name == EVENTS_COLLECTION:
+                continue
+
+            _logger.info("Dumping %s...", name)
+            count = 0
+
+            with archive.open(f"{name}.bson", "w", force_zip64=True) as file:
+                for document in db.get_collection(name, codec_options=RAW).find(
+                    comment="Snapshot dump",
+                ):
+                    file.write(document.raw)
+                    count += 1
+
+            manifest[name] = count
+            _logger.info("\tDumped %d documents.", count)
+
+        archive.writestr(MANIFEST, dumps(manifest))
+
+
+def _insert(name: str, documents: list[RawBSONDocument]) -> int:
+    """Insert a batch of raw documents.
+
+    Args:
+        name (str): Collection name.
+        documents (list[RawBSONDocument]): Documents.
+
+    Returns:
+        int: Number of inserted documents.
+
+    """
+    result = db.get_collection(name, codec_options=RAW).insert_many(
+        documents,
+        ordered=False,
+        bypass_document_validation=True,
+        comment="Snapshot restore",
+    )
+
+    return len(result.inserted_ids)
+
+
+def _restore_collection(
+    path: Path,
+    name: str,
+    batch_size: int,
+    inserts: ThreadPoolExecutor,
+    slots: BoundedSemaphore,
+) -> int:
+    """Stream a collection from a snapshot file into the database.
+
+    Args:
+        path (Path): Snapshot file.
+        name (str): Collection name.
+        batch_size (int): Number of documents per insert.
+        inserts (ThreadPoolExecutor): Workers which run the inserts.
+        slots (BoundedSemaphore): Limit of pending batches, shared by all
+            collections to bound memory use.
+
+    Returns:
+        int: Number of inserted documents.
+
+    """
+    pending: list[Future[int]] = []
+
+    with ZipFile(path) as archive, archive.open(f"{name}.bson") as file:
+        for batch in batched(decode_file_iter(file, RAW), batch_size):
+            slots.acquire()
+            task = inserts.submit(_insert, name, list(batch))
+            task.add_done_callback(lambda _: slots.release())
+            pending.append(task)
+
+    return sum(i.result() for i in pending)
+
+
+def restore(path: Path, workers: int, batch_size: int) -> None:
+    """Replace the collections of the database with the ones of a snapshot.
+
+    Args:
+        path (Path): Snapshot file.
+        workers (int): Number of concurrent inserts.
+        batch_size (int): Number of documents per insert.
+
+    """
+    with ZipFile(path) as archive:
+        manifest: dict[str, int] = loads(archive.read(MANIFEST))
+
+    # Snapshots made before events were skipped still contain them.
+    manifest.pop(EVENTS_COLLECTION, None)
+
+    for name in manifest:
+        db.drop_collection(name, comment="Snapshot restore")
+
+    slots = BoundedSemaphore(2 * workers)
+
+    with (
+        ThreadPoolExecutor(workers) as inserts,
+        ThreadPoolExecutor(len(manifest) or 1) as readers,
+    ):
+        counts = {
+            name: readers.submit(
+                _restore_collection,
+                path,
+                name,
+                batch_size,
+                inserts,
+                slots,
+            )
+            for name in manifest
+        }
+
+        for name, task in counts.items():
+            count = task.result()
+            _logger.info("Restored %d of %d %s.", count, manifest[name], name)
+
+    migrate_indexes()
+
+
+def main() -> None:
+    """Dump or restore a snapshot, as configured by the command line."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    dump_parser = commands.add_parser("dump", help="dump the database")
+    dump_parser.add_argument("path", type=Path, help="snapshot file to write")
+
+    restore_parser = commands.add_parser("restore", help="restore the database")
+    restore_parser.add_argument("path", type=Path, help="snapshot file to read")
+    restore_parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="concurrent inserts (default: %(default)s)",
+    )
+    restore_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10_000,
+        help="documents per insert (default: %(default)s)",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        dump(args.path)
+        return
+
+    if not maintenance:
+        _logger.critical("Cannot restore the database without maintenance mode.")
+        _logger.warning("Set SOCIAL_BE_MAINTENANCE=1 before running this task.")
+        sys.exit(1)
+
+    restore(args.path, args.workers, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Synchronize the author snapshots of posts and comments with user profiles.
+
+Profile changes are propagated in the background by the backend. Run this
+task to backfill snapshots of existing data. Until then, posts and comments
+without a snapshot read the profile of their author on every request.
+
+Users whose propagation was interrupted, for example when a worker stopped,
+stay marked as pending. Workers resume those when they start, and
+`--pending` resumes them without checking every other user.
+"""
+
+from argparse import ArgumentParser
+from logging import getLogger
+
+import __init__  # noqa: F401
+
+from server.pagination import iterate_pages
+from server.users.controller import (
+    get_all_users,
+    propagate_pending_profiles,
+    propagate_user_profile,
+)
+
+_logger = getLogger(__name__)
+
+
+def sync_author_snapshots() -> None:
+    """Copy the profile of every user into their author snapshots."""
+    updated = 0
+
+    for i in iterate_pages(lambda after, limit: get_all_users(after, limit).root):
+        updated += propagate_user_profile(i.id)
+
+    _logger.info("Updated %d author snapshots.", updated)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--pending",
+        action="store_true",
+        help="only users whose propagation was interrupted",
+    )
+    args = parser.parse_args()
+
+    if args.pending:
+        _logger.info("Updated %d author snapshots.", propagate_pending_profiles())
+    else:
+        sync_author_snapshots()
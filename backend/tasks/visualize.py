@@ -6,17 +6,19 @@ from sys import stdout
 
 import __init__  # noqa: F401
 
+from server.followings.controller import get_following_ids
+from server.pagination import iterate_pages
 from server.users.controller import get_all_users
 
 stdout.write("digraph U {\n")
 
-for i in get_all_users().root:
+for i in iterate_pages(lambda after, limit: get_all_users(after, limit).root):
     name = dumps(str(i.id))
     label = dumps(f"{i.id}\n{i.name}\n{i.email}")
 
     stdout.write(f"{name} [label={label}];\n")
 
-    for j in i.followings:
+    for j in get_following_ids(i.id):
         stdout.write(f"{name} -> {dumps(str(j))};\n")
 
 stdout.write("}\n")